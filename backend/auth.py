@@ -1,14 +1,152 @@
 from fastapi import HTTPException, Header
-from supabase import create_client
 from dotenv import load_dotenv
+from supabase_client import db
+import asyncio
 import os
+import threading
+import time
+import httpx
+import jwt
 
 load_dotenv()
 
-supabase = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_KEY")
-)
+# Verification algorithms are chosen by the key, never by the token header
+SECRET_ALGORITHM = "HS256"
+KEY_ALGORITHMS = {
+    "RSA": {"RS256", "RS384", "RS512", "PS256", "PS384", "PS512"},
+    "EC": {"ES256", "ES384", "ES512"},
+    "OKP": {"EdDSA"},
+}
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens locally.
+
+    HS256 tokens are checked against the project JWT secret (plus an optional
+    previous secret during rotation); asymmetric tokens are checked against the
+    project's JWKS, which is refetched when an unknown key id shows up. Verified
+    tokens are cached for a short TTL. When no local key material is configured
+    it falls back to an async Supabase round trip.
+    """
+
+    def __init__(self, secrets: list = None, jwks_url: str = None, cache_ttl: float = None,
+                 audience: str = "authenticated", jwks_refresh_interval: float = 30.0):
+        if secrets is None:
+            secrets = [os.getenv("SUPABASE_JWT_SECRET"), os.getenv("SUPABASE_JWT_PREVIOUS_SECRET")]
+        self.secrets = [secret for secret in secrets if secret]
+        supabase_url = os.getenv("SUPABASE_URL")
+        self.jwks_url = jwks_url or os.getenv("SUPABASE_JWKS_URL") or \
+            (f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json" if supabase_url else None)
+        self.cache_ttl = cache_ttl if cache_ttl is not None else \
+            float(os.getenv("AUTH_CACHE_TTL", "60"))
+        self.audience = audience
+        self.jwks_refresh_interval = jwks_refresh_interval
+
+        self.jwks = {}
+        self.jwks_fetched_at = 0.0
+        self.cache = {}
+        self._lock = threading.Lock()
+
+    def _refresh_jwks(self, force: bool = False):
+        if not self.jwks_url:
+            return
+        if not force and self.jwks and time.monotonic() - self.jwks_fetched_at < 3600:
+            return
+        if time.monotonic() - self.jwks_fetched_at < self.jwks_refresh_interval:
+            return
+        self.jwks_fetched_at = time.monotonic()
+        try:
+            response = httpx.get(self.jwks_url, timeout=5.0)
+            response.raise_for_status()
+            self.jwks = {
+                key["kid"]: jwt.PyJWK(key)
+                for key in response.json().get("keys", []) if key.get("kid")
+            }
+        except Exception as e:
+            print(f"JWKS refresh failed: {e}")
+
+    def _decode(self, token: str) -> dict:
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg", "HS256")
+        options = {"require": ["exp", "sub"]}
+
+        if algorithm.startswith("HS"):
+            last_error = jwt.InvalidTokenError("No JWT secret configured")
+            for secret in self.secrets:
+                try:
+                    return jwt.decode(token, secret, algorithms=[SECRET_ALGORITHM],
+                                      audience=self.audience, options=options)
+                except jwt.InvalidSignatureError as e:
+                    last_error = e
+            raise last_error
+
+        kid = header.get("kid")
+        self._refresh_jwks()
+        if kid not in self.jwks:
+            # Unknown key id usually means the signing key was rotated
+            self._refresh_jwks(force=True)
+        if kid not in self.jwks:
+            raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+        key = self.jwks[kid]
+        # The JWK's alg (or the default for its key type) must be an allowed asymmetric one
+        if key.algorithm_name not in KEY_ALGORITHMS.get(key.key_type, ()):
+            raise jwt.InvalidTokenError(f"Signing key {kid} uses unsupported algorithm {key.algorithm_name}")
+        return jwt.decode(token, key.key, algorithms=[key.algorithm_name],
+                          audience=self.audience, options=options)
+
+    def can_verify_locally(self, token: str) -> bool:
+        return bool(self.jwks_url) if token_uses_jwks(token) else bool(self.secrets)
+
+    def _cached(self, token: str):
+        with self._lock:
+            cached = self.cache.get(token)
+            if cached and cached[1] > time.time():
+                return cached[0]
+        return None
+
+    def _store(self, token: str, user_id: str, expires: float):
+        now = time.time()
+        with self._lock:
+            if len(self.cache) > 10000:
+                self.cache = {t: v for t, v in self.cache.items() if v[1] > now}
+            self.cache[token] = (user_id, expires)
+
+    def verify(self, token: str) -> str:
+        """Return the user id for a locally verifiable token, raising on anything else"""
+        user_id = self._cached(token)
+        if user_id:
+            return user_id
+
+        claims = self._decode(token)
+        user_id = claims["sub"]
+        self._store(token, user_id, min(time.time() + self.cache_ttl, claims["exp"]))
+        return user_id
+
+    async def verify_async(self, token: str) -> str:
+        """Verify without blocking the event loop when a network hop may be needed"""
+        user_id = self._cached(token)
+        if user_id:
+            return user_id
+
+        if not self.can_verify_locally(token):
+            user = await db.get_user(token)
+            self._store(token, user["id"], time.time() + self.cache_ttl)
+            return user["id"]
+
+        if token_uses_jwks(token):
+            # A JWKS refresh is a blocking HTTP call
+            return await asyncio.to_thread(self.verify, token)
+
+        # HMAC verification is pure CPU work and takes microseconds
+        return self.verify(token)
+
+def token_uses_jwks(token: str) -> bool:
+    try:
+        return not jwt.get_unverified_header(token).get("alg", "HS256").startswith("HS")
+    except jwt.InvalidTokenError:
+        return False
+
+token_verifier = TokenVerifier()
 
 async def verify_token(authorization: str = Header(None)):
     """Verify Supabase JWT token"""
@@ -17,41 +155,38 @@ async def verify_token(authorization: str = Header(None)):
     
     try:
         token = authorization.replace("Bearer ", "")
-        response = supabase.auth.get_user(token)
-        return response.user.id
+        return await token_verifier.verify_async(token)
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
 class AuthManager:
-    def __init__(self):
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
+    def __init__(self, client=None):
+        self.db = client or db
     
     async def signup(self, email: str, password: str, name: str = None):
         """Create new user with optional name"""
         try:
-            options = {}
-            if name:
-                options['data'] = {'name': name}
-            
-            response = self.supabase.auth.sign_up({
-                "email": email,
-                "password": password,
-                "options": options
-            })
-            return response
+            data = {'name': name} if name else {}
+            response = await self.db.sign_up(email, password, data)
+            # Without email confirmation the response is a session, otherwise the bare user
+            if 'access_token' in response:
+                return {"user": response.get("user"), "session": response}
+            return {"user": response, "session": None}
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
     
+    async def refresh(self, refresh_token: str):
+        """Exchange a refresh token for a new session"""
+        try:
+            response = await self.db.refresh_session(refresh_token)
+            return {"user": response.get("user"), "session": response}
+        except Exception as e:
+            raise HTTPException(status_code=401, detail=str(e))
+
     async def login(self, email: str, password: str):
         """Login user"""
         try:
-            response = self.supabase.auth.sign_in_with_password({
-                "email": email,
-                "password": password
-            })
-            return response
+            response = await self.db.sign_in_with_password(email, password)
+            return {"user": response.get("user"), "session": response}
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
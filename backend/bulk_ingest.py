@@ -0,0 +1,328 @@
+"""
+Bulk document ingest for /api/upload/bulk
+
+Uploads (several files, or zip/tar archives of a docs or source tree) are
+streamed to a staging directory in fixed-size blocks instead of being read
+into memory. A background job then extracts and chunks the files on a
+thread pool and embeds the chunks of many files together in shared batches.
+Progress is kept per job and mirrored to the shared store, so any worker can
+answer a progress poll.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from metrics import Counter
+
+INGESTED_FILES = Counter(
+    "devassist_bulk_ingest_files_total",
+    "Files processed by bulk ingest jobs",
+    ("result",)
+)
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+SKIPPED_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+                "dist", "build", ".idea", ".vscode", ".mypy_cache", ".pytest_cache"}
+COPY_BLOCK = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds BULK_UPLOAD_MAX_BYTES"""
+
+
+class TooManyJobs(Exception):
+    """Raised before staging when BULK_MAX_JOBS jobs are already in progress"""
+
+
+class IngestJob:
+    def __init__(self, staging_dir: Path):
+        self.id = str(uuid4())
+        self.staging_dir = staging_dir
+        self.status = "staged"
+        self.uploads: List[str] = []
+        self.bytes_received = 0
+        self.files_total = 0
+        self.files_done = 0
+        self.files_skipped = 0
+        # files_total only grows until every upload and archive has been listed
+        self.enumerated = False
+        self.chunks = 0
+        self.errors: List[str] = []
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _error(self, message: str):
+        if len(self.errors) < 50:
+            self.errors.append(message)
+
+    def error(self, message: str):
+        with self._lock:
+            self._error(message)
+
+    def file_found(self):
+        with self._lock:
+            self.files_total += 1
+
+    def file_skipped(self, name: str, reason: str):
+        with self._lock:
+            self.files_skipped += 1
+            self._error(f"{name}: skipped ({reason})")
+
+    def enumeration_done(self):
+        with self._lock:
+            self.enumerated = True
+
+    def file_done(self, chunks: int):
+        with self._lock:
+            self.files_done += 1
+            self.chunks += chunks
+
+    def file_failed(self, name: str, error: str):
+        with self._lock:
+            self.files_done += 1
+            self._error(f"{name}: {error}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = (self.finished or time.time()) - self.started
+            # Unknown (None) while archives are still being listed
+            progress = None
+            if self.enumerated:
+                progress = round(self.files_done / self.files_total, 4) if self.files_total else 1.0
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "uploads": self.uploads,
+                "bytes_received": self.bytes_received,
+                "files_total": self.files_total,
+                "files_done": self.files_done,
+                "files_skipped": self.files_skipped,
+                "chunks": self.chunks,
+                "progress": progress,
+                "errors": list(self.errors),
+                "elapsed_seconds": round(elapsed, 2)
+            }
+
+
+class BulkIngestor:
+    def __init__(self, rag_engine, store=None, workers: int = None, max_upload_bytes: int = None,
+                 max_file_bytes: int = None, max_files: int = None, embed_batch: int = None,
+                 max_jobs: int = None):
+        self.rag_engine = rag_engine
+        self.store = store
+        self.workers = workers or int(os.getenv("INGEST_WORKERS", "4"))
+        self.max_upload_bytes = max_upload_bytes or int(os.getenv("BULK_UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+        self.max_file_bytes = max_file_bytes or int(os.getenv("BULK_MAX_FILE_BYTES", str(5 * 1024 * 1024)))
+        self.max_files = max_files or int(os.getenv("BULK_MAX_FILES", "5000"))
+        self.embed_batch = embed_batch or int(os.getenv("INGEST_EMBED_BATCH", "128"))
+        # Each running job has its own INGEST_WORKERS pool, so cap how many run at once
+        self.max_jobs = max_jobs or int(os.getenv("BULK_MAX_JOBS", "2"))
+        self.jobs: Dict[str, IngestJob] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    # ----- staging -----
+
+    def _prune(self, max_age: float = 3600):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and now - job.finished > max_age:
+                del self.jobs[job_id]
+
+    def active_jobs(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.finished is None)
+
+    def admit(self, content_length: int):
+        """
+        Refuse a bulk upload from its Content-Length, before the multipart body
+        is read and spooled to disk
+        """
+        if self.active_jobs() >= self.max_jobs:
+            raise TooManyJobs(f"{self.max_jobs} bulk uploads are already in progress. Try again later.")
+        if content_length > self.max_upload_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_upload_bytes // (1024 * 1024)}MB")
+
+    async def stage(self, uploads) -> IngestJob:
+        """
+        Copy uploaded files to a staging directory in COPY_BLOCK pieces.
+        Raises TooManyJobs when BULK_MAX_JOBS jobs are staging or running.
+        """
+        self._prune()
+        if self.active_jobs() >= self.max_jobs:
+            raise TooManyJobs(f"{self.max_jobs} bulk uploads are already in progress. Try again later.")
+        job = IngestJob(Path(tempfile.mkdtemp(prefix="devassist-ingest-")))
+        # Registered up front so uploads staging concurrently count against the cap
+        self.jobs[job.id] = job
+        try:
+            for index, upload in enumerate(uploads):
+                name = PurePosixPath(upload.filename or f"upload-{index}").name
+                target = job.staging_dir / f"{index:04d}-{name}"
+                with open(target, "wb") as out:
+                    while block := await upload.read(COPY_BLOCK):
+                        job.bytes_received += len(block)
+                        if job.bytes_received > self.max_upload_bytes:
+                            raise UploadTooLarge(
+                                f"Upload exceeds {self.max_upload_bytes // (1024 * 1024)}MB")
+                        await asyncio.to_thread(out.write, block)
+                job.uploads.append(name)
+        except BaseException:
+            del self.jobs[job.id]
+            shutil.rmtree(job.staging_dir, ignore_errors=True)
+            raise
+        return job
+
+    # ----- file discovery -----
+
+    def _wanted(self, path: str) -> bool:
+        parts = PurePosixPath(path).parts
+        if any(part in SKIPPED_DIRS or part.startswith(".") for part in parts[:-1]):
+            return False
+        return bool(parts) and not parts[-1].startswith(".") and self.rag_engine.supports(parts[-1])
+
+    def _iter_files(self, job: IngestJob) -> Iterator[Tuple[str, Optional[bytes], Optional[str]]]:
+        """
+        Yield (name, content, skip_reason) for every supported file in the
+        staged uploads, reading archive members one at a time
+        """
+        for staged in sorted(job.staging_dir.iterdir()):
+            upload_name = staged.name.split("-", 1)[1]
+            lower = upload_name.lower()
+            if lower.endswith(".zip"):
+                with zipfile.ZipFile(staged) as archive:
+                    for info in archive.infolist():
+                        if info.is_dir() or not self._wanted(info.filename):
+                            continue
+                        if info.file_size > self.max_file_bytes:
+                            yield info.filename, None, "too large"
+                            continue
+                        with archive.open(info) as member:
+                            # Bounded read guards against lying headers (zip bombs)
+                            content = member.read(self.max_file_bytes + 1)
+                        yield info.filename, content, "too large" if len(content) > self.max_file_bytes else None
+            elif lower.endswith(ARCHIVE_SUFFIXES):
+                # Stream mode reads members in archive order without seeking
+                with tarfile.open(staged, mode="r|*") as archive:
+                    for member in archive:
+                        if not member.isfile() or not self._wanted(member.name):
+                            continue
+                        if member.size > self.max_file_bytes:
+                            yield member.name, None, "too large"
+                            continue
+                        yield member.name, archive.extractfile(member).read(), None
+            elif self._wanted(upload_name):
+                if staged.stat().st_size > self.max_file_bytes:
+                    yield upload_name, None, "too large"
+                    continue
+                yield upload_name, staged.read_bytes(), None
+            else:
+                yield upload_name, None, "unsupported file type"
+
+    # ----- ingest -----
+
+    def _prepare(self, job: IngestJob, name: str, content: bytes) -> Tuple[str, List[str]]:
+        try:
+            return name, self.rag_engine.prepare_document(content, name)
+        except Exception as e:
+            job.file_failed(name, str(e))
+            INGESTED_FILES.inc(result="error")
+            return name, None
+
+    def _ingest(self, job: IngestJob):
+        """Chunk files on a thread pool and embed chunks from many files per batch"""
+        job.status = "running"
+        pending_chunks: List[str] = []
+        pending_files: List[Tuple[str, int]] = []
+
+        def flush():
+            self.rag_engine.add_chunks(pending_chunks)
+            for _, count in pending_files:
+                job.file_done(count)
+                INGESTED_FILES.inc(result="ok")
+            pending_chunks.clear()
+            pending_files.clear()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest") as pool:
+            futures = []
+            for name, content, skip_reason in self._iter_files(job):
+                if skip_reason:
+                    job.file_skipped(name, skip_reason)
+                    INGESTED_FILES.inc(result="skipped")
+                    continue
+                if job.files_total >= self.max_files:
+                    job.error(f"Stopped after {self.max_files} files (BULK_MAX_FILES)")
+                    break
+                job.file_found()
+                futures.append(pool.submit(self._prepare, job, name, content))
+
+                # Keep a bounded number of parsed files in memory
+                while len(futures) >= self.workers * 4:
+                    name_done, chunks = futures.pop(0).result()
+                    if chunks is not None:
+                        pending_chunks.extend(chunks)
+                        pending_files.append((name_done, len(chunks)))
+                        if len(pending_chunks) >= self.embed_batch:
+                            flush()
+            job.enumeration_done()
+
+            for future in futures:
+                name_done, chunks = future.result()
+                if chunks is not None:
+                    pending_chunks.extend(chunks)
+                    pending_files.append((name_done, len(chunks)))
+                    if len(pending_chunks) >= self.embed_batch:
+                        flush()
+            flush()
+
+    async def _publish(self, job: IngestJob):
+        if self.store is None or not getattr(self.store, "shared", False):
+            return
+        try:
+            await self.store.set(f"ingest_job:{job.id}", json.dumps(job.to_dict()), ttl=3600)
+        except Exception as e:
+            print(f"Publishing ingest progress failed: {e}")
+
+    async def run(self, job: IngestJob):
+        """Run a staged job to completion, publishing progress every half second"""
+        worker = asyncio.create_task(asyncio.to_thread(self._ingest, job))
+        try:
+            while not worker.done():
+                await self._publish(job)
+                await asyncio.wait({worker}, timeout=0.5)
+            worker.result()
+            job.status = "done"
+            print(f"✅ Bulk ingest {job.id}: {job.files_done} files, {job.chunks} chunks")
+        except Exception as e:
+            job.status = "error"
+            job.error(str(e))
+            print(f"⚠️ Bulk ingest {job.id} failed: {e}")
+        finally:
+            job.finished = time.time()
+            shutil.rmtree(job.staging_dir, ignore_errors=True)
+            await self._publish(job)
+
+    def start(self, job: IngestJob) -> asyncio.Task:
+        # Keep a reference so the running job is not garbage-collected
+        task = asyncio.create_task(self.run(job))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is not None and getattr(self.store, "shared", False):
+            raw = await self.store.get(f"ingest_job:{job_id}")
+            return json.loads(raw) if raw else None
+        return None
@@ -0,0 +1,83 @@
+"""
+Source metadata and incremental citation tracking for /ws/chat
+
+Every retrieved source (web or local-docs result, uploaded-document chunk) is
+numbered once per turn and sent to the client in a single "sources" frame
+before the first token. As the model streams, CitationTracker spots
+[Source N] markers, including ones split across tokens, so each citation can
+be announced with a small "citation" frame the moment it first appears.
+"""
+
+import re
+from typing import Any, Dict, List
+
+SOURCE_MARKER_RE = re.compile(r"\[Sources? (\d+(?:\s*(?:,|and)\s*\d+)*)\]")
+# Longest unfinished marker worth holding back between tokens
+MAX_MARKER_CHARS = 48
+
+
+def build_sources(web_results: List[Dict[str, Any]], local_docs: bool,
+                  doc_hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Number web results first, then uploaded-document chunks"""
+    sources = []
+    for result in web_results:
+        source = {
+            "n": len(sources) + 1,
+            "type": "local_docs" if local_docs else "web",
+            "title": result.get("title", ""),
+            "url": result.get("url", "")
+        }
+        if "score" in result:
+            source["score"] = result["score"]
+        sources.append(source)
+
+    for hit in doc_hits:
+        first_line = hit["text"].strip().split("\n", 1)[0]
+        sources.append({
+            "n": len(sources) + 1,
+            "type": "document",
+            "id": hit["id"],
+            "score": hit["score"],
+            "title": first_line[:80],
+            "preview": hit["text"][:200]
+        })
+    return sources
+
+
+def format_sources(sources: List[Dict[str, Any]]) -> str:
+    """Markdown sources list stored with the answer in the chat history"""
+    web = [s for s in sources if s["type"] != "document"]
+    if not web:
+        return ""
+    header = "\n\n**Sources (Local Docs):**\n" if web[0]["type"] == "local_docs" \
+        else "\n\n**Sources (Web Research):**\n"
+    return header + "".join(f"{s['n']}. [{s['title']}]({s['url']})\n" for s in web)
+
+
+class CitationTracker:
+    """Resolve [Source N] markers in a token stream as soon as they are complete"""
+
+    def __init__(self, sources: List[Dict[str, Any]]):
+        self.known = {source["n"] for source in sources}
+        self.cited: List[int] = []
+        self._pending = ""
+
+    def feed(self, token: str) -> List[int]:
+        """Return source numbers cited for the first time by this token"""
+        if not self.known:
+            return []
+        text = self._pending + token
+        new = []
+        last_end = 0
+        for match in SOURCE_MARKER_RE.finditer(text):
+            for number in map(int, re.findall(r"\d+", match.group(1))):
+                if number in self.known and number not in self.cited:
+                    self.cited.append(number)
+                    new.append(number)
+            last_end = match.end()
+
+        # Carry over a trailing "[Sour..." that the next token may complete
+        rest = text[last_end:]
+        start = rest.rfind("[")
+        self._pending = rest[start:] if start != -1 and len(rest) - start < MAX_MARKER_CHARS else ""
+        return new
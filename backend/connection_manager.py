@@ -0,0 +1,204 @@
+"""
+Connection registry, generation limits and send backpressure for /ws/chat
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Set, Any, Optional
+
+from fastapi import WebSocket
+
+from metrics import Counter
+from shared_state import WORKER_ID
+
+SLOW_CONSUMERS = Counter(
+    "devassist_ws_slow_consumers_total",
+    "WebSocket frames dropped or connections aborted because the client reads too slowly",
+    ("action",)
+)
+GENERATIONS_REJECTED = Counter(
+    "devassist_generations_rejected_total",
+    "Chat turns rejected because a concurrency limit was reached",
+    ("scope",)
+)
+
+
+class CapacityError(Exception):
+    """Raised when a generation slot cannot be acquired"""
+
+
+class Connection:
+    """
+    One accepted WebSocket with a bounded outgoing queue drained by a
+    dedicated sender task. Producers never write to the socket directly, so a
+    slow reader only ever costs `max_queue` frames of memory.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str, max_queue: int, send_timeout: float):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.send_timeout = send_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.tasks: Set[asyncio.Task] = set()
+        # Speculative retrieval for the message being typed (see prefetch.py)
+        self.draft = None
+        self.draft_retrievals = 0
+        self.closed = False
+        self.sender = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        try:
+            while True:
+                payload = await self.queue.get()
+                await self.websocket.send_json(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.abort()
+
+    async def send_json(self, payload: Dict[str, Any], droppable: bool = False):
+        """
+        Queue a frame for the client. Droppable frames (progress/status) are
+        discarded when the queue is full; other frames wait up to
+        `send_timeout` for space before the connection is aborted.
+        """
+        if self.closed:
+            raise ConnectionError("WebSocket closed")
+        try:
+            self.queue.put_nowait(payload)
+            return
+        except asyncio.QueueFull:
+            if droppable:
+                SLOW_CONSUMERS.inc(action="drop")
+                return
+        try:
+            await asyncio.wait_for(self.queue.put(payload), timeout=self.send_timeout)
+        except asyncio.TimeoutError:
+            SLOW_CONSUMERS.inc(action="abort")
+            print(f"⚠️ Aborting slow WebSocket consumer for user {self.user_id}")
+            self.abort()
+            raise ConnectionError("WebSocket consumer too slow")
+
+    def start_task(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def abort(self):
+        """Stop sending and cancel every in-flight turn for this socket"""
+        if self.closed:
+            return
+        self.closed = True
+        for task in list(self.tasks):
+            task.cancel()
+        self.sender.cancel()
+        asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=1013)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    """
+    Tracks every open /ws/chat socket per user (several tabs no longer
+    overwrite each other) and caps concurrent generations per user and
+    process-wide.
+
+    With a shared store, the per-user generation count is kept there, so the
+    per-user cap holds across workers and nodes.
+    """
+
+    # Shared counters expire this long after creation, so slots leaked by a
+    # crashed worker are freed even while the user keeps chatting
+    SHARED_TTL = 300
+
+    def __init__(self, max_generations: int = None, max_generations_per_user: int = None,
+                 max_queue: int = None, send_timeout: float = None, store=None):
+        self.store = store if store is not None and getattr(store, "shared", False) else None
+        self.max_generations = max_generations or int(os.getenv("MAX_GENERATIONS", "64"))
+        self.max_generations_per_user = max_generations_per_user or \
+            int(os.getenv("MAX_GENERATIONS_PER_USER", "2"))
+        self.max_queue = max_queue or int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+        self.send_timeout = send_timeout or float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+        self.connections: Dict[str, Set[Connection]] = {}
+        self.generations = 0
+        self.user_generations: Dict[str, int] = {}
+
+    def connect(self, websocket: WebSocket, user_id: str) -> Connection:
+        conn = Connection(websocket, user_id, self.max_queue, self.send_timeout)
+        self.connections.setdefault(user_id, set()).add(conn)
+        return conn
+
+    def rebind(self, conn: Connection, user_id: str):
+        """Move a connection to the user id named in its first message"""
+        if conn.user_id == user_id:
+            return
+        self._remove(conn)
+        conn.user_id = user_id
+        self.connections.setdefault(user_id, set()).add(conn)
+
+    async def _user_generations(self, user_id: str, delta: int) -> int:
+        """Adjust and return the user's in-flight generation count"""
+        if self.store is not None:
+            key = f"generations:{user_id}"
+            if delta < 0:
+                # If the counter expired mid-generation, a release must not recreate it below 0
+                return await self.store.decr(key, -delta)
+            return await self.store.incr(key, delta, ttl=self.SHARED_TTL)
+        count = self.user_generations.get(user_id, 0) + delta
+        if count > 0:
+            self.user_generations[user_id] = count
+        else:
+            self.user_generations.pop(user_id, None)
+        return count
+
+    def _remove(self, conn: Connection):
+        user_conns = self.connections.get(conn.user_id)
+        if user_conns is not None:
+            user_conns.discard(conn)
+            if not user_conns:
+                del self.connections[conn.user_id]
+
+    def disconnect(self, conn: Connection):
+        """Unregister a socket and cancel its upstream work"""
+        conn.closed = True
+        for task in list(conn.tasks):
+            task.cancel()
+        conn.sender.cancel()
+        self._remove(conn)
+
+    @asynccontextmanager
+    async def generation_slot(self, user_id: str):
+        """Reserve one generation slot, raising CapacityError when a cap is reached"""
+        if self.generations >= self.max_generations:
+            GENERATIONS_REJECTED.inc(scope="global")
+            raise CapacityError("⏱️ Traffic is high. Please wait a few seconds.")
+
+        if await self._user_generations(user_id, 1) > self.max_generations_per_user:
+            await self._user_generations(user_id, -1)
+            GENERATIONS_REJECTED.inc(scope="user")
+            raise CapacityError("Too many requests in progress. Please wait for the current answer.")
+
+        self.generations += 1
+        try:
+            yield
+        finally:
+            self.generations -= 1
+            await asyncio.shield(self._user_generations(user_id, -1))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker": WORKER_ID,
+            "shared": self.store is not None,
+            "users": len(self.connections),
+            "connections": sum(len(c) for c in self.connections.values()),
+            "generations": self.generations,
+            "max_generations": self.max_generations,
+            "max_generations_per_user": self.max_generations_per_user
+        }
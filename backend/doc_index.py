@@ -0,0 +1,313 @@
+"""
+Local documentation index for the queryLocalDocs MCP tool
+
+Programming reference docs (Markdown, text, reStructuredText or HTML dumps)
+are chunked and embedded offline with the RAG embedding model. Queries run a
+hybrid search: cosine similarity over the embeddings and BM25 over the chunk
+text, merged with reciprocal rank fusion. No network is needed at query time.
+
+Build an index with:
+    python3 doc_index.py build --source docs/python --base-url https://docs.python.org/3/
+    python3 doc_index.py search "asyncio gather timeout"
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+DOC_SUFFIXES = (".md", ".txt", ".rst", ".html", ".htm")
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$|^(.+)\n([=\-~^]{3,})$", re.MULTILINE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class _TextExtractor(HTMLParser):
+    """Visible text of an HTML page, with headings kept as Markdown headings"""
+
+    SKIP = {"script", "style", "nav", "header", "footer"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.skipping = 0
+        self.title = ""
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        elif tag == "title":
+            self._in_title = True
+        elif re.fullmatch(r"h[1-6]", tag):
+            self.parts.append("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag in ("p", "pre", "li", "div", "br", "tr"):
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif re.fullmatch(r"h[1-6]", tag):
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self.skipping:
+            self.parts.append(data)
+
+
+def read_document(path: Path):
+    """Return (title, text) for a documentation file"""
+    raw = path.read_text(errors="ignore")
+    if path.suffix in (".html", ".htm"):
+        extractor = _TextExtractor()
+        extractor.feed(raw)
+        text = re.sub(r"\n{3,}", "\n\n", "".join(extractor.parts))
+        return extractor.title.strip() or path.stem, text
+    match = HEADING_RE.search(raw)
+    title = (match.group(2) or match.group(3)).strip() if match else path.stem
+    return title, raw
+
+
+def chunk_document(title: str, text: str, max_chars: int = 1200) -> List[Dict[str, str]]:
+    """
+    Split a document at its headings, then pack paragraphs into chunks of at
+    most `max_chars`. Each chunk is titled with its nearest heading.
+    """
+    sections = []
+    last, heading = 0, title
+    for match in HEADING_RE.finditer(text):
+        sections.append((heading, text[last:match.start()]))
+        heading = (match.group(2) or match.group(3)).strip()
+        last = match.end()
+    sections.append((heading, text[last:]))
+
+    chunks = []
+    for heading, body in sections:
+        current = ""
+        for paragraph in re.split(r"\n\s*\n", body):
+            paragraph = paragraph.strip()
+            # Oversized paragraphs (long code listings) are cut into pieces
+            for start in range(0, len(paragraph), max_chars):
+                piece = paragraph[start:start + max_chars]
+                if current and len(current) + len(piece) > max_chars:
+                    chunks.append({"title": heading, "text": current})
+                    current = ""
+                current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            chunks.append({"title": heading, "text": current})
+    return chunks
+
+
+class BM25:
+    """Okapi BM25 over tokenized chunks, kept as an in-memory inverted index"""
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lengths = np.array([len(d) for d in documents], dtype=np.float32)
+        self.avg_length = float(self.lengths.mean()) if len(documents) else 0.0
+        self.postings: Dict[str, List[tuple]] = defaultdict(list)
+        for doc_id, tokens in enumerate(documents):
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((doc_id, tf))
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+                    for term, p in self.postings.items()}
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / self.avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+class DocIndex:
+    """
+    A prebuilt documentation index loaded from `index_dir`:
+        manifest.json   model, chunk count, sources
+        vectors.npy     float16 L2-normalized chunk embeddings
+        chunks.jsonl    one {"title", "url", "text"} per row
+    """
+
+    RRF_K = 60
+
+    def __init__(self, index_dir: str = None, embed: Callable[[str], List[float]] = None):
+        self.index_dir = Path(index_dir or os.getenv("DOCS_INDEX_DIR", "docs_index"))
+        self.embed = embed
+        self.manifest: Dict = {}
+        self.chunks: List[Dict[str, str]] = []
+        self.vectors: Optional[np.ndarray] = None
+        self.bm25: Optional[BM25] = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return (self.index_dir / "manifest.json").exists()
+
+    def load(self):
+        with self._lock:
+            if self.vectors is not None:
+                return
+            if not self.available:
+                raise RuntimeError(f"No documentation index at {self.index_dir}. "
+                                   f"Run 'python3 doc_index.py build' first.")
+            started = time.perf_counter()
+            manifest = json.loads((self.index_dir / "manifest.json").read_text())
+            self._check_embedder(manifest)
+            self.manifest = manifest
+            with open(self.index_dir / "chunks.jsonl") as f:
+                self.chunks = [json.loads(line) for line in f]
+            self.bm25 = BM25([tokenize(f"{c['title']} {c['text']}") for c in self.chunks])
+            # Stored as float16 on disk; scored in float32
+            self.vectors = np.load(self.index_dir / "vectors.npy").astype(np.float32)
+            if self.embed is None:
+                from embeddings import create_embedder
+                embedder = create_embedder()
+                self.embed = lambda text: embedder.encode([text])[0]
+            print(f"📚 Loaded documentation index ({len(self.chunks)} chunks) "
+                  f"in {time.perf_counter() - started:.2f}s")
+
+    def _check_embedder(self, manifest: Dict):
+        """Refuse an index embedded with another model; warn about another backend"""
+        from embeddings import MODEL_NAME, backend_name
+
+        model = manifest.get("model")
+        if model and model != MODEL_NAME:
+            raise RuntimeError(f"Documentation index at {self.index_dir} was built with {model}, "
+                               f"but queries are embedded with {MODEL_NAME}. Rebuild the index.")
+        backend = manifest.get("embedding_backend")
+        if backend and backend != backend_name():
+            print(f"⚠️ Documentation index at {self.index_dir} was embedded with the {backend} backend "
+                  f"but queries use {backend_name()}; scores may drift. Rebuild the index to match.")
+
+    def search(self, query: str, top_k: int = 5, candidates: int = 50) -> List[Dict]:
+        """Hybrid search; each hit carries its cosine similarity as `score`"""
+        self.load()
+        if not self.chunks:
+            return []
+
+        query_vector = np.asarray(self.embed(query), dtype=np.float32)
+        cosine = self.vectors @ query_vector
+        keyword = self.bm25.scores(query)
+
+        fused = defaultdict(float)
+        for scores in (cosine, keyword):
+            count = min(candidates, len(scores))
+            top = np.argpartition(-scores, count - 1)[:count]
+            for rank, doc_id in enumerate(top[np.argsort(-scores[top])]):
+                if scores[doc_id] > 0:
+                    fused[int(doc_id)] += 1.0 / (self.RRF_K + rank + 1)
+
+        ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        return [{**self.chunks[i], "score": round(float(cosine[i]), 4)} for i in ranked]
+
+    def query(self, query: str, max_results: int = 5) -> Dict:
+        """queryLocalDocs tool response, shared by the in-process and MCP server paths"""
+        if not self.available:
+            return {
+                "error": "No local documentation index has been built",
+                "query": query,
+                "results": []
+            }
+
+        results = [{
+            "title": hit["title"],
+            "url": hit["url"],
+            "snippet": hit["text"][:500],
+            "score": hit["score"]
+        } for hit in self.search(query, max_results)]
+
+        return {
+            "query": query,
+            "results": results,
+            "count": len(results),
+            "sources": [{"title": r["title"], "url": r["url"]} for r in results],
+            "source": "local_docs"
+        }
+
+
+def build_index(source: str, output: str, base_url: str = "", max_chars: int = 1200,
+                batch_size: int = 64):
+    """Chunk and embed every doc file under `source` into `output`"""
+    from embeddings import create_embedder, MODEL_NAME
+
+    source_dir = Path(source)
+    files = sorted(p for p in source_dir.rglob("*") if p.is_file() and p.suffix.lower() in DOC_SUFFIXES)
+    chunks = []
+    for path in files:
+        title, text = read_document(path)
+        relative = path.relative_to(source_dir).as_posix()
+        url = base_url + relative if base_url else relative
+        for chunk in chunk_document(title, text, max_chars):
+            chunks.append({"title": chunk["title"], "url": url, "text": chunk["text"]})
+    print(f"📄 {len(files)} files -> {len(chunks)} chunks")
+
+    embedder = create_embedder()
+    started = time.perf_counter()
+    vectors = [embedder.encode([f"{c['title']}\n{c['text']}" for c in chunks[i:i + batch_size]])
+               for i in range(0, len(chunks), batch_size)]
+    vectors = np.vstack(vectors).astype(np.float16) if vectors else np.zeros((0, 0), np.float16)
+    print(f"🧮 Embedded in {time.perf_counter() - started:.1f}s")
+
+    out = Path(output)
+    out.mkdir(parents=True, exist_ok=True)
+    np.save(out / "vectors.npy", vectors)
+    with open(out / "chunks.jsonl", "w") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk) + "\n")
+    (out / "manifest.json").write_text(json.dumps({
+        "model": MODEL_NAME,
+        "embedding_backend": embedder.name,
+        "chunks": len(chunks),
+        "files": len(files),
+        "source": str(source_dir),
+        "base_url": base_url,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }, indent=2))
+    print(f"✅ Index written to {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local documentation index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Index a directory of documentation")
+    build.add_argument("--source", required=True, help="Directory of .md/.txt/.rst/.html docs")
+    build.add_argument("--output", default=os.getenv("DOCS_INDEX_DIR", "docs_index"))
+    build.add_argument("--base-url", default="", help="Prefix that turns file paths into citation URLs")
+    build.add_argument("--max-chars", type=int, default=1200)
+    search = sub.add_parser("search", help="Query an index")
+    search.add_argument("query")
+    search.add_argument("--index", default=os.getenv("DOCS_INDEX_DIR", "docs_index"))
+    search.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.source, args.output, args.base_url, args.max_chars)
+    else:
+        index = DocIndex(args.index)
+        started = time.perf_counter()
+        hits = index.search(args.query, args.k)
+        print(f"⏱️ {1000 * (time.perf_counter() - started):.1f} ms")
+        for hit in hits:
+            print(f"{hit['score']:.3f}  {hit['title']}  ({hit['url']})")
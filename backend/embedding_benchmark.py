@@ -0,0 +1,189 @@
+"""
+Compare embedding backends for RAGEngine on throughput and retrieval recall
+
+The full-precision sentence-transformers model is the reference. For every
+other backend the benchmark reports ingest throughput, single-query latency,
+batched concurrent-query throughput and recall@k of its nearest neighbours
+against the reference.
+
+Usage:
+    python3 embeddings.py export
+    python3 embedding_benchmark.py --corpus ../docs --output embedding_benchmark.json
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from embeddings import SentenceTransformerEmbedder, OnnxEmbedder, BatchingEmbedder, MODEL_NAME
+
+SAMPLE_CORPUS = [
+    "Use list slicing with a negative step, items[::-1], to get a reversed copy of a Python list.",
+    "list.reverse() reverses a Python list in place and returns None.",
+    "A dictionary comprehension builds a dict from an iterable: {k: v for k, v in pairs}.",
+    "asyncio.gather runs awaitables concurrently and returns their results in order.",
+    "asyncio.wait_for cancels the awaitable and raises TimeoutError when the timeout expires.",
+    "In JavaScript, Array.prototype.map returns a new array with the callback applied to each element.",
+    "Promise.all rejects as soon as one of the input promises rejects.",
+    "git rebase -i lets you reorder, squash or edit commits on the current branch.",
+    "git cherry-pick applies the changes introduced by an existing commit onto the current branch.",
+    "A SQL LEFT JOIN returns every row from the left table and matching rows from the right table.",
+    "Create an index on columns used in WHERE clauses to speed up lookups.",
+    "FastAPI dependencies are declared with Depends and resolved per request.",
+    "A WebSocket endpoint in FastAPI is declared with @app.websocket and must call accept().",
+    "Docker multi-stage builds copy only the build artifacts into the final image.",
+    "Kubernetes Deployments manage ReplicaSets and perform rolling updates.",
+    "Rust ownership rules: each value has one owner, and the value is dropped when the owner goes out of scope.",
+    "Borrowing in Rust allows either one mutable reference or any number of immutable references.",
+    "Go goroutines are lightweight threads managed by the Go runtime; channels pass values between them.",
+    "A binary search runs in O(log n) time on a sorted array.",
+    "Quicksort has O(n log n) average time complexity and O(n^2) worst case.",
+    "A hash map offers average O(1) insertion and lookup.",
+    "Vue computed properties are cached based on their reactive dependencies.",
+    "React useEffect runs after render; return a cleanup function to unsubscribe.",
+    "TypeScript generics let functions work over many types while keeping type safety.",
+    "Python dataclasses generate __init__, __repr__ and __eq__ from class annotations.",
+    "Use functools.lru_cache to memoize pure functions with hashable arguments.",
+    "The GIL prevents multiple native threads from executing Python bytecode at once.",
+    "Use multiprocessing or a process pool for CPU-bound work in Python.",
+    "HTTP 429 Too Many Requests means the client is being rate limited.",
+    "Exponential backoff with jitter spreads retries out to avoid thundering herds.",
+    "JWTs carry a header, a payload of claims and a signature.",
+    "CORS headers tell browsers which origins may read a cross-origin response.",
+]
+
+
+def load_corpus(path: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    if not path:
+        return list(SAMPLE_CORPUS)
+    chunks = []
+    for file in sorted(Path(path).rglob("*")):
+        if file.suffix not in (".txt", ".md", ".rst") or not file.is_file():
+            continue
+        text = file.read_text(errors="ignore")
+        start = 0
+        while start < len(text):
+            chunks.append(text[start:start + chunk_size])
+            start += chunk_size - overlap
+    return chunks
+
+
+def make_queries(chunks: List[str], count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    picked = rng.sample(chunks, min(count, len(chunks)))
+    # A short prefix of a chunk stands in for a user question about it
+    return [" ".join(chunk.split()[:10]) for chunk in picked]
+
+
+def top_k(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def benchmark_backend(name: str, embedder, chunks: List[str], queries: List[str], concurrency: int) -> dict:
+    embedder.encode(chunks[:8])  # warm up
+
+    started = time.perf_counter()
+    doc_vectors = np.vstack([embedder.encode(chunks[i:i + 64]) for i in range(0, len(chunks), 64)])
+    ingest_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        embedder.encode([query])
+        latencies.append(time.perf_counter() - started)
+
+    batcher = BatchingEmbedder(embedder)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        query_vectors = np.vstack(list(pool.map(batcher.embed, queries)))
+    concurrent_seconds = time.perf_counter() - started
+
+    return {
+        "name": name,
+        "doc_vectors": doc_vectors,
+        "query_vectors": query_vectors,
+        "report": {
+            "ingest_chunks_per_sec": round(len(chunks) / ingest_seconds, 2),
+            "query_latency_ms_p50": round(statistics.median(latencies) * 1000, 3),
+            "query_latency_ms_p95": round(percentile(latencies, 95) * 1000, 3),
+            "concurrent_queries_per_sec": round(len(queries) / concurrent_seconds, 2)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG embedding backends")
+    parser.add_argument("--corpus", help="Directory of .txt/.md/.rst files (default: built-in sample)")
+    parser.add_argument("--model", default=MODEL_NAME, help="Reference sentence-transformers model")
+    parser.add_argument("--onnx-dir", default="models/all-MiniLM-L6-v2-onnx")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", default="embedding_benchmark.json")
+    args = parser.parse_args()
+
+    chunks = load_corpus(args.corpus)
+    queries = make_queries(chunks, args.queries)
+    threads = args.threads or None
+    print(f"📚 {len(chunks)} chunks, {len(queries)} queries, k={args.k}")
+
+    candidates = [("sentence-transformers", lambda: SentenceTransformerEmbedder(args.model, threads=threads))]
+    for quantized in (False, True):
+        label = "onnx-int8" if quantized else "onnx-fp32"
+        candidates.append((label, lambda q=quantized: OnnxEmbedder(args.onnx_dir, quantized=q, threads=threads)))
+
+    results = []
+    for name, factory in candidates:
+        try:
+            embedder = factory()
+        except Exception as e:
+            print(f"⚠️ Skipping {name}: {e}")
+            continue
+        print(f"⏱️ Benchmarking {name}...")
+        results.append(benchmark_backend(name, embedder, chunks, queries, args.concurrency))
+
+    if not results:
+        print("❌ No embedding backend could be loaded")
+        sys.exit(1)
+
+    # Quality is only comparable against the full-precision reference
+    reference = results[0] if results[0]["name"] == "sentence-transformers" else None
+    if reference is None:
+        print("⚠️ Reference model unavailable; reporting speed only")
+    else:
+        reference_top = top_k(reference["doc_vectors"], reference["query_vectors"], args.k)
+    report = {"corpus_chunks": len(chunks), "queries": len(queries), "k": args.k, "backends": {}}
+    for result in results:
+        if reference is None:
+            report["backends"][result["name"]] = result["report"]
+            continue
+        candidate_top = top_k(result["doc_vectors"], result["query_vectors"], args.k)
+        overlap = [len(set(a) & set(b)) / args.k for a, b in zip(reference_top, candidate_top)]
+        result["report"][f"recall_at_{args.k}_vs_reference"] = round(float(np.mean(overlap)), 4)
+        result["report"]["mean_cosine_vs_reference"] = round(float(np.mean(
+            np.sum(result["doc_vectors"] * reference["doc_vectors"], axis=1)
+        )), 4)
+        report["backends"][result["name"]] = result["report"]
+
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Embedding backends for RAGEngine
+
+EMBEDDING_BACKEND selects the implementation:
+    sentence-transformers   full-precision PyTorch (default)
+    onnx                    ONNX Runtime, optionally int8-quantized
+
+Export the ONNX model once with:
+    python3 embeddings.py export --output models/all-MiniLM-L6-v2-onnx
+"""
+
+import argparse
+import inspect
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class SentenceTransformerEmbedder:
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = MODEL_NAME, threads: int = None):
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+class OnnxEmbedder:
+    """
+    Mean-pooled, L2-normalized MiniLM embeddings computed with ONNX Runtime.
+    Expects a directory holding tokenizer.json and model.onnx or
+    model_int8.onnx, as written by `export_onnx`.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str = None, quantized: bool = None, threads: int = None,
+                 max_length: int = 256, batch_size: int = None):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise RuntimeError("EMBEDDING_BACKEND=onnx needs the 'onnxruntime' and 'tokenizers' packages")
+
+        model_dir = Path(model_dir or os.getenv("EMBEDDING_ONNX_DIR", "models/all-MiniLM-L6-v2-onnx"))
+        if quantized is None:
+            quantized = os.getenv("EMBEDDING_QUANTIZED", "true").lower() == "true"
+        model_file = model_dir / ("model_int8.onnx" if quantized else "model.onnx")
+        if not model_file.exists():
+            hint = " without --no-quantize, or set EMBEDDING_QUANTIZED=false to use model.onnx" if quantized else ""
+            raise RuntimeError(f"ONNX model not found at {model_file}. "
+                               f"Run 'python3 embeddings.py export --output {model_dir}'{hint}.")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.quantized = quantized
+        # Hidden states are batch x longest sequence x 384 floats, so never run a whole upload at once
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_ONNX_BATCH", "32"))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        batches = [self._encode_batch(texts[i:i + self.batch_size])
+                   for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return (pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)).astype(np.float32)
+
+
+class BatchingEmbedder:
+    """
+    Coalesces single-text embedding calls made concurrently from different
+    threads into one batched `encode`. A lone request is encoded right away;
+    only while the model is busy do requests queue up, waiting at most
+    `max_wait` seconds for company before the next batch is sent.
+    """
+
+    def __init__(self, embedder, max_batch: int = None, max_wait: float = None):
+        self.embedder = embedder
+        self.max_batch = max_batch or int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+        self.max_wait = max_wait if max_wait is not None else \
+            float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "2")) / 1000
+        self.requests: "queue.Queue[tuple]" = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True, name="embedding-batcher")
+        self.worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self.requests.get()]
+            # Take whatever queued up during the previous encode without waiting
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self.requests.get_nowait())
+            except queue.Empty:
+                pass
+            # Others are already waiting, so give the rest of their burst a moment
+            if len(batch) > 1:
+                try:
+                    while len(batch) < self.max_batch:
+                        batch.append(self.requests.get(timeout=self.max_wait))
+                except queue.Empty:
+                    pass
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.embedder.encode(texts)
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    def embed(self, text: str) -> np.ndarray:
+        future = Future()
+        self.requests.put((text, future))
+        return future.result()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        # Bulk ingest is already batched; bypass the queue
+        return self.embedder.encode(texts)
+
+
+def backend_name(backend: str = None) -> str:
+    """Name of the embedder `create_embedder(backend)` returns"""
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "sentence-transformers")).lower()
+    return OnnxEmbedder.name if backend == "onnx" else SentenceTransformerEmbedder.name
+
+
+def create_embedder(backend: str = None):
+    threads = int(os.getenv("EMBEDDING_THREADS", "0")) or None
+    if backend_name(backend) == OnnxEmbedder.name:
+        return OnnxEmbedder(threads=threads)
+    return SentenceTransformerEmbedder(threads=threads)
+
+
+def export_onnx(output_dir: str, quantize: bool = True, model_name: str = MODEL_NAME):
+    """Export the sentence-transformer to ONNX and optionally write an int8 copy"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    auto_model = st_model[0].auto_model.eval()
+
+    class Encoder(torch.nn.Module):
+        # Keyword arguments keep the export independent of forward()'s positional order
+        def __init__(self):
+            super().__init__()
+            self.model = auto_model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    transformer = Encoder().eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(str(output))
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    inputs = (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"])
+    dynamic = {0: "batch", 1: "sequence"}
+    # Newer torch defaults to the dynamo exporter, which needs onnxscript
+    extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            inputs,
+            str(output / "model.onnx"),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": dynamic,
+                "attention_mask": dynamic,
+                "token_type_ids": dynamic,
+                "last_hidden_state": dynamic
+            },
+            opset_version=14,
+            **extra
+        )
+    print(f"✅ Exported {output / 'model.onnx'}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(str(output / "model.onnx"), str(output / "model_int8.onnx"),
+                         weight_type=QuantType.QInt8)
+        print(f"✅ Quantized {output / 'model_int8.onnx'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export the embedding model to ONNX")
+    export.add_argument("--output", default="models/all-MiniLM-L6-v2-onnx")
+    # EMBEDDING_QUANTIZED defaults to true, so the int8 model is written unless asked not to
+    export.add_argument("--no-quantize", action="store_true", help="Skip the int8-quantized model")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.output, quantize=not args.no_quantize)
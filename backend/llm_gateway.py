@@ -0,0 +1,260 @@
+"""
+Provider-agnostic LLM gateway with client-side rate limiting, retries and
+model fallback
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from metrics import RATE_LIMITS
+
+
+class RateLimitError(Exception):
+    """Raised when the provider keeps returning 429 after all retries"""
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    if status == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate_limit" in message or "rate limit" in message
+
+
+class TokenBucket:
+    """
+    Async token bucket. `rate` tokens are added per second up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` tokens are available and take them"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def try_acquire(self, amount: float = 1) -> float:
+        """Take `amount` tokens if available; otherwise return seconds until they are"""
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def release(self, amount: float = 1):
+        """Return tokens taken for work that never ran"""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMBackend:
+    """
+    Base class for chat completion backends. Implementations stream the
+    assistant reply as text fragments.
+    """
+
+    name = "base"
+
+    async def stream(self, messages: List[Dict[str, str]], model: str,
+                     temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield
+
+
+class GroqBackend(LLMBackend):
+    name = "groq"
+
+    def __init__(self, api_key: str = None):
+        from groq import AsyncGroq
+        # Retries happen in LLMGateway; SDK retries would multiply them
+        self.client = AsyncGroq(api_key=api_key or os.getenv("GROQ_API_KEY"), max_retries=0)
+
+    async def stream(self, messages, model, temperature, max_tokens):
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any server exposing the OpenAI `/chat/completions` SSE API
+    (vLLM, llama.cpp server, Ollama, LM Studio, ...)
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url: str = None, api_key: str = None, timeout: float = 120.0):
+        self.base_url = (base_url or os.getenv("LLM_BASE_URL", "http://localhost:8080/v1")).rstrip("/")
+        self.api_key = api_key or os.getenv("LLM_API_KEY", "")
+        self.client = httpx.AsyncClient(timeout=timeout)
+
+    async def stream(self, messages, model, temperature, max_tokens):
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        async with self.client.stream("POST", f"{self.base_url}/chat/completions",
+                                      json=payload, headers=headers) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+
+
+class MockBackend(LLMBackend):
+    """
+    Deterministic offline streamer for tests and load tests. The reply is
+    derived from the last user message, so identical prompts produce
+    identical streams.
+    """
+
+    name = "mock"
+
+    def __init__(self, first_token_delay: float = None, token_delay: float = None,
+                 reply_tokens: int = None):
+        self.first_token_delay = first_token_delay if first_token_delay is not None else \
+            float(os.getenv("MOCK_LLM_FIRST_TOKEN_DELAY", "0.05"))
+        self.token_delay = token_delay if token_delay is not None else \
+            float(os.getenv("MOCK_LLM_TOKEN_DELAY", "0.005"))
+        self.reply_tokens = reply_tokens if reply_tokens is not None else \
+            int(os.getenv("MOCK_LLM_REPLY_TOKENS", "64"))
+
+    async def stream(self, messages, model, temperature, max_tokens):
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        words = (question.split() or ["mock"])
+        await asyncio.sleep(self.first_token_delay)
+        for i in range(min(self.reply_tokens, max_tokens)):
+            yield ("" if i == 0 else " ") + words[i % len(words)]
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+
+
+BACKENDS = {
+    "groq": GroqBackend,
+    "openai": OpenAICompatibleBackend,
+    "mock": MockBackend,
+}
+
+
+class LLMGateway:
+    """
+    Front door for all chat completions.
+
+    Requests pass through request and token buckets before reaching the
+    backend. Failures that happen before the first token are retried with
+    jittered exponential backoff; on a 429 the gateway falls back to a
+    smaller model for the remaining attempts.
+    """
+
+    def __init__(self, backend: Optional[LLMBackend] = None, model: str = None,
+                 fallback_model: str = None, max_retries: int = None,
+                 requests_per_minute: float = None, tokens_per_minute: float = None):
+        if backend is None:
+            backend = BACKENDS[os.getenv("LLM_BACKEND", "groq").lower()]()
+        self.backend = backend
+        self.model = model or os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+        self.fallback_model = fallback_model if fallback_model is not None else \
+            os.getenv("LLM_FALLBACK_MODEL", "llama-3.1-8b-instant")
+        self.max_retries = max_retries if max_retries is not None else \
+            int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+        rpm = requests_per_minute or float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+        tpm = tokens_per_minute or float(os.getenv("LLM_TOKENS_PER_MINUTE", "12000"))
+        self.request_bucket = TokenBucket(rate=rpm / 60, capacity=rpm)
+        self.token_bucket = TokenBucket(rate=tpm / 60, capacity=tpm)
+
+    @staticmethod
+    def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+        # Rough estimate: 4 characters per token
+        return sum(len(m["content"]) for m in messages) // 4 + 1
+
+    @staticmethod
+    def backoff(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+    async def stream_chat(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                          max_tokens: int = 2048, info: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Stream a completion, retrying and falling back until the first token
+        arrives. If `info` is given, its "model" is set to the model that
+        actually produced the reply.
+        """
+        model = self.model
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            await self.request_bucket.acquire()
+            await self.token_bucket.acquire(self.estimate_tokens(messages))
+
+            started = False
+            try:
+                async for token in self.backend.stream(messages, model, temperature, max_tokens):
+                    if not started and info is not None:
+                        info["model"] = model
+                    started = True
+                    yield token
+                return
+            except Exception as e:
+                # Once tokens reached the client a retry would duplicate output
+                if started:
+                    raise
+                last_error = e
+                if is_rate_limit_error(e):
+                    RATE_LIMITS.inc(model=model)
+                    if self.fallback_model and model != self.fallback_model:
+                        print(f"⏱️ {model} rate limited, falling back to {self.fallback_model}")
+                        model = self.fallback_model
+                elif attempt >= self.max_retries:
+                    raise
+                if attempt < self.max_retries:
+                    delay = self.backoff(attempt)
+                    print(f"⚠️ LLM attempt {attempt + 1} failed ({e}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+        if last_error is not None and is_rate_limit_error(last_error):
+            raise RateLimitError(str(last_error))
+        raise last_error
@@ -0,0 +1,345 @@
+"""
+End-to-end WebSocket load test for /ws/chat
+
+Starts the FastAPI app in-process with a mock LLM backend, an in-memory
+chat store and a fake web search, then drives N concurrent WebSocket
+clients against it and writes the results as JSON.
+
+Usage:
+    python3 load_test.py --clients 50 --turns 3 --output load_test_results.json
+    python3 load_test.py --baseline load_test_results.json   # fail on regressions
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Configure the app for offline use before it is imported
+os.environ.setdefault("LLM_BACKEND", "mock")
+# Measure the server hot path, not the client-side provider rate limiter or per-user quotas
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000000")
+os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000000")
+os.environ.setdefault("SCHED_QUOTA_BURST", "1000000")
+os.environ.setdefault("SCHED_QUOTA_PER_MINUTE", "1000000")
+
+import memory_manager
+
+
+class InMemoryStore:
+    """Drop-in replacement for MemoryManager that never leaves the process"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def add_message(self, user_id: str, role: str, content: str, session_id: str = None):
+        self.messages.append({
+            "user_id": user_id,
+            "session_id": session_id or "default",
+            "role": role,
+            "content": content
+        })
+
+    async def get_session_history(self, user_id: str, session_id: str, limit: int = 10):
+        return [{"role": m["role"], "content": m["content"]} for m in self.messages
+                if m["user_id"] == user_id and m["session_id"] == session_id][:limit]
+
+    async def get_recent_history(self, user_id: str, limit: int = 100):
+        return [{"role": m["role"], "content": m["content"]} for m in self.messages
+                if m["user_id"] == user_id][-limit:]
+
+    async def get_user_messages(self, user_id: str, limit: int = 200):
+        return [m for m in self.messages if m["user_id"] == user_id][:limit]
+
+    async def clear_history(self, user_id: str):
+        self.messages = [m for m in self.messages if m["user_id"] != user_id]
+        return True
+
+
+memory_manager.MemoryManager = InMemoryStore
+
+import uvicorn
+import websockets
+import main
+
+
+def fake_web_search(delay: float):
+    async def call_tool(tool_name, arguments, timeout=None):
+        await asyncio.sleep(delay)
+        query = arguments.get("query", "")
+        results = [{
+            "title": f"Result {i} for {query}",
+            "url": f"https://example.com/{i}",
+            "snippet": f"Snippet {i} about {query}"
+        } for i in range(1, arguments.get("max_results", 5) + 1)]
+        return {
+            "query": query,
+            "results": results,
+            "count": len(results),
+            "sources": [{"title": r["title"], "url": r["url"]} for r in results]
+        }
+    return call_tool
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    """Tracks the peak RSS of this process (server and clients) while a run is in progress"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = rss_bytes()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self) -> int:
+        self._stop.set()
+        self.thread.join()
+        return max(self.peak, rss_bytes())
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 6) if values else 0.0,
+        "p50": round(percentile(values, 50), 6),
+        "p95": round(percentile(values, 95), 6),
+        "p99": round(percentile(values, 99), 6),
+        "max": round(max(values), 6) if values else 0.0
+    }
+
+
+class ServerThread:
+    """Runs uvicorn in a background thread with its own event loop"""
+
+    def __init__(self, port: int, lag_interval: float):
+        self.port = port
+        self.lag_interval = lag_interval
+        self.lag_samples = []
+        self.loop = None
+        self.server = uvicorn.Server(uvicorn.Config(
+            main.app, host="127.0.0.1", port=port, log_level="warning", ws="websockets"
+        ))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    async def _measure_lag(self):
+        while not self.server.should_exit:
+            started = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            self.lag_samples.append(time.perf_counter() - started - self.lag_interval)
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        lag_task = asyncio.create_task(self._measure_lag())
+        await self.server.serve()
+        lag_task.cancel()
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def run_client(url: str, client_id: int, turns: int, web_search: bool, results: list,
+                     turn_timeout: float):
+    async with websockets.connect(url, max_size=None) as ws:
+        session_id = None
+        for turn in range(turns):
+            sent = time.perf_counter()
+            await ws.send(json.dumps({
+                "message": f"how to reverse a list in python (client {client_id}, turn {turn})",
+                "user_id": f"bench-user-{client_id}",
+                "session_id": session_id,
+                "web_search_enabled": web_search,
+                "qwen_enabled": False
+            }))
+
+            first_token = None
+            frames = 0
+            tokens = 0
+            status = "done"
+            while True:
+                try:
+                    data = json.loads(await asyncio.wait_for(ws.recv(), timeout=turn_timeout))
+                except asyncio.TimeoutError:
+                    # A turn that never finishes is a failure, not a reason to hang the run
+                    status = "timeout"
+                    break
+                frames += 1
+                if data.get("session_id"):
+                    session_id = data["session_id"]
+                if data.get("status") == "streaming" and data.get("token"):
+                    tokens += 1
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                elif data.get("status") in ("done", "error"):
+                    status = data["status"]
+                    break
+
+            finished = time.perf_counter()
+            streaming_time = finished - first_token if first_token else 0.0
+            results.append({
+                "client": client_id,
+                "turn": turn,
+                "status": status,
+                "ttft": (first_token or finished) - sent,
+                "total": finished - sent,
+                "frames": frames,
+                "tokens": tokens,
+                "tokens_per_sec": tokens / streaming_time if streaming_time > 0 else 0.0
+            })
+            if status == "timeout":
+                return
+
+
+async def drive_load(url: str, args) -> dict:
+    results = []
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*[
+        run_client(url, i, args.turns, args.web_search, results, args.turn_timeout)
+        for i in range(args.clients)
+    ], return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failures = [repr(o) for o in outcomes if isinstance(o, Exception)]
+    return {"turns": results, "elapsed": elapsed, "client_failures": failures}
+
+
+def compare_with_baseline(report: dict, baseline_path: str, tolerance: float) -> list:
+    """Return human-readable regressions against a previous report"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    checks = [
+        ("ttft_seconds", "p95", True),
+        ("total_seconds", "p95", True),
+        ("event_loop_lag_seconds", "p99", True),
+        ("tokens_per_sec", "p50", False),
+    ]
+    regressions = []
+    for metric, stat, lower_is_better in checks:
+        old = baseline["metrics"][metric][stat]
+        new = report["metrics"][metric][stat]
+        if not old:
+            continue
+        change = (new - old) / old
+        if (lower_is_better and change > tolerance) or (not lower_is_better and change < -tolerance):
+            regressions.append(f"{metric}.{stat}: {old:.4f} -> {new:.4f} ({change:+.1%})")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Load test the /ws/chat endpoint")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--web-search", action="store_true", help="Enable the fake web search stage")
+    parser.add_argument("--web-search-delay", type=float, default=0.2)
+    parser.add_argument("--lag-interval", type=float, default=0.01)
+    parser.add_argument("--turn-timeout", type=float, default=60,
+                        help="Seconds to wait for a turn's next frame before counting it as failed")
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression before failing (default: 0.2)")
+    args = parser.parse_args()
+
+    main.mcp_client.call_tool = fake_web_search(args.web_search_delay)
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = ServerThread(port, args.lag_interval)
+    baseline_rss = rss_bytes()
+    server.start()
+
+    print(f"🚀 Driving {args.clients} clients x {args.turns} turns against ws://127.0.0.1:{port}/ws/chat")
+    sampler = RssSampler()
+    sampler.start()
+    run = asyncio.run(drive_load(f"ws://127.0.0.1:{port}/ws/chat", args))
+    peak_rss = sampler.stop()
+    server.stop()
+
+    turns = run["turns"]
+    ok_turns = [t for t in turns if t["status"] == "done"]
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "clients": args.clients,
+            "turns": args.turns,
+            "web_search": args.web_search,
+            "web_search_delay": args.web_search_delay,
+            "llm_backend": os.getenv("LLM_BACKEND")
+        },
+        "elapsed_seconds": round(run["elapsed"], 4),
+        "turns_completed": len(ok_turns),
+        "turns_failed": len(turns) - len(ok_turns),
+        "client_failures": run["client_failures"],
+        "throughput_turns_per_sec": round(len(ok_turns) / run["elapsed"], 3) if run["elapsed"] else 0.0,
+        "metrics": {
+            "ttft_seconds": summarize([t["ttft"] for t in ok_turns]),
+            "total_seconds": summarize([t["total"] for t in ok_turns]),
+            "tokens_per_sec": summarize([t["tokens_per_sec"] for t in ok_turns]),
+            "frames_per_turn": summarize([t["frames"] for t in ok_turns]),
+            "event_loop_lag_seconds": summarize(server.lag_samples)
+        },
+        "memory": {
+            # Clients run in this process too, so these include their sockets and coroutines
+            "scope": "client+server",
+            "baseline_rss_bytes": baseline_rss,
+            "peak_rss_bytes": peak_rss,
+            "bytes_per_connection": max(0, peak_rss - baseline_rss) // max(1, args.clients)
+        }
+    }
+
+    # Compare before writing so --baseline and --output may point at the same file
+    regressions = compare_with_baseline(report, args.baseline, args.tolerance) if args.baseline else []
+
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(json.dumps(report["metrics"], indent=2))
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        if regressions:
+            print("❌ Regressions detected:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,33 +1,98 @@
-from fastapi import FastAPI, WebSocket, UploadFile, File, WebSocketDisconnect, Depends
+import time
+
+# Reference point for the cold-start time reported once the app is ready
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, WebSocket, UploadFile, File, WebSocketDisconnect, Depends, Request
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from groq import Groq
-from groq import Groq as GroqClient
 from dotenv import load_dotenv
 from mcp_client import MCPClient
+from contextlib import asynccontextmanager
 from datetime import datetime
 from uuid import uuid4
 import os
 import json
+import asyncio
+import logging
+import random
 from pathlib import Path
 from rag_engine import RAGEngine
 from memory_manager import MemoryManager
-from auth import verify_token, AuthManager
-from web_research import WebResearchService
-from qwen_service import QwenService
+from auth import verify_token, token_verifier, AuthManager
+from supabase_client import db
+from shared_state import shared_store, WORKER_ID
+from connection_manager import ConnectionManager, Connection, CapacityError
+from response_cache import ResponseCache, split_for_streaming
+from bulk_ingest import BulkIngestor, TooManyJobs, UploadTooLarge
+from prefetch import Prefetched, SpeculativePrefetcher
+from static_assets import StaticAssets
+from citations import CitationTracker, build_sources, format_sources
+from scheduler import FairScheduler, QuotaExceeded
+from llm_gateway import LLMGateway, RateLimitError, is_rate_limit_error
+from metrics import span, render_metrics, STAGE_SECONDS, CHAT_TURNS, ERRORS
 
 load_dotenv()
 
-app = FastAPI(docs_url="/api/docs", redoc_url="/api/redoc")
-client = GroqClient(api_key=os.getenv("GROQ_API_KEY"))
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger("devassist")
+
+# Fraction of turns whose full LLM prompt is logged at DEBUG level
+PROMPT_LOG_SAMPLE_RATE = float(os.getenv("PROMPT_LOG_SAMPLE_RATE", "0.01"))
+
+# Load the embedding model in the background once the app is up. With false
+# it is loaded by the first upload or RAG search instead.
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "true").lower() == "true"
+
+# Construction is cheap: models, Chroma and Playwright load on first use
+llm_gateway = LLMGateway()
 rag_engine = RAGEngine()
 memory = MemoryManager()
 auth_manager = AuthManager()
-web_research = WebResearchService()
-qwen_service = QwenService()
-mcp_client = MCPClient()
+mcp_client = MCPClient(embed=rag_engine.embed)
+response_cache = ResponseCache(embedder=rag_engine.embed, store=shared_store)
+bulk_ingestor = BulkIngestor(rag_engine, store=shared_store)
+qwen_service = None
+
+def get_qwen_service():
+    """Qwen drives a browser through Playwright, so it is only set up on first use"""
+    global qwen_service
+    if qwen_service is None:
+        from qwen_service import QwenService
+        qwen_service = QwenService()
+    return qwen_service
+
+async def warm_up_models():
+    try:
+        with span("model_warm_up"):
+            await asyncio.to_thread(rag_engine.warm_up)
+        print("✅ Embedding model loaded")
+    except Exception as e:
+        ERRORS.inc(stage="model_warm_up")
+        print(f"⚠️ Embedding model warm-up failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.start()
+    await mcp_client.start()
+    if static_assets is not None:
+        await asyncio.to_thread(static_assets.load)
+    warm_up = asyncio.create_task(warm_up_models()) if PRELOAD_MODELS else None
+
+    cold_start = time.perf_counter() - IMPORT_STARTED
+    STAGE_SECONDS.observe(cold_start, stage="cold_start")
+    print(f"🚀 Worker {WORKER_ID} ready in {cold_start:.2f}s")
+    yield
+
+    if warm_up is not None:
+        warm_up.cancel()
+    await mcp_client.close()
+    await db.close()
+    await shared_store.close()
+
+app = FastAPI(docs_url="/api/docs", redoc_url="/api/redoc", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -78,7 +143,68 @@ RESPONSE RULES:
 
 Stay laser-focused on software engineering ONLY."""
 
-active_sessions = {}
+connection_manager = ConnectionManager(store=shared_store)
+# Per-user quotas, fair queueing and priority lanes in front of LLM/web/Qwen work
+scheduler = FairScheduler()
+
+# Per-stage retrieval timeouts (seconds). A stage that misses its deadline is
+# dropped and the turn is answered with whatever the other stages returned.
+WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "20"))
+RAG_TIMEOUT = float(os.getenv("RAG_TIMEOUT", "5"))
+HISTORY_TIMEOUT = float(os.getenv("HISTORY_TIMEOUT", "5"))
+
+def tool_timeout(stage_timeout: float) -> float:
+    """MCP call deadline inside a stage: the call must time out (and restart a
+    hung server) before the stage gives up and cancels it"""
+    return stage_timeout * 0.9
+
+# Web-enabled turns try the local documentation index (doc_index.py) first and
+# only scrape Bing when no indexed chunk reaches DOCS_MIN_SCORE
+LOCAL_DOCS_FIRST = os.getenv("LOCAL_DOCS_FIRST", "true").lower() == "true"
+DOCS_SEARCH_TIMEOUT = float(os.getenv("DOCS_SEARCH_TIMEOUT", "2"))
+DOCS_MIN_SCORE = float(os.getenv("DOCS_MIN_SCORE", "0.5"))
+
+# Reject /ws/chat handshakes without an access token instead of trusting the
+# client-supplied user_id
+REQUIRE_WS_AUTH = os.getenv("REQUIRE_WS_AUTH", "false").lower() == "true"
+
+async def run_stage(name: str, coro, timeout: float, default):
+    """Await a retrieval stage, falling back to a default on timeout or error"""
+    try:
+        with span(name):
+            return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        ERRORS.inc(stage=f"{name}_timeout")
+        print(f"⏱️ {name} timed out after {timeout}s, continuing without it")
+    except Exception as e:
+        ERRORS.inc(stage=name)
+        print(f"⚠️ {name} failed: {e}")
+    return default
+
+async def research(query: str) -> dict:
+    """Answer from the local docs index when it has a good match, else search the web"""
+    if LOCAL_DOCS_FIRST and mcp_client.doc_index.available:
+        docs = await run_stage("docs_search", mcp_client.call_tool(
+            "queryLocalDocs", {"query": query, "max_results": 5}, timeout=tool_timeout(DOCS_SEARCH_TIMEOUT)
+        ), DOCS_SEARCH_TIMEOUT, {})
+        relevant = [r for r in docs.get("results", []) if r.get("score", 0) >= DOCS_MIN_SCORE]
+        if relevant:
+            return {**docs, "results": relevant, "count": len(relevant)}
+
+    return await run_stage("web_search", mcp_client.call_tool(
+        "queryProgrammingWeb", {"query": query, "max_results": 5}, timeout=tool_timeout(WEB_SEARCH_TIMEOUT)
+    ), WEB_SEARCH_TIMEOUT, {})
+
+async def draft_research(query: str, quota_key: str) -> dict:
+    """Web research for a typing draft, charged and capped like a web turn"""
+    async with scheduler.slot(quota_key, "web"):
+        return await research(query)
+
+# Starts retrieval from typing drafts sent over /ws/chat
+prefetcher = SpeculativePrefetcher(
+    rag_search=lambda query: asyncio.to_thread(rag_engine.search_with_scores, query),
+    web_search=draft_research
+)
 
 class AuthRequest(BaseModel):
     email: str
@@ -93,21 +219,21 @@ async def signup_endpoint(req: AuthRequest):
 async def login_endpoint(req: AuthRequest):
     return await auth_manager.login(req.email, req.password)
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+@app.post("/api/refresh")
+async def refresh_endpoint(req: RefreshRequest):
+    return await auth_manager.refresh(req.refresh_token)
+
 @app.get("/api/health")
 async def health():
-    return {"status": "running"}
+    return {"status": "running", "worker": WORKER_ID, "models_loaded": rag_engine.loaded}
 
 @app.get("/api/history/{user_id}")
 async def get_chat_history(user_id: str):
     try:
-        response = memory.supabase.table('chat_history')\
-            .select('id, session_id, role, content, created_at')\
-            .eq('user_id', user_id)\
-            .order('created_at', desc=False)\
-            .limit(200)\
-            .execute()
-        
-        all_messages = response.data
+        all_messages = await memory.get_user_messages(user_id, limit=200)
         
         if not all_messages:
             return {"status": "success", "conversations": []}
@@ -146,7 +272,7 @@ async def get_chat_history(user_id: str):
 @app.post("/api/clear")
 async def clear_documents():
     try:
-        success = rag_engine.clear_documents()
+        success = await asyncio.to_thread(rag_engine.clear_documents)
         if success:
             return {"status": "success", "message": "All documents cleared"}
         return {"status": "error", "message": "Failed to clear documents"}
@@ -156,7 +282,7 @@ async def clear_documents():
 @app.post("/api/clear-memory")
 async def clear_memory_endpoint(user_id: str):
     try:
-        success = memory.clear_history(user_id)
+        success = await memory.clear_history(user_id)
         if success:
             return {"status": "success", "message": "Memory cleared"}
         return {"status": "error", "message": "Failed to clear memory"}
@@ -166,15 +292,15 @@ async def clear_memory_endpoint(user_id: str):
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
     try:
-        if not file.filename.endswith(('.txt', '.md', '.pdf')):
-            return {"status": "error", "message": "Invalid file type. Use .txt, .md, or .pdf"}
+        if not rag_engine.supports(file.filename):
+            return {"status": "error", "message": "Invalid file type. Use .txt, .md, .pdf or a source file"}
         
         content = await file.read()
         
         if len(content) > 5 * 1024 * 1024:
             return {"status": "error", "message": "File too large (max 5MB)"}
         
-        chunks_processed = rag_engine.ingest_document(content, file.filename)
+        chunks_processed = await asyncio.to_thread(rag_engine.ingest_document, content, file.filename)
         
         return {
             "status": "success",
@@ -183,6 +309,50 @@ async def upload_file(file: UploadFile = File(...)):
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+@app.post("/api/upload/bulk")
+async def bulk_upload(request: Request):
+    """
+    Stage several files or zip/tar archives (multipart field "files") and
+    ingest them in the background. The form is parsed by hand so the size and
+    job caps apply before the body is spooled to disk.
+    """
+    length = request.headers.get("content-length")
+    if length is None or not length.isdigit():
+        return JSONResponse({"status": "error", "message": "Content-Length required"}, status_code=411)
+    try:
+        bulk_ingestor.admit(int(length))
+    except TooManyJobs as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=429)
+    except UploadTooLarge as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=413)
+
+    form = None
+    try:
+        form = await request.form()
+        files = [f for f in form.getlist("files") if not isinstance(f, str)]
+        if not files:
+            return {"status": "error", "message": "No files uploaded"}
+        job = await bulk_ingestor.stage(files)
+    except TooManyJobs as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=429)
+    except UploadTooLarge as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=413)
+    except Exception as e:
+        return {"status": "error", "message": f"Upload failed: {e}"}
+    finally:
+        if form is not None:
+            await form.close()
+
+    bulk_ingestor.start(job)
+    return {"status": "success", "job_id": job.id, "uploads": job.uploads}
+
+@app.get("/api/upload/jobs/{job_id}")
+async def bulk_upload_progress(job_id: str):
+    job = await bulk_ingestor.get_job(job_id)
+    if job is None:
+        return {"status": "error", "message": "Unknown job"}
+    return {"status": "success", "job": job}
     
 @app.get("/api/mcp/tools")
 async def get_mcp_tools():
@@ -191,6 +361,32 @@ async def get_mcp_tools():
         "tools": mcp_client.list_tools()
     }
 
+@app.get("/api/mcp/servers")
+async def get_mcp_servers():
+    return {
+        "status": "success",
+        "mcp": mcp_client.stats()
+    }
+
+@app.get("/api/metrics")
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/connections")
+async def get_connection_stats():
+    return {
+        "status": "success",
+        "connections": connection_manager.stats(),
+        "scheduler": scheduler.stats()
+    }
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return {
+        "status": "success",
+        "cache": response_cache.stats()
+    }
+
 @app.post("/api/mcp/test")
 async def test_mcp_tool(query: str):
     result = await mcp_client.call_tool(
@@ -199,202 +395,364 @@ async def test_mcp_tool(query: str):
     )
     return result
 
+async def handle_turn(conn: Connection, message_data: dict, user_id: str,
+                      prefetched: Optional[Prefetched] = None):
+    """
+    Answer one chat message on an accepted /ws/chat connection, reusing
+    retrieval already started from the user's typing draft
+    """
+    user_message = message_data.get("message", "")
+    session_id = message_data.get("session_id")
+    web_search_enabled = message_data.get("web_search_enabled", False)
+    qwen_enabled = message_data.get("qwen_enabled", False)
+
+    logger.debug("Message: %s (web_search=%s, qwen=%s)",
+                 user_message, web_search_enabled, qwen_enabled)
+
+    if not session_id:
+        session_id = str(uuid4())
+
+    with span("persistence"):
+        await memory.add_message(user_id, "user", user_message, session_id)
+
+    # ===== QWEN MODE: Stream direct response (bypass LLM) =====
+    if qwen_enabled:
+        prefetcher.discard(conn)
+        CHAT_TURNS.inc(mode="qwen")
+        await conn.send_json({
+            "status": "qwen_processing",
+            "message": "🤖 Querying Qwen AI..."
+        }, droppable=True)
+
+        qwen_result = await get_qwen_service().query_qwen(user_message)
+        
+        if qwen_result and qwen_result.get('content'):
+            # Stream Qwen response DIRECTLY to frontend
+            qwen_response = qwen_result['content']
+            
+            print(f"✅ Streaming Qwen response ({len(qwen_response)} chars) directly to client...")
+            
+            for char in qwen_response:
+                await conn.send_json({
+                    "token": char,
+                    "status": "streaming",
+                    "session_id": session_id
+                })
+            
+            # Save to memory
+            with span("persistence"):
+                await memory.add_message(user_id, "assistant", qwen_response, session_id)
+            
+            # Send done signal
+            await conn.send_json({
+                "status": "done",
+                "session_id": session_id,
+                "mcp_used": False,
+                "sources_count": 0,
+                "qwen_used": True
+            })
+            
+            print("✅ Qwen response streaming complete")
+            return  # Skip LLM processing completely
+        else:
+            # Qwen failed
+            ERRORS.inc(stage="qwen")
+            await conn.send_json({
+                "status": "error",
+                "message": "⚠️ Qwen failed to respond"
+            })
+            return
+
+    # ===== NORMAL MODE (Web Search + Your LLM) =====
+    CHAT_TURNS.inc(mode="web_search" if web_search_enabled else "llm")
+    web_results = []
+    context_text = ""
+
+    # Retrieval stages are independent, so run them concurrently
+    web_search_active = web_search_enabled and mcp_client.research_service.is_programming_query(user_message)
+    if web_search_active:
+        await conn.send_json({
+            "status": "searching",
+            "message": "🔍 Using MCP Web Research Tool..."
+        }, droppable=True)
+        if prefetched and prefetched.web_research:
+            web_stage = run_stage("web_search", prefetched.web_research, WEB_SEARCH_TIMEOUT, {})
+        else:
+            web_stage = research(user_message)
+    else:
+        web_stage = asyncio.sleep(0, result={})
+
+    mcp_response, doc_hits, recent_history = await asyncio.gather(
+        web_stage,
+        run_stage("rag_search",
+                  prefetched.rag if prefetched else asyncio.to_thread(rag_engine.search_with_scores, user_message),
+                  RAG_TIMEOUT, []),
+        run_stage("history_fetch",
+                  memory.get_session_history(user_id, session_id, limit=10),
+                  HISTORY_TIMEOUT, []),
+    )
+
+    # WEB SEARCH
+    local_docs = mcp_response.get("source") == "local_docs"
+    if mcp_response.get("results"):
+        web_results = mcp_response["results"]
+
+        context_text += ("\n\n=== WEB RESEARCH RESULTS (from local documentation) ===\n" if local_docs
+                         else "\n\n=== WEB RESEARCH RESULTS (from Bing) ===\n")
+        context_text += f"Query: {mcp_response['query']}\n"
+        context_text += f"Found {mcp_response['count']} web results:\n\n"
+        for i, result in enumerate(web_results, 1):
+            context_text += (f"[Source {i}]\n"
+                             f"Title: {result['title']}\n"
+                             f"URL: {result['url']}\n"
+                             f"Content: {result['snippet']}\n\n")
+        context_text += "=== END WEB RESEARCH ===\n\n"
+        context_text += (
+            "INSTRUCTIONS:\n"
+            "If any of the web research results above directly answer the user's question, "
+            "use ONLY those and cite [Source N] for every fact. "
+            "If not found in the web results, you MAY use your own up-to-date programming knowledge as fallback.\n\n"
+        )
+
+    # RAG context, numbered after the web sources so one [Source N] scheme covers both
+    if doc_hits:
+        context_text += "\n\n--- UPLOADED DOCUMENTS ---\n"
+        for i, hit in enumerate(doc_hits, len(web_results) + 1):
+            context_text += f"\n[Source {i}]\n{hit['text']}\n"
+        context_text += "\n--- END DOCUMENTS ---\n"
+        context_text += "Cite uploaded documents you rely on as [Source N].\n"
+
+    # Sources go out as one metadata frame before the first token
+    sources = build_sources(web_results, local_docs, doc_hits)
+    citations = CitationTracker(sources)
+    if sources:
+        await conn.send_json({
+            "status": "sources",
+            "session_id": session_id,
+            "sources": sources
+        })
+
+    async def send_token(token: str):
+        await conn.send_json({
+            "token": token,
+            "status": "streaming",
+            "session_id": session_id
+        })
+        for number in citations.feed(token):
+            await conn.send_json({
+                "status": "citation",
+                "session_id": session_id,
+                "source": number
+            })
+
+    full_prompt = SYSTEM_PROMPT + context_text
+
+    messages = [{"role": "system", "content": full_prompt}]
+    if len(recent_history) > 1:
+        messages.extend(recent_history[:-1])
+    messages.append({"role": "user", "content": user_message})
+
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < PROMPT_LOG_SAMPLE_RATE:
+        logger.debug("LLM context (%d chars): %s", len(full_prompt), full_prompt[:800])
+
+    # Only first turns are cacheable; follow-ups depend on the conversation
+    cacheable = response_cache.enabled and len(recent_history) <= 1
+    if cacheable:
+        cached_answer = await response_cache.lookup(user_message, context_text, llm_gateway.model)
+        if cached_answer:
+            logger.debug("Serving cached response")
+            for token in split_for_streaming(cached_answer):
+                await send_token(token)
+
+            with span("persistence"):
+                await memory.add_message(user_id, "assistant", cached_answer + format_sources(sources),
+                                         session_id)
+
+            await conn.send_json({
+                "status": "done",
+                "session_id": session_id,
+                "mcp_used": len(web_results) > 0,
+                "sources_count": len(web_results),
+                "citations": citations.cited,
+                "qwen_used": False,
+                "model": llm_gateway.model,
+                "cached": True
+            })
+            return
+
+    try:
+        assistant_response = ""
+        llm_started = time.perf_counter()
+        llm_info = {}
+        async for token in llm_gateway.stream_chat(messages, temperature=0.7, max_tokens=2048,
+                                                   info=llm_info):
+            if not assistant_response:
+                STAGE_SECONDS.observe(time.perf_counter() - llm_started, stage="llm_first_token")
+            assistant_response += token
+            await send_token(token)
+
+        STAGE_SECONDS.observe(time.perf_counter() - llm_started, stage="llm_total")
+
+        # After a 429 the reply came from the fallback model; cache it under that model
+        used_model = llm_info.get("model", llm_gateway.model)
+
+        # The client already has the sources; only the stored copy carries the list
+        if cacheable:
+            await response_cache.save(user_message, context_text, used_model, assistant_response)
+
+        with span("persistence"):
+            await memory.add_message(user_id, "assistant", assistant_response + format_sources(sources),
+                                     session_id)
+
+        await conn.send_json({
+            "status": "done",
+            "session_id": session_id,
+            "mcp_used": len(web_results) > 0,
+            "sources_count": len(web_results),
+            "citations": citations.cited,
+            "qwen_used": False,
+            "model": used_model
+        })
+
+    except ConnectionError:
+        raise
+    except Exception as e:
+        error_msg = str(e)
+        ERRORS.inc(stage="llm")
+        if isinstance(e, RateLimitError) or is_rate_limit_error(e):
+            await conn.send_json({
+                "status": "error",
+                "message": "⏱️ Traffic is high. Please wait 10 seconds."
+            })
+        else:
+            await conn.send_json({
+                "status": "error",
+                "message": f"Error: {error_msg}"
+            })
+
+def turn_lane(message_data: dict) -> str:
+    """Scheduler lane for a turn: Qwen browser sessions, web research or RAG only"""
+    if message_data.get("qwen_enabled"):
+        return "qwen"
+    return "web" if message_data.get("web_search_enabled") else "rag"
+
+async def run_turn(conn: Connection, message_data: dict, user_id: str, quota_key: str):
+    """
+    Run a chat turn inside a generation slot and a fair-scheduler run slot.
+    Scheduler quota and fair share are charged to `quota_key`.
+    """
+    lane = turn_lane(message_data)
+
+    # Retrieval already started from the user's typing draft, if it still matches
+    prefetched = None
+    if lane != "qwen":
+        text = message_data.get("message", "")
+        web = bool(message_data.get("web_search_enabled")) and \
+            mcp_client.research_service.is_programming_query(text)
+        prefetched = prefetcher.take(conn, text, web)
+
+    async def report_position(position: int):
+        await conn.send_json({
+            "status": "queued",
+            "position": position,
+            "lane": lane
+        }, droppable=True)
+
+    try:
+        async with connection_manager.generation_slot(user_id):
+            if prefetched and prefetched.web_research:
+                # The draft's scrape has its own web slot and already paid the web price.
+                # Wait for it before queueing, so the turn never holds a slot its own
+                # draft is queued behind, then run the rest as a RAG-priced turn.
+                await asyncio.wait([prefetched.web_research], timeout=WEB_SEARCH_TIMEOUT)
+                task = prefetched.web_research
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    lane = "rag"
+                else:
+                    # Timed out or refused (e.g. out of quota): the turn does its own scrape
+                    prefetched.web_research.cancel()
+                    prefetched.web_research = None
+            async with scheduler.slot(quota_key, lane, on_queued=report_position):
+                await handle_turn(conn, message_data, user_id, prefetched)
+    except QuotaExceeded as e:
+        await conn.send_json({
+            "status": "error",
+            "message": str(e),
+            "retry_after": round(e.retry_after, 1)
+        })
+    except CapacityError as e:
+        await conn.send_json({"status": "error", "message": str(e)})
+    except ConnectionError:
+        # Client went away or read too slowly; upstream work is already cancelled
+        pass
+    except Exception:
+        # Anything else (shared store down, a bug in the turn) must still end the turn for the UI
+        ERRORS.inc(stage="turn")
+        logger.exception("Chat turn failed for user %s", user_id)
+        try:
+            await conn.send_json({"status": "error", "message": "Something went wrong. Please try again."})
+        except ConnectionError:
+            pass
+
 @app.websocket("/ws/chat")
 async def chat_websocket(websocket: WebSocket):
+    token = websocket.query_params.get("token")
+    authenticated_user_id = None
+    if token:
+        try:
+            authenticated_user_id = await token_verifier.verify_async(token)
+        except Exception as e:
+            print(f"WebSocket auth failed: {e}")
+            if REQUIRE_WS_AUTH:
+                await websocket.close(code=1008)
+                return
+            # An expired token should not break chat when auth is optional
+            authenticated_user_id = None
+    elif REQUIRE_WS_AUTH:
+        await websocket.close(code=1008)
+        return
+
     await websocket.accept()
-    user_id = None
-    session_id = None
+    conn = connection_manager.connect(websocket, authenticated_user_id or "anonymous")
+    # Only verified identities get their own quota. Unauthenticated clients
+    # pick their user_id, so they are charged per client address instead.
+    quota_key = authenticated_user_id or \
+        f"anonymous:{websocket.client.host if websocket.client else 'unknown'}"
 
     try:
         while True:
             data = await websocket.receive_text()
             message_data = json.loads(data)
-            user_message = message_data.get("message", "")
-            user_id = message_data.get("user_id", "anonymous")
-            session_id = message_data.get("session_id")
-            web_search_enabled = message_data.get("web_search_enabled", False)
-            qwen_enabled = message_data.get("qwen_enabled", False)
-
-            print(f"📨 Message: {user_message}")
-            print(f"🔍 Web Search Enabled: {web_search_enabled}")
-            print(f"🤖 Qwen Enabled: {qwen_enabled}")
-
-            if not session_id:
-                session_id = str(uuid4())
-                active_sessions[user_id] = session_id
-
-            memory.add_message(user_id, "user", user_message, session_id)
-
-            # ===== QWEN MODE: Stream direct response (bypass LLM) =====
-            if qwen_enabled:
-                await websocket.send_json({
-                    "status": "qwen_processing",
-                    "message": "🤖 Querying Qwen AI..."
-                })
-
-                qwen_result = await qwen_service.query_qwen(user_message)
-                
-                if qwen_result and qwen_result.get('content'):
-                    # Stream Qwen response DIRECTLY to frontend
-                    qwen_response = qwen_result['content']
-                    
-                    print(f"✅ Streaming Qwen response ({len(qwen_response)} chars) directly to client...")
-                    
-                    for char in qwen_response:
-                        await websocket.send_json({
-                            "token": char,
-                            "status": "streaming",
-                            "session_id": session_id
-                        })
-                    
-                    # Save to memory
-                    memory.add_message(user_id, "assistant", qwen_response, session_id)
-                    
-                    # Send done signal
-                    await websocket.send_json({
-                        "status": "done",
-                        "session_id": session_id,
-                        "mcp_used": False,
-                        "sources_count": 0,
-                        "qwen_used": True
-                    })
-                    
-                    print("✅ Qwen response streaming complete")
-                    continue  # Skip LLM processing completely
-                else:
-                    # Qwen failed
-                    await websocket.send_json({
-                        "status": "error",
-                        "message": "⚠️ Qwen failed to respond"
-                    })
-                    continue
-
-            # ===== NORMAL MODE (Web Search + Your LLM) =====
-            web_results = []
-            context_text = ""
-
-            # WEB SEARCH
-            if web_search_enabled and web_research.is_programming_query(user_message):
-                await websocket.send_json({
-                    "status": "searching",
-                    "message": "🔍 Using MCP Web Research Tool..."
-                })
-
-                mcp_response = await mcp_client.call_tool(
-                    "queryProgrammingWeb", {"query": user_message, "max_results": 5}
-                )
-
-                if "results" in mcp_response and mcp_response["results"]:
-                    web_results = mcp_response["results"]
-
-                    context_text += "\n\n=== WEB RESEARCH RESULTS (from Bing) ===\n"
-                    context_text += f"Query: {mcp_response['query']}\n"
-                    context_text += f"Found {mcp_response['count']} web results:\n\n"
-                    for i, result in enumerate(web_results, 1):
-                        context_text += (f"[Source {i}]\n"
-                                         f"Title: {result['title']}\n"
-                                         f"URL: {result['url']}\n"
-                                         f"Content: {result['snippet']}\n\n")
-                    context_text += "=== END WEB RESEARCH ===\n\n"
-                    context_text += (
-                        "INSTRUCTIONS:\n"
-                        "If any of the web research results above directly answer the user's question, "
-                        "use ONLY those and cite [Source N] for every fact. "
-                        "If not found in the web results, you MAY use your own up-to-date programming knowledge as fallback.\n\n"
-                    )
-
-            # RAG context
-            context_chunks = rag_engine.search(user_message)
-            if context_chunks:
-                context_text += "\n\n--- UPLOADED DOCUMENTS ---\n"
-                for i, chunk in enumerate(context_chunks, 1):
-                    context_text += f"\n[Document {i}]\n{chunk}\n"
-                context_text += "\n--- END DOCUMENTS ---\n"
-
-            full_prompt = SYSTEM_PROMPT + context_text
-
-            recent_history = memory.get_session_history(user_id, session_id, limit=10)
-            messages = [{"role": "system", "content": full_prompt}]
-            if len(recent_history) > 1:
-                messages.extend(recent_history[:-1])
-            messages.append({"role": "user", "content": user_message})
-
-            print("="*30, "LLM CONTEXT", "="*30)
-            print(full_prompt[:800])
-            print("="*70)
-
-            try:
-                stream = client.chat.completions.create(
-                    model="llama-3.3-70b-versatile",
-                    messages=messages,
-                    stream=True,
-                    temperature=0.7,
-                    max_tokens=2048
-                )
-                assistant_response = ""
-                for chunk in stream:
-                    if chunk.choices[0].delta.content:
-                        token = chunk.choices[0].delta.content
-                        assistant_response += token
-                        await websocket.send_json({
-                            "token": token,
-                            "status": "streaming",
-                            "session_id": session_id
-                        })
-
-                if web_results:
-                    sources_text = "\n\n**Sources (Web Research):**\n"
-                    for i, result in enumerate(web_results, 1):
-                        sources_text += f"{i}. [{result['title']}]({result['url']})\n"
-                    for char in sources_text:
-                        await websocket.send_json({
-                            "token": char,
-                            "status": "streaming",
-                            "session_id": session_id
-                        })
-                    assistant_response += sources_text
-
-                memory.add_message(user_id, "assistant", assistant_response, session_id)
-
-                await websocket.send_json({
-                    "status": "done",
-                    "session_id": session_id,
-                    "mcp_used": len(web_results) > 0,
-                    "sources_count": len(web_results),
-                    "qwen_used": False
-                })
-
-            except Exception as e:
-                error_msg = str(e)
-                if "429" in error_msg or "rate_limit" in error_msg.lower():
-                    await websocket.send_json({
-                        "status": "error",
-                        "message": "⏱️ Traffic is high. Please wait 10 seconds."
-                    })
-                else:
-                    await websocket.send_json({
-                        "status": "error",
-                        "message": f"Error: {error_msg}"
-                    })
-
-    except WebSocketDisconnect:
-        print(f"User {user_id} disconnected")
-        if user_id in active_sessions:
-            del active_sessions[user_id]
+            user_id = authenticated_user_id or message_data.get("user_id", "anonymous")
+            connection_manager.rebind(conn, user_id)
+            if message_data.get("type") == "draft":
+                draft = message_data.get("message", "")
+                # Draft scrapes are charged to the same quota; skip them once it runs low
+                web = bool(message_data.get("web_search_enabled")) and \
+                    mcp_client.research_service.is_programming_query(draft) and \
+                    scheduler.has_quota(quota_key, "web")
+                prefetcher.draft(conn, draft, web, quota_key)
+                continue
+            conn.start_task(run_turn(conn, message_data, user_id, quota_key))
+
+    except (WebSocketDisconnect, RuntimeError):
+        print(f"User {conn.user_id} disconnected")
+    finally:
+        # Cancels in-flight LLM/Qwen/scrape work for this socket
+        connection_manager.disconnect(conn)
 
 
 # Static files
 static_dir = Path(__file__).parent.parent / "frontend" / "dist"
+static_assets = None
 
 if static_dir.exists():
-    app.mount("/assets", StaticFiles(directory=str(static_dir / "assets")), name="assets")
-    
-    @app.get("/{full_path:path}")
-    async def serve_frontend(full_path: str):
-        file_path = static_dir / full_path
-        if file_path.exists() and file_path.is_file():
-            return FileResponse(str(file_path))
-        return FileResponse(str(static_dir / "index.html"))
+    # Indexed once in lifespan; requests never touch the filesystem for lookups
+    static_assets = StaticAssets(static_dir)
+
+    @app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
+    async def serve_frontend(full_path: str, request: Request):
+        return static_assets.serve(request, full_path)
 else:
     print(f"⚠️  Frontend not found at: {static_dir}")
     print("    Run 'npm run build' in frontend folder")
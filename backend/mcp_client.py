@@ -1,23 +1,231 @@
 """
 MCP Client for integrating MCP tools into the chatbot
+
+By default tools run in-process. With MCP_SERVER_PROCESSES > 0 the client
+starts that many MCP server subprocesses (mcp_server.py unless
+MCP_SERVER_COMMAND says otherwise) and talks to them over stdio, so browser
+scraping runs outside the chat worker's event loop and memory.
 """
 
 import json
 import asyncio
-from typing import Optional, Dict, Any
-from web_research import WebResearchService
+import os
+import shlex
+import sys
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from doc_index import DocIndex
+from metrics import Counter
+
+MCP_RESTARTS = Counter(
+    "devassist_mcp_server_restarts_total",
+    "MCP server subprocesses restarted after a crash or failed call"
+)
+
+
+class MCPServerProcess:
+    """
+    One MCP server subprocess with a persistent stdio session.
+
+    The session lives in a supervisor task because the MCP transports are
+    context managers that must be entered and exited in the same task. The
+    supervisor restarts the process, with backoff, whenever it exits or a call
+    reports it broken.
+    """
+
+    PING_INTERVAL = 10.0
+
+    def __init__(self, index: int, command: List[str], max_concurrency: int, env: Dict[str, str] = None):
+        self.index = index
+        self.command = command
+        self.env = env
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.restarts = 0
+        self.session = None
+        self.ready = asyncio.Event()
+        self._restart = asyncio.Event()
+        self._stopping = False
+        self._supervisor: Optional[asyncio.Task] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.session is not None and self.ready.is_set()
+
+    def start(self):
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def _supervise(self):
+        from mcp import ClientSession, StdioServerParameters
+        from mcp.client.stdio import stdio_client
+
+        params = StdioServerParameters(
+            command=self.command[0],
+            args=self.command[1:],
+            env=self.env,
+            cwd=str(Path(__file__).parent)
+        )
+        backoff = 0.5
+        while not self._stopping:
+            started = time.monotonic()
+            try:
+                async with stdio_client(params) as (read_stream, write_stream):
+                    async with ClientSession(read_stream, write_stream) as session:
+                        await session.initialize()
+                        self.session = session
+                        self.ready.set()
+                        print(f"✅ MCP server {self.index} started")
+                        await self._watch(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ MCP server {self.index} failed: {e}")
+            finally:
+                self.session = None
+                self.ready.clear()
+                self._restart.clear()
+
+            if self._stopping:
+                break
+            self.restarts += 1
+            MCP_RESTARTS.inc()
+            # Reset the backoff once a process has stayed up for a while
+            backoff = 0.5 if time.monotonic() - started > 30 else min(backoff * 2, 30)
+            print(f"🔄 Restarting MCP server {self.index} in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+
+    async def _watch(self, session):
+        """Return when a restart is requested; raise if the server stops answering pings"""
+        while not self._restart.is_set():
+            try:
+                await asyncio.wait_for(self._restart.wait(), timeout=self.PING_INTERVAL)
+            except asyncio.TimeoutError:
+                await asyncio.wait_for(session.send_ping(), timeout=self.PING_INTERVAL)
+
+    def restart(self):
+        self._restart.set()
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """`timeout` bounds the whole call: waiting for a slot, for the session and for the tool"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        await asyncio.wait_for(self.slots.acquire(), timeout=timeout)
+        self.in_flight += 1
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=max(0, deadline - loop.time()))
+            result = await asyncio.wait_for(self.session.call_tool(tool_name, arguments),
+                                            timeout=max(0, deadline - loop.time()))
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+        text = "".join(getattr(part, "text", "") for part in result.content)
+        if result.isError:
+            return {"error": text or f"Tool {tool_name} failed"}
+        return json.loads(text) if text else {}
+
+    async def close(self):
+        self._stopping = True
+        self._restart.set()
+        if self._supervisor is not None:
+            try:
+                await asyncio.wait_for(self._supervisor, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+                self._supervisor.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "restarts": self.restarts
+        }
+
 
 class MCPClient:
     """
     Client to interact with MCP tools
     """
-    
-    def __init__(self):
-        self.research_service = WebResearchService()
+
+    def __init__(self, processes: int = None, command: str = None, max_concurrency: int = None,
+                 call_timeout: float = None, embed=None):
+        self._research_service = None
+        self.doc_index = DocIndex(embed=embed)
         self.tools = {
-            "queryProgrammingWeb": self.query_programming_web
+            "queryProgrammingWeb": self.query_programming_web,
+            "queryLocalDocs": self.query_local_docs
         }
-    
+
+        self.processes = processes if processes is not None else \
+            int(os.getenv("MCP_SERVER_PROCESSES", "0"))
+        command = command or os.getenv("MCP_SERVER_COMMAND")
+        self.command = shlex.split(command) if command else \
+            [sys.executable, str(Path(__file__).parent / "mcp_server.py")]
+        # Each server drives a browser, so keep concurrent scrapes per process low
+        self.max_concurrency = max_concurrency or int(os.getenv("MCP_SERVER_CONCURRENCY", "2"))
+        self.call_timeout = call_timeout or float(os.getenv("MCP_CALL_TIMEOUT", "45"))
+        self.servers: List[MCPServerProcess] = []
+
+    @property
+    def research_service(self):
+        # Web research (and Playwright) is only imported once a tool is called
+        if self._research_service is None:
+            from web_research import WebResearchService
+            self._research_service = WebResearchService()
+        return self._research_service
+
+    async def start(self):
+        """Start the MCP server subprocesses, if any are configured"""
+        if self.processes <= 0 or self.servers:
+            return
+        self.servers = [
+            MCPServerProcess(i, self.command, self.max_concurrency, env=dict(os.environ))
+            for i in range(self.processes)
+        ]
+        for server in self.servers:
+            server.start()
+
+    async def close(self):
+        await asyncio.gather(*(server.close() for server in self.servers))
+        self.servers = []
+
+    def _pick_server(self, exclude: Optional[MCPServerProcess] = None) -> MCPServerProcess:
+        """Least in-flight healthy server; a restarting one only if none is healthy"""
+        candidates = [s for s in self.servers if s is not exclude] or self.servers
+        healthy = [s for s in candidates if s.healthy]
+        return min(healthy or candidates, key=lambda s: s.in_flight)
+
+    async def _call_remote(self, tool_name: str, arguments: Dict[str, Any],
+                           timeout: float) -> Dict[str, Any]:
+        deadline = asyncio.get_running_loop().time() + timeout
+        server = self._pick_server()
+        try:
+            return await server.call_tool(tool_name, arguments, timeout)
+        except asyncio.TimeoutError:
+            # A hung scrape holds the process's browser; start it afresh
+            print(f"⏱️ MCP server {server.index} timed out on {tool_name}")
+            server.restart()
+            raise
+        except (asyncio.CancelledError, json.JSONDecodeError):
+            raise
+        except Exception as e:
+            print(f"⚠️ MCP server {server.index} call failed ({e}), retrying on another server")
+            server.restart()
+            # Tool calls are read-only searches, so one retry is safe
+            fallback = self._pick_server(exclude=server)
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                return await fallback.call_tool(tool_name, arguments, remaining)
+            except (asyncio.CancelledError, json.JSONDecodeError):
+                raise
+            except Exception:
+                fallback.restart()
+                raise
+
     async def query_programming_web(self, query: str, max_results: int = 5) -> Dict[str, Any]:
         """
         Execute queryProgrammingWeb tool
@@ -29,27 +237,37 @@ class MCPClient:
                 "query": query,
                 "results": []
             }
-        
+
         # Perform search
         self.research_service.max_results = max_results
         results = await self.research_service.search_web(query)
-        
+
         return {
             "query": query,
             "results": results,
             "count": len(results),
             "sources": [{"title": r["title"], "url": r["url"]} for r in results]
         }
-    
-    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+
+    async def query_local_docs(self, query: str, max_results: int = 5) -> Dict[str, Any]:
+        """
+        Execute queryLocalDocs tool
         """
-        Call an MCP tool by name
+        return await asyncio.to_thread(self.doc_index.query, query, max_results)
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any],
+                        timeout: float = None) -> Dict[str, Any]:
+        """
+        Call an MCP tool by name. `timeout` bounds a call to a server process
+        (default MCP_CALL_TIMEOUT); a server that misses it is restarted.
         """
-        if tool_name in self.tools:
-            return await self.tools[tool_name](**arguments)
-        
-        return {"error": f"Unknown tool: {tool_name}"}
-    
+        if tool_name not in self.tools:
+            return {"error": f"Unknown tool: {tool_name}"}
+
+        if self.servers:
+            return await self._call_remote(tool_name, arguments, timeout or self.call_timeout)
+        return await self.tools[tool_name](**arguments)
+
     def list_tools(self) -> list:
         """
         List available MCP tools
@@ -62,5 +280,19 @@ class MCPClient:
                     "query": "string (required)",
                     "max_results": "integer (optional, default: 5)"
                 }
+            },
+            {
+                "name": "queryLocalDocs",
+                "description": "Search the locally indexed programming documentation (no network)",
+                "parameters": {
+                    "query": "string (required)",
+                    "max_results": "integer (optional, default: 5)"
+                }
             }
         ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "subprocess" if self.servers else "in-process",
+            "servers": [server.stats() for server in self.servers]
+        }
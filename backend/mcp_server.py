@@ -1,18 +1,22 @@
 """
 MCP Server for DevAssist Chatbot
-Provides web research tool via Model Context Protocol
+Provides web research and local documentation tools via Model Context Protocol
 """
 
 import asyncio
 import json
+import sys
+from io import TextIOWrapper
 from typing import Any
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 from web_research import WebResearchService
+from doc_index import DocIndex
 
 # Initialize MCP Server
 mcp_server = Server("devassist-web-research")
 research_service = WebResearchService()
+doc_index = DocIndex()
 
 @mcp_server.list_tools()
 async def list_tools() -> list[Tool]:
@@ -42,6 +46,28 @@ async def list_tools() -> list[Tool]:
                 },
                 "required": ["query"]
             }
+        ),
+        Tool(
+            name="queryLocalDocs",
+            description=(
+                "Search a locally built index of programming documentation. "
+                "Returns titles, URLs, snippets and similarity scores without any network access."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Programming-related search query"
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": "Maximum number of results to return (default: 5)",
+                        "default": 5
+                    }
+                },
+                "required": ["query"]
+            }
         )
     ]
 
@@ -82,6 +108,17 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             text=json.dumps(response, indent=2)
         )]
     
+    if name == "queryLocalDocs":
+        query = arguments.get("query", "")
+        max_results = arguments.get("max_results", 5)
+
+        response = await asyncio.to_thread(doc_index.query, query, max_results)
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(response, indent=2)
+        )]
+
     return [TextContent(
         type="text",
         text=json.dumps({"error": f"Unknown tool: {name}"})
@@ -91,9 +128,14 @@ async def run_mcp_server():
     """
     Run MCP server with stdio transport
     """
+    import anyio
     from mcp.server.stdio import stdio_server
-    
-    async with stdio_server() as (read_stream, write_stream):
+
+    # stdout carries the protocol; send the scraper's print() output to stderr
+    protocol_out = anyio.wrap_file(TextIOWrapper(sys.stdout.buffer, encoding="utf-8"))
+    sys.stdout = sys.stderr
+
+    async with stdio_server(stdout=protocol_out) as (read_stream, write_stream):
         await mcp_server.run(
             read_stream,
             write_stream,
@@ -101,5 +143,5 @@ async def run_mcp_server():
         )
 
 if __name__ == "__main__":
-    print("Starting MCP Server: devassist-web-research")
+    print("Starting MCP Server: devassist-web-research", file=sys.stderr)
     asyncio.run(run_mcp_server())
@@ -1,72 +1,70 @@
-from supabase import create_client
-from dotenv import load_dotenv
-import os
+from supabase_client import db
 from datetime import datetime
 
-load_dotenv()
-
 class MemoryManager:
-    def __init__(self):
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_SERVICE_KEY")
-        )
-    
-    def add_message(self, user_id: str, role: str, content: str, session_id: str = None):
+    def __init__(self, client=None):
+        self.db = client or db
+
+    async def add_message(self, user_id: str, role: str, content: str, session_id: str = None):
         """Store message in Supabase with session tracking"""
         try:
-            self.supabase.table('chat_history').insert({
+            await self.db.insert('chat_history', {
                 'user_id': user_id,
                 'session_id': session_id or 'default',
                 'role': role,
                 'content': content,
                 'created_at': datetime.utcnow().isoformat()
-            }).execute()
+            })
         except Exception as e:
             print(f"Error saving message: {e}")
-    
-    def get_session_history(self, user_id: str, session_id: str, limit: int = 10):
+
+    async def get_session_history(self, user_id: str, session_id: str, limit: int = 10):
         """Get messages for specific session"""
         try:
-            response = self.supabase.table('chat_history')\
-                .select('role, content')\
-                .eq('user_id', user_id)\
-                .eq('session_id', session_id)\
-                .order('created_at', desc=False)\
-                .limit(limit)\
-                .execute()
-            
-            messages = [{"role": msg['role'], "content": msg['content']} 
-                       for msg in response.data]
+            rows = await self.db.select(
+                'chat_history', 'role,content',
+                filters={'user_id': user_id, 'session_id': session_id},
+                order='created_at.asc',
+                limit=limit
+            )
+
+            messages = [{"role": msg['role'], "content": msg['content']}
+                       for msg in rows]
             return messages
         except Exception as e:
             print(f"Error getting history: {e}")
             return []
-    
-    def get_recent_history(self, user_id: str, limit: int = 100):
+
+    async def get_recent_history(self, user_id: str, limit: int = 100):
         """Get all recent messages (for history page)"""
         try:
-            response = self.supabase.table('chat_history')\
-                .select('role, content')\
-                .eq('user_id', user_id)\
-                .order('created_at', desc=True)\
-                .limit(limit)\
-                .execute()
-            
-            messages = [{"role": msg['role'], "content": msg['content']} 
-                       for msg in reversed(response.data)]
+            rows = await self.db.select(
+                'chat_history', 'role,content',
+                filters={'user_id': user_id},
+                order='created_at.desc',
+                limit=limit
+            )
+
+            messages = [{"role": msg['role'], "content": msg['content']}
+                       for msg in reversed(rows)]
             return messages
         except Exception as e:
             print(f"Error getting history: {e}")
             return []
-    
-    def clear_history(self, user_id: str):
+
+    async def get_user_messages(self, user_id: str, limit: int = 200):
+        """Get a user's messages across all sessions, oldest first"""
+        return await self.db.select(
+            'chat_history', 'id,session_id,role,content,created_at',
+            filters={'user_id': user_id},
+            order='created_at.asc',
+            limit=limit
+        )
+
+    async def clear_history(self, user_id: str):
         """Clear user's chat history"""
         try:
-            self.supabase.table('chat_history')\
-                .delete()\
-                .eq('user_id', user_id)\
-                .execute()
+            await self.db.delete('chat_history', {'user_id': user_id})
             return True
         except Exception as e:
             print(f"Error clearing history: {e}")
@@ -0,0 +1,148 @@
+"""
+Speculative retrieval for /ws/chat drafts
+
+While the user types, the frontend sends debounced {"type": "draft"}
+messages. For each sufficiently new draft the prefetcher starts RAG retrieval
+(which also warms the query embedding) and, when web search is on, the web
+research stage. When the final message arrives and closely matches the last
+draft, the turn reuses those in-flight or finished results instead of
+starting retrieval from scratch. Nothing here calls the LLM. Draft web
+research is passed the socket's quota key, so the caller can run it through
+the scheduler's web lane like any other scrape.
+"""
+
+import asyncio
+import os
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Awaitable, Callable, Optional
+
+from metrics import Counter
+
+PREFETCHES = Counter(
+    "devassist_prefetch_total",
+    "Speculative retrieval for typing drafts",
+    ("outcome",)
+)
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class Draft:
+    def __init__(self, text: str, web: bool):
+        self.text = normalize(text)
+        self.web = web
+        self.started = time.monotonic()
+        self.rag: Optional[asyncio.Task] = None
+        self.web_research: Optional[asyncio.Task] = None
+
+    def tasks(self):
+        return [t for t in (self.rag, self.web_research) if t is not None]
+
+    def cancel(self):
+        for task in self.tasks():
+            task.cancel()
+
+
+class Prefetched:
+    """Retrieval tasks handed over to a turn; either may be None"""
+
+    def __init__(self, rag: Optional[asyncio.Task], web_research: Optional[asyncio.Task]):
+        self.rag = rag
+        self.web_research = web_research
+
+
+class SpeculativePrefetcher:
+    def __init__(self, rag_search: Callable[[str], Awaitable], web_search: Callable[[str, str], Awaitable],
+                 enabled: bool = None, min_chars: int = None, match_ratio: float = None,
+                 max_age: float = None, web: bool = None, max_inflight: int = None):
+        self.rag_search = rag_search
+        self.web_search = web_search
+        self.enabled = enabled if enabled is not None else \
+            os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+        self.min_chars = min_chars or int(os.getenv("PREFETCH_MIN_CHARS", "12"))
+        self.match_ratio = match_ratio or float(os.getenv("PREFETCH_MATCH_RATIO", "0.9"))
+        self.max_age = max_age or float(os.getenv("PREFETCH_MAX_AGE", "60"))
+        # Embedding threads outlive a cancelled draft, so cap how many one socket can have running
+        self.max_inflight = max_inflight or int(os.getenv("PREFETCH_MAX_INFLIGHT", "2"))
+        # Drafts can trigger browser scrapes the user may never send, so web prefetch is opt-in
+        self.web = web if web is not None else os.getenv("PREFETCH_WEB_SEARCH", "false").lower() == "true"
+
+    def _similar(self, a: str, b: str) -> bool:
+        return a == b or SequenceMatcher(None, a, b).ratio() >= self.match_ratio
+
+    def draft(self, conn, text: str, web: bool, quota_key: str):
+        """Start retrieval for a typing draft unless the current one already covers it"""
+        if not self.enabled or len(text.strip()) < self.min_chars:
+            return
+
+        current: Optional[Draft] = conn.draft
+        if current is not None and self._similar(current.text, normalize(text)) \
+                and (current.web or not web):
+            return
+
+        if conn.draft_retrievals >= self.max_inflight:
+            PREFETCHES.inc(outcome="throttled")
+            return
+
+        if current is not None:
+            current.cancel()
+            PREFETCHES.inc(outcome="superseded")
+
+        draft = Draft(text, web and self.web)
+        draft.rag = conn.start_task(self._retrieve(conn, text))
+        if draft.web:
+            draft.web_research = conn.start_task(self.web_search(text, quota_key))
+        for task in draft.tasks():
+            # Retrieve exceptions so abandoned drafts do not log "never retrieved"
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        conn.draft = draft
+        PREFETCHES.inc(outcome="started")
+
+    def _retrieve(self, conn, text: str):
+        """
+        Start RAG search for a draft. Cancelling the draft only abandons the
+        result; the search is counted against the socket until it finishes.
+        """
+        retrieval = asyncio.ensure_future(self.rag_search(text))
+        conn.draft_retrievals += 1
+
+        def finished(task):
+            conn.draft_retrievals -= 1
+            task.cancelled() or task.exception()
+
+        retrieval.add_done_callback(finished)
+
+        async def result():
+            return await asyncio.shield(retrieval)
+        return result()
+
+    def discard(self, conn):
+        if conn.draft is not None:
+            conn.draft.cancel()
+            conn.draft = None
+
+    def take(self, conn, text: str, web: bool) -> Optional[Prefetched]:
+        """Hand the draft's retrieval to the final message if it matches closely enough"""
+        draft: Optional[Draft] = conn.draft
+        conn.draft = None
+        if draft is None:
+            return None
+
+        if time.monotonic() - draft.started > self.max_age or draft.rag.cancelled() \
+                or not self._similar(draft.text, normalize(text)):
+            draft.cancel()
+            PREFETCHES.inc(outcome="miss")
+            return None
+
+        web_task = draft.web_research if web else None
+        if draft.web_research is not None and web_task is None:
+            draft.web_research.cancel()
+        # A draft scrape that was cancelled or refused (e.g. out of quota) is redone by the turn
+        if web_task is not None and (web_task.cancelled() or (web_task.done() and web_task.exception())):
+            web_task = None
+        PREFETCHES.inc(outcome="hit")
+        return Prefetched(draft.rag, web_task)
@@ -1,4 +1,3 @@
-from playwright.async_api import async_playwright
 from typing import Dict
 import asyncio
 from pathlib import Path
@@ -108,6 +107,8 @@ class QwenService:
             print(f"Query: {query}")
             print("=" * 50)
 
+            from playwright.async_api import async_playwright
+
             async with async_playwright() as p:
                 context = await p.chromium.launch_persistent_context(
                     user_data_dir=str(self.user_data_dir),
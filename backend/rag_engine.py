@@ -1,23 +1,129 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List
-import PyPDF2
+from collections import OrderedDict
+from typing import Any, Dict, List
 import io
+import os
+import re
+import threading
 import uuid
+from metrics import span
+from embeddings import create_embedder, BatchingEmbedder
+from vector_store import CompactVectorStore
+
+TEXT_EXTENSIONS = ('.txt', '.md', '.rst', '.pdf')
+
+SOURCE_LANGUAGES = {
+    '.py': 'python', '.js': 'javascript', '.jsx': 'javascript', '.mjs': 'javascript',
+    '.ts': 'typescript', '.tsx': 'typescript', '.vue': 'javascript',
+    '.java': 'java', '.kt': 'kotlin', '.scala': 'scala', '.cs': 'csharp',
+    '.go': 'go', '.rs': 'rust', '.c': 'c', '.h': 'c', '.cpp': 'cpp', '.cc': 'cpp', '.hpp': 'cpp',
+    '.rb': 'ruby', '.php': 'php', '.swift': 'swift', '.sh': 'shell', '.sql': 'sql',
+}
+
+# Lines that start a top-level definition; source chunks are cut only here
+DEFINITION_PATTERNS = {
+    'python': r'^(?:@|def |async def |class )',
+    'javascript': r'^(?:export |function |async function |class |const \w+ = (?:async )?\(|module\.exports)',
+    'typescript': r'^(?:export |function |async function |class |interface |type \w+ =|enum |const \w+ = (?:async )?\()',
+    'java': r'^\s{0,4}(?:public |private |protected |static |final |abstract |class |interface |enum |@)',
+    'kotlin': r'^(?:fun |class |object |interface |data class |sealed |private |internal |@)',
+    'scala': r'^(?:def |class |object |trait |case class |sealed )',
+    'csharp': r'^\s{0,8}(?:public |private |protected |internal |static |class |interface |namespace |\[)',
+    'go': r'^(?:func |type |var \(|const \()',
+    'rust': r'^(?:pub |fn |impl |struct |enum |trait |mod |#\[)',
+    'c': r'^(?:[A-Za-z_][\w \*]*\([^;]*$|struct |typedef |enum |#define )',
+    'cpp': r'^(?:[A-Za-z_][\w:<>, \*&]*\([^;]*$|class |struct |namespace |template|typedef |enum )',
+    'ruby': r'^\s{0,2}(?:def |class |module )',
+    'php': r'^\s{0,4}(?:function |class |interface |trait |public |private |protected )',
+    'swift': r'^(?:func |class |struct |enum |protocol |extension |public |private )',
+    'shell': r'^(?:function |\w+\s*\(\)\s*\{)',
+    'sql': r'^(?:CREATE |ALTER |SELECT |INSERT |UPDATE |DELETE |WITH )',
+}
+
+
+def create_chroma_client():
+    """
+    In-memory by default. In scale-out mode every worker must see the same
+    index, so point them at a Chroma server (CHROMA_HOST). RAG_PERSIST_DIR
+    keeps the index across restarts of a single process only: an embedded
+    PersistentClient holds its HNSW index in process memory, so workers
+    sharing the directory do not see each other's writes.
+    """
+    import chromadb
+
+    if os.getenv("CHROMA_HOST"):
+        return chromadb.HttpClient(
+            host=os.getenv("CHROMA_HOST"),
+            port=int(os.getenv("CHROMA_PORT", "8000"))
+        ), True
+    if os.getenv("RAG_PERSIST_DIR"):
+        return chromadb.PersistentClient(path=os.getenv("RAG_PERSIST_DIR")), True
+    return chromadb.Client(), False
 
 class RAGEngine:
+    """
+    The embedding model and the Chroma client are loaded on first use (or by
+    `warm_up`), so constructing the engine costs nothing at import time.
+    """
+
+    # Recent query embeddings, so a prefetched draft, the RAG search and the
+    # response cache lookup for the same text embed it only once
+    EMBED_CACHE_SIZE = 256
+
     def __init__(self):
-        self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-        self.client = chromadb.Client()
-        
-        # Try to delete existing collection if it exists
-        try:
-            self.client.delete_collection(name="documents")
-        except:
-            pass
-            
-        self.collection = self.client.create_collection(name="documents")
-        
+        self._embedder = None
+        self._collection = None
+        self._lock = threading.Lock()
+        self._embed_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embed_cache_lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._collection is not None:
+                return
+            # Concurrent query embeddings from different turns are batched together
+            self._embedder = BatchingEmbedder(create_embedder())
+
+            if os.getenv("RAG_VECTOR_STORE", "chroma").lower() == "compact":
+                # Memory-mapped float16/int8 index on disk; shareable by workers on one host
+                self.client, self.shared = None, True
+                self._collection = CompactVectorStore()
+                return
+
+            self.client, self.shared = create_chroma_client()
+
+            if self.shared:
+                # Documents indexed by other workers or an earlier run must be kept
+                self._collection = self.client.get_or_create_collection(name="documents")
+                return
+
+            # Try to delete existing collection if it exists
+            try:
+                self.client.delete_collection(name="documents")
+            except:
+                pass
+
+            self._collection = self.client.create_collection(name="documents")
+
+    @property
+    def embedder(self):
+        if self._collection is None:
+            self._load()
+        return self._embedder
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._load()
+        return self._collection
+
+    @property
+    def loaded(self) -> bool:
+        return self._collection is not None
+
+    def warm_up(self):
+        """Load the model and run one embedding so the first query is fast"""
+        self.embedder.embed("warm up")
+
     def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
         """Split text into overlapping chunks"""
         chunks = []
@@ -28,8 +134,91 @@ class RAGEngine:
             start = end - overlap
         return chunks
     
+    def chunk_code(self, text: str, language: str, filename: str = "", chunk_size: int = 1000) -> List[str]:
+        """
+        Split source code at top-level definitions and pack whole definitions
+        into chunks of about `chunk_size` characters. Oversized definitions are
+        split on line boundaries. Each chunk is prefixed with its file name.
+        """
+        pattern = re.compile(DEFINITION_PATTERNS.get(language, r'^\S'), re.IGNORECASE if language == 'sql' else 0)
+        blocks, current = [], []
+        for line in text.splitlines(keepends=True):
+            if pattern.match(line) and current:
+                # Keep decorators and comments attached to the definition below them
+                split = len(current)
+                while split > 0 and (pattern.match(current[split - 1])
+                                     or current[split - 1].lstrip().startswith(('#', '//', '/*', '*', '"""'))):
+                    split -= 1
+                if split > 0:
+                    blocks.append(''.join(current[:split]))
+                    current = current[split:]
+            current.append(line)
+        if current:
+            blocks.append(''.join(current))
+
+        header = f"File: {filename} ({language})\n" if filename else ""
+        chunks, buffer = [], ""
+        for block in blocks:
+            pieces = [block]
+            if len(block) > chunk_size:
+                pieces, piece = [], ""
+                for line in block.splitlines(keepends=True):
+                    # Overlong lines (minified code, data literals) are cut, never truncated
+                    for start in range(0, len(line), chunk_size):
+                        part = line[start:start + chunk_size]
+                        if piece and len(piece) + len(part) > chunk_size:
+                            pieces.append(piece)
+                            piece = ""
+                        piece += part
+                pieces.append(piece)
+            for piece in pieces:
+                if buffer and len(buffer) + len(piece) > chunk_size:
+                    chunks.append(header + buffer)
+                    buffer = ""
+                buffer += piece
+        if buffer.strip():
+            chunks.append(header + buffer)
+        return chunks
+
+    def supports(self, filename: str) -> bool:
+        return filename.lower().endswith(TEXT_EXTENSIONS + tuple(SOURCE_LANGUAGES))
+
+    def prepare_document(self, content: bytes, filename: str) -> List[str]:
+        """Extract and chunk a document without embedding it"""
+        lower = filename.lower()
+        if lower.endswith('.pdf'):
+            return self.chunk_text(self.extract_text_from_pdf(content))
+
+        text = content.decode('utf-8', errors='replace')
+        language = SOURCE_LANGUAGES.get(os.path.splitext(lower)[1])
+        if language:
+            return self.chunk_code(text, language, filename)
+        return self.chunk_text(text)
+
+    def add_chunks(self, chunks: List[str]) -> int:
+        """Embed chunks in one batch and add them to the collection"""
+        if not chunks:
+            return 0
+
+        # Generate unique IDs for each chunk
+        ids = [str(uuid.uuid4()) for _ in chunks]
+
+        with span("rag_ingest_embed"):
+            embeddings = self.embedder.encode(chunks).tolist()
+
+        # Add to vector database
+        self.collection.add(
+            documents=chunks,
+            embeddings=embeddings,
+            ids=ids
+        )
+
+        return len(chunks)
+
     def extract_text_from_pdf(self, file_bytes: bytes) -> str:
         """Extract text from PDF file"""
+        import PyPDF2
+
         pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
         text = ""
         for page in pdf_reader.pages:
@@ -39,8 +228,19 @@ class RAGEngine:
     def clear_documents(self):
         """Clear all documents from the collection"""
         try:
+            if not self.loaded:
+                self._load()
+            if isinstance(self._collection, CompactVectorStore):
+                self._collection.clear()
+                return True
+            if self.shared:
+                # Dropping the collection would invalidate other workers' handles
+                ids = self.collection.get(include=[])["ids"]
+                if ids:
+                    self.collection.delete(ids=ids)
+                return True
             self.client.delete_collection(name="documents")
-            self.collection = self.client.create_collection(name="documents")
+            self._collection = self.client.create_collection(name="documents")
             return True
         except Exception as e:
             print(f"Error clearing documents: {e}")
@@ -48,45 +248,64 @@ class RAGEngine:
     
     def ingest_document(self, content: bytes, filename: str) -> int:
         """Ingest a document into the RAG system"""
-        if filename.endswith('.pdf'):
-            text = self.extract_text_from_pdf(content)
-        else:
-            text = content.decode('utf-8')
-        
-        chunks = self.chunk_text(text)
-        
-        # Generate unique IDs for each chunk
-        ids = [str(uuid.uuid4()) for _ in chunks]
-        
-        # Add to vector database
-        self.collection.add(
-            documents=chunks,
-            ids=ids
-        )
-        
-        return len(chunks)
+        return self.add_chunks(self.prepare_document(content, filename))
     
-    def search(self, query: str, top_k: int = 3) -> List[str]:
-        """Search for relevant chunks based on query with token limiting"""
+    def embed(self, text: str) -> List[float]:
+        """Embed a single piece of text with the document embedding model"""
+        with self._embed_cache_lock:
+            cached = self._embed_cache.get(text)
+            if cached is not None:
+                self._embed_cache.move_to_end(text)
+                return cached
+
+        embedding = self.embedder.embed(text).tolist()
+        with self._embed_cache_lock:
+            self._embed_cache[text] = embedding
+            if len(self._embed_cache) > self.EMBED_CACHE_SIZE:
+                self._embed_cache.popitem(last=False)
+        return embedding
+
+    def clear_embed_cache(self):
+        """Forget cached query embeddings, e.g. to time cold queries"""
+        with self._embed_cache_lock:
+            self._embed_cache.clear()
+
+    def search_with_scores(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """Search for relevant chunks; each hit has the chunk id, text and cosine score"""
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=top_k
-            )
+            with span("rag_embed"):
+                query_embedding = self.embed(query)
+
+            with span("rag_query"):
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=top_k
+                )
             
             if results['documents'] and len(results['documents']) > 0:
-                chunks = results['documents'][0]
+                compact = isinstance(self.collection, CompactVectorStore)
+                hits = []
+                for chunk_id, chunk, distance in zip(results['ids'][0], results['documents'][0],
+                                                     results['distances'][0]):
+                    # Embeddings are unit length: the compact store returns 1 - cos,
+                    # Chroma's default space returns the squared L2 distance 2 - 2cos
+                    score = 1 - distance if compact else 1 - distance / 2
+                    hits.append({"id": chunk_id, "text": chunk, "score": round(float(score), 4)})
                 
                 # Token limiting: Keep context under ~4000 tokens
                 # Rough estimate: 4 characters per token
-                total_chars = sum(len(c) for c in chunks)
+                total_chars = sum(len(h["text"]) for h in hits)
                 
                 if total_chars > 16000:  # ~4000 tokens
                     # Truncate to top 2 chunks to stay within limit
-                    chunks = chunks[:2]
+                    hits = hits[:2]
                 
-                return chunks
+                return hits
             return []
         except Exception as e:
             print(f"Search error: {e}")
             return []
+
+    def search(self, query: str, top_k: int = 3) -> List[str]:
+        """Search for relevant chunks based on query with token limiting"""
+        return [hit["text"] for hit in self.search_with_scores(query, top_k)]
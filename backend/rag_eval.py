@@ -0,0 +1,279 @@
+"""
+Offline retrieval evaluation for RAGEngine
+
+Ingests a corpus of technical docs into a throwaway index (in-memory Chroma
+or a temporary compact store) and asks the questions in qa.jsonl. A
+retrieved chunk counts as relevant when it contains the question's answer
+span, so scores stay comparable when chunking changes. The report covers
+recall@k and MRR over a ranked search, recall of what `search()` actually
+hands the LLM (default top_k and truncation), ingest throughput, query
+latency and index memory.
+
+Usage:
+    python3 rag_eval.py --output rag_eval_results.json
+    python3 rag_eval.py --baseline rag_eval_results.json --output new_results.json
+    python3 rag_eval.py --store compact --data path/to/own_dataset
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+DEFAULT_DATA_DIR = Path(__file__).parent / "rag_eval_data"
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def load_dataset(data_dir: Path):
+    """Return (corpus {filename: bytes}, questions, fingerprint) for a dataset directory"""
+    corpus = {p.name: p.read_bytes() for p in sorted((data_dir / "corpus").iterdir()) if p.is_file()}
+    with open(data_dir / "qa.jsonl") as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+
+    for q in questions:
+        if q["doc"] not in corpus:
+            raise ValueError(f"{q['id']}: unknown document {q['doc']}")
+        if normalize(q["answer"]) not in normalize(corpus[q["doc"]].decode("utf-8")):
+            raise ValueError(f"{q['id']}: answer span not found in {q['doc']}")
+
+    digest = hashlib.sha1()
+    for name, content in corpus.items():
+        digest.update(name.encode())
+        digest.update(content)
+    digest.update((data_dir / "qa.jsonl").read_bytes())
+    return corpus, questions, digest.hexdigest()[:12]
+
+
+def first_relevant(chunks: List[str], answer: str) -> Optional[int]:
+    """1-based rank of the first chunk containing the answer span"""
+    answer = normalize(answer)
+    for rank, chunk in enumerate(chunks, 1):
+        if answer in normalize(chunk):
+            return rank
+    return None
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 6) if values else 0.0,
+        "p50": round(percentile(values, 50), 6),
+        "p95": round(percentile(values, 95), 6),
+        "max": round(max(values), 6) if values else 0.0
+    }
+
+
+def dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def evaluate(engine, corpus: Dict[str, bytes], questions: List[Dict], ks: List[int],
+             repeat: int) -> Dict:
+    # Load the model first so it is not billed to ingest or the first query
+    engine.warm_up()
+    baseline_rss = rss_bytes()
+
+    chunk_seconds = 0.0
+    index_seconds = 0.0
+    chunk_count = 0
+    chunks_by_doc = {}
+    for name, content in corpus.items():
+        started = time.perf_counter()
+        chunks = engine.prepare_document(content, name)
+        chunk_seconds += time.perf_counter() - started
+        chunks_by_doc[name] = chunks
+
+        started = time.perf_counter()
+        chunk_count += engine.add_chunks(chunks)
+        index_seconds += time.perf_counter() - started
+    ingest_seconds = chunk_seconds + index_seconds
+    index_rss = max(0, rss_bytes() - baseline_rss)
+
+    per_question = []
+    for q in questions:
+        ranked = [hit["text"] for hit in engine.search_with_scores(q["question"], top_k=max(ks))]
+        served = engine.search(q["question"])
+        per_question.append({
+            "id": q["id"],
+            "rank": first_relevant(ranked, q["answer"]),
+            "served_hit": first_relevant(served, q["answer"]) is not None,
+            "served_chars": sum(len(c) for c in served)
+        })
+
+    latencies = []
+    for _ in range(repeat):
+        for q in questions:
+            # Time the full query path, embedding included
+            engine.clear_embed_cache()
+            started = time.perf_counter()
+            engine.search(q["question"])
+            latencies.append(time.perf_counter() - started)
+
+    ranks = [r["rank"] for r in per_question]
+    total = len(per_question) or 1
+    return {
+        "retrieval": {
+            **{f"recall@{k}": round(sum(1 for r in ranks if r and r <= k) / total, 4) for k in ks},
+            f"mrr@{max(ks)}": round(sum(1 / r for r in ranks if r) / total, 4),
+            # Ceiling set by chunking: answers that lie whole inside some chunk
+            "chunk_coverage": round(sum(1 for q in questions
+                                        if first_relevant(chunks_by_doc[q["doc"]], q["answer"])) / total, 4),
+            "served_recall": round(sum(1 for r in per_question if r["served_hit"]) / total, 4),
+            "served_context_chars": summarize([r["served_chars"] for r in per_question])
+        },
+        "ingest": {
+            "documents": len(corpus),
+            "chunks": chunk_count,
+            "chunk_seconds": round(chunk_seconds, 4),
+            "index_seconds": round(index_seconds, 4),
+            "chunks_per_sec": round(chunk_count / ingest_seconds, 2) if ingest_seconds else 0.0
+        },
+        "query_latency_seconds": summarize(latencies),
+        "memory": {
+            "index_rss_bytes": index_rss,
+            "bytes_per_chunk": index_rss // max(1, chunk_count)
+        },
+        "per_question": per_question
+    }
+
+
+def compare_with_baseline(report: dict, baseline_path: str, tolerance: float,
+                          quality_tolerance: float) -> list:
+    """Return human-readable regressions against a previous report"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    regressions = []
+    if baseline["config"]["dataset"] != report["config"]["dataset"]:
+        regressions.append(f"dataset changed ({baseline['config']['dataset']} -> "
+                           f"{report['config']['dataset']}); results are not comparable")
+        return regressions
+
+    # Quality metrics are fractions, compared in absolute points
+    for metric, new in report["metrics"]["retrieval"].items():
+        old = baseline["metrics"]["retrieval"].get(metric)
+        if isinstance(new, float) and isinstance(old, float) and old - new > quality_tolerance:
+            regressions.append(f"{metric}: {old:.4f} -> {new:.4f}")
+
+    checks = [
+        ("query_latency_seconds", "p95", True),
+        ("query_latency_seconds", "p50", True),
+        ("ingest", "chunks_per_sec", False),
+    ]
+    for section, stat, lower_is_better in checks:
+        old = baseline["metrics"][section][stat]
+        new = report["metrics"][section][stat]
+        if not old:
+            continue
+        change = (new - old) / old
+        if (lower_is_better and change > tolerance) or (not lower_is_better and change < -tolerance):
+            regressions.append(f"{section}.{stat}: {old:.4f} -> {new:.4f} ({change:+.1%})")
+
+    old_ranks = {q["id"]: q["rank"] for q in baseline["metrics"]["per_question"]}
+    lost = [q["id"] for q in report["metrics"]["per_question"]
+            if old_ranks.get(q["id"]) and not q["rank"]]
+    if lost:
+        print(f"ℹ️ Questions no longer answered in the top {report['config']['ks'][-1]}: {', '.join(lost)}")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Evaluate RAG retrieval quality and latency")
+    parser.add_argument("--data", default=str(DEFAULT_DATA_DIR),
+                        help="Dataset directory with corpus/ and qa.jsonl")
+    parser.add_argument("--store", choices=["chroma", "compact"], default="chroma",
+                        help="Vector store to evaluate (always a fresh, throwaway index)")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--repeat", type=int, default=5, help="Timed passes over the questions")
+    parser.add_argument("--output", default="rag_eval_results.json")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative latency/throughput regression (default: 0.2)")
+    parser.add_argument("--quality-tolerance", type=float, default=0.0,
+                        help="Allowed absolute drop in recall/MRR (default: 0)")
+    args = parser.parse_args()
+    ks = sorted(set(args.k))
+
+    load_dotenv()
+    # Never touch a configured shared index
+    os.environ.pop("CHROMA_HOST", None)
+    os.environ.pop("RAG_PERSIST_DIR", None)
+    os.environ["RAG_VECTOR_STORE"] = args.store
+    index_dir = None
+    if args.store == "compact":
+        index_dir = Path(tempfile.mkdtemp(prefix="devassist-rag-eval-"))
+        os.environ["RAG_COMPACT_DIR"] = str(index_dir)
+
+    from embeddings import MODEL_NAME
+    from rag_engine import RAGEngine
+
+    corpus, questions, fingerprint = load_dataset(Path(args.data))
+    print(f"📚 {len(corpus)} documents, {len(questions)} questions (dataset {fingerprint})")
+
+    engine = RAGEngine()
+    metrics = evaluate(engine, corpus, questions, ks, args.repeat)
+    if index_dir is not None:
+        metrics["memory"]["index_disk_bytes"] = dir_bytes(index_dir)
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "dataset": fingerprint,
+            "store": args.store,
+            "vector_dtype": os.getenv("RAG_VECTOR_DTYPE", "float16") if args.store == "compact" else None,
+            "embedding_backend": engine.embedder.embedder.name,
+            "model": MODEL_NAME,
+            "ks": ks,
+            "repeat": args.repeat
+        },
+        "metrics": metrics
+    }
+
+    # Compare before writing so --baseline and --output may point at the same file
+    regressions = compare_with_baseline(report, args.baseline, args.tolerance, args.quality_tolerance) \
+        if args.baseline else []
+
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    summary = {k: v for k, v in metrics.items() if k != "per_question"}
+    print(json.dumps(summary, indent=2))
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        if regressions:
+            print("❌ Regressions detected:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,211 @@
+"""
+Semantic response cache for repeated programming questions
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+from metrics import CACHE_LOOKUPS
+
+
+class ResponseCache:
+    """
+    Answer cache keyed on the normalized question, a fingerprint of the
+    retrieved context and the model name.
+
+    Exact key matches are served first. Otherwise the question embedding is
+    compared against cached questions that share the same context fingerprint
+    and model, and the closest one above the similarity threshold is reused.
+
+    With a shared store, exact-match answers are also written there so every
+    worker can serve them; the semantic index stays per process.
+    """
+
+    def __init__(self, embedder=None, enabled: bool = None, ttl: float = None,
+                 max_entries: int = None, similarity_threshold: float = None, store=None):
+        self.embedder = embedder
+        self.store = store if store is not None and getattr(store, "shared", False) else None
+        self.enabled = enabled if enabled is not None else \
+            os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.max_entries = max_entries if max_entries is not None else \
+            int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+        self.similarity_threshold = similarity_threshold if similarity_threshold is not None else \
+            float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Lowercase, strip punctuation and collapse whitespace"""
+        question = re.sub(r"[^\w\s+#.]", " ", question.lower())
+        return re.sub(r"\s+", " ", question).strip(" .")
+
+    @staticmethod
+    def fingerprint(context_text: str) -> str:
+        """Stable fingerprint of the retrieved context"""
+        return hashlib.sha256(context_text.encode("utf-8")).hexdigest()[:16]
+
+    def make_key(self, question: str, context_fp: str, model: str) -> str:
+        return f"{model}:{context_fp}:{self.normalize(question)}"
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self.embedder is None:
+            return None
+        try:
+            vector = np.asarray(self.embedder(text), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else None
+        except Exception as e:
+            print(f"Cache embedding error: {e}")
+            return None
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [k for k, v in self.entries.items() if now - v["created"] > self.ttl]
+        for key in expired:
+            del self.entries[key]
+
+    def get(self, question: str, context_text: str, model: str,
+            count_miss: bool = True) -> Optional[str]:
+        """Return a cached answer or None"""
+        if not self.enabled:
+            return None
+
+        context_fp = self.fingerprint(context_text)
+        key = self.make_key(question, context_fp, model)
+
+        with self._lock:
+            self._evict_expired()
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(result="hit")
+                return entry["answer"]
+
+        query_vec = self._embed(self.normalize(question))
+
+        with self._lock:
+            if query_vec is not None:
+                best_key, best_score = None, self.similarity_threshold
+                for cached_key, cached in self.entries.items():
+                    if cached["context_fp"] != context_fp or cached["model"] != model:
+                        continue
+                    if cached["embedding"] is None:
+                        continue
+                    score = float(np.dot(query_vec, cached["embedding"]))
+                    if score >= best_score:
+                        best_key, best_score = cached_key, score
+                if best_key:
+                    self.entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    CACHE_LOOKUPS.inc(result="semantic_hit")
+                    return self.entries[best_key]["answer"]
+
+            if count_miss:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+    def put(self, question: str, context_text: str, model: str, answer: str):
+        """Store an answer, evicting the least recently used entries past the size limit"""
+        if not self.enabled or not answer:
+            return
+
+        context_fp = self.fingerprint(context_text)
+        key = self.make_key(question, context_fp, model)
+        embedding = self._embed(self.normalize(question))
+
+        with self._lock:
+            self.entries[key] = {
+                "answer": answer,
+                "context_fp": context_fp,
+                "model": model,
+                "embedding": embedding,
+                "created": time.monotonic()
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    async def lookup(self, question: str, context_text: str, model: str) -> Optional[str]:
+        """Check the local cache, then the shared store"""
+        if not self.enabled:
+            return None
+
+        answer = await asyncio.to_thread(self.get, question, context_text, model, self.store is None)
+        if answer or self.store is None:
+            return answer
+
+        key = self.make_key(question, self.fingerprint(context_text), model)
+        try:
+            cached = await self.store.get(f"response_cache:{key}")
+        except Exception as e:
+            print(f"Shared cache error: {e}")
+            cached = None
+
+        if cached:
+            answer = json.loads(cached)["answer"]
+            self.hits += 1
+            self.shared_hits += 1
+            CACHE_LOOKUPS.inc(result="shared_hit")
+            # Warm the local semantic index too
+            await asyncio.to_thread(self.put, question, context_text, model, answer)
+            return answer
+
+        self.misses += 1
+        CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def save(self, question: str, context_text: str, model: str, answer: str):
+        """Store an answer locally and, when configured, in the shared store"""
+        if not self.enabled or not answer:
+            return
+
+        await asyncio.to_thread(self.put, question, context_text, model, answer)
+        if self.store is not None:
+            key = self.make_key(question, self.fingerprint(context_text), model)
+            try:
+                await self.store.set(f"response_cache:{key}", json.dumps({"answer": answer}), ttl=self.ttl)
+            except Exception as e:
+                print(f"Shared cache error: {e}")
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "shared_hits": self.shared_hits,
+            "shared": self.store is not None,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def split_for_streaming(text: str) -> List[str]:
+    """Split a cached answer into word-sized frames for the WebSocket stream"""
+    return re.findall(r"\s*\S+|\s+", text)
@@ -0,0 +1,236 @@
+"""
+Fair scheduler for chat turns
+
+Every /ws/chat turn passes through the scheduler before it may call the LLM,
+start a web scrape or open a Qwen browser session:
+
+- Each user has a token bucket. A turn costs its lane's price; a user whose
+  bucket is empty is turned away with a retry hint.
+- At most SCHED_CONCURRENCY turns run at once, and the web and Qwen lanes
+  have their own, smaller limits. Waiting turns are served by lane priority:
+  RAG-only turns, then web research, then Qwen.
+- Within a lane, users take turns by weighted fair queueing on virtual finish
+  times, so one user with many queued turns cannot crowd out the others.
+- A turn that has waited SCHED_MAX_WAIT seconds is served ahead of the lane
+  order, so Qwen turns are never starved by a stream of cheap ones.
+- Waiting turns are told their queue position whenever it changes.
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from connection_manager import CapacityError
+from llm_gateway import TokenBucket
+from metrics import Counter, Histogram
+
+SCHEDULED_TURNS = Counter(
+    "devassist_scheduler_turns_total",
+    "Chat turns by scheduler lane and outcome",
+    ("lane", "outcome")
+)
+QUEUE_WAIT = Histogram(
+    "devassist_scheduler_wait_seconds",
+    "Time chat turns waited in the scheduler queue",
+    ("lane",)
+)
+
+
+class QuotaExceeded(CapacityError):
+    """Raised when a user's token bucket cannot pay for a turn"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """'alice:2,bob:0.5' -> {'alice': 2.0, 'bob': 0.5}"""
+    weights = {}
+    for item in spec.split(","):
+        user_id, _, weight = item.strip().rpartition(":")
+        if user_id:
+            weights[user_id] = float(weight)
+    return weights
+
+
+class Lane:
+    def __init__(self, name: str, priority: int, cost: float, limit: int):
+        self.name = name
+        self.priority = priority
+        self.cost = cost
+        self.limit = limit
+        self.running = 0
+
+
+class Ticket:
+    def __init__(self, user_id: str, lane: Lane, start: float, finish: float, seq: int):
+        self.user_id = user_id
+        self.lane = lane
+        self.start = start
+        self.finish = finish
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.changed = asyncio.Event()
+
+
+class FairScheduler:
+    # Forget idle users' buckets once this many are tracked
+    MAX_TRACKED_USERS = 10000
+
+    def __init__(self, concurrency: int = None, quota_burst: float = None,
+                 quota_per_minute: float = None, max_wait: float = None,
+                 weights: Dict[str, float] = None):
+        self.concurrency = concurrency or int(os.getenv("SCHED_CONCURRENCY", "32"))
+        self.quota_burst = quota_burst or float(os.getenv("SCHED_QUOTA_BURST", "30"))
+        self.quota_per_minute = quota_per_minute or float(os.getenv("SCHED_QUOTA_PER_MINUTE", "30"))
+        self.max_wait = max_wait or float(os.getenv("SCHED_MAX_WAIT", "15"))
+        self.weights = weights if weights is not None else \
+            parse_weights(os.getenv("SCHED_USER_WEIGHTS", ""))
+        self.lanes = {
+            "rag": Lane("rag", 0, cost=1, limit=self.concurrency),
+            "web": Lane("web", 1, cost=3, limit=int(os.getenv("SCHED_WEB_CONCURRENCY", "8"))),
+            "qwen": Lane("qwen", 2, cost=10, limit=int(os.getenv("SCHED_QWEN_CONCURRENCY", "2")))
+        }
+        self.running = 0
+        self.waiting: List[Ticket] = []
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.finish: Dict[str, float] = {}
+        self.vtime = 0.0
+        self._seq = itertools.count()
+
+    # ----- quotas -----
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            if len(self.buckets) >= self.MAX_TRACKED_USERS:
+                self._prune()
+            bucket = TokenBucket(rate=self.quota_per_minute / 60, capacity=self.quota_burst)
+            self.buckets[user_id] = bucket
+        return bucket
+
+    def _prune(self):
+        for user_id, bucket in list(self.buckets.items()):
+            bucket._refill()
+            if bucket.tokens >= bucket.capacity:
+                del self.buckets[user_id]
+        # A finish time at or behind the virtual clock carries no credit
+        self.finish = {u: f for u, f in self.finish.items() if f > self.vtime}
+
+    def has_quota(self, user_id: str, lane: str) -> bool:
+        """Whether the user could pay for a turn in `lane` right now, without charging"""
+        bucket = self._bucket(user_id)
+        bucket._refill()
+        return bucket.tokens >= self.lanes[lane].cost
+
+    # ----- queueing -----
+
+    def _order(self, ticket: Ticket, now: float):
+        if now - ticket.enqueued >= self.max_wait:
+            return (0, ticket.enqueued, 0, ticket.seq)
+        return (1, ticket.lane.priority, ticket.finish, ticket.seq)
+
+    def _queue(self) -> List[Ticket]:
+        now = time.monotonic()
+        return sorted(self.waiting, key=lambda t: self._order(t, now))
+
+    def position(self, ticket: Ticket) -> int:
+        return self._queue().index(ticket) + 1
+
+    def _dispatch(self):
+        """Start waiting turns while there are free slots, then wake the rest"""
+        for ticket in self._queue():
+            if self.running >= self.concurrency:
+                break
+            if ticket.lane.running >= ticket.lane.limit:
+                continue
+            self.waiting.remove(ticket)
+            self.running += 1
+            ticket.lane.running += 1
+            self.vtime = max(self.vtime, ticket.start)
+            ticket.granted = True
+            ticket.changed.set()
+        for ticket in self.waiting:
+            ticket.changed.set()
+
+    def _release(self, ticket: Ticket):
+        self.running -= 1
+        ticket.lane.running -= 1
+        self._dispatch()
+
+    async def _wait(self, ticket: Ticket, on_queued: Optional[Callable[[int], Awaitable]]):
+        position = None
+        while not ticket.granted:
+            # Cleared before reporting, so a grant during the report is not missed
+            ticket.changed.clear()
+            current = self.position(ticket)
+            if on_queued is not None and current != position:
+                position = current
+                await on_queued(position)
+            if not ticket.granted:
+                await ticket.changed.wait()
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, lane: str,
+                   on_queued: Optional[Callable[[int], Awaitable]] = None):
+        """
+        Charge the user's quota and hold a run slot for one turn, waiting in
+        the fair queue if needed. Raises QuotaExceeded when the bucket is empty.
+        """
+        lane = self.lanes[lane]
+        bucket = self._bucket(user_id)
+        retry_after = bucket.try_acquire(lane.cost)
+        if retry_after:
+            SCHEDULED_TURNS.inc(lane=lane.name, outcome="quota_exceeded")
+            raise QuotaExceeded(
+                f"⏱️ You have reached your request quota. Try again in {math.ceil(retry_after)}s.",
+                retry_after)
+
+        start = max(self.vtime, self.finish.get(user_id, 0.0))
+        ticket = Ticket(user_id, lane, start, start + lane.cost / self.weights.get(user_id, 1.0),
+                        next(self._seq))
+        self.finish[user_id] = ticket.finish
+        self.waiting.append(ticket)
+        self._dispatch()
+
+        try:
+            await self._wait(ticket, on_queued)
+        except BaseException:
+            if ticket.granted:
+                self._release(ticket)
+            else:
+                # Cancelled or disconnected while queued: nothing ran, so refund
+                self.waiting.remove(ticket)
+                bucket.release(lane.cost)
+                SCHEDULED_TURNS.inc(lane=lane.name, outcome="abandoned")
+                self._dispatch()
+            raise
+
+        QUEUE_WAIT.observe(time.monotonic() - ticket.enqueued, lane=lane.name)
+        SCHEDULED_TURNS.inc(lane=lane.name, outcome="started")
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "waiting": len(self.waiting),
+            "lanes": {
+                name: {
+                    "running": lane.running,
+                    "limit": lane.limit,
+                    "waiting": sum(1 for t in self.waiting if t.lane is lane),
+                    "cost": lane.cost
+                } for name, lane in self.lanes.items()
+            },
+            "tracked_users": len(self.buckets)
+        }
@@ -0,0 +1,213 @@
+"""
+Shared state for running several workers or nodes behind one load balancer
+
+The store is selected with SHARED_STORE_URL:
+    memory://                    in-process only (default, single worker)
+    sqlite:///path/to/state.db   shared by every worker on one host
+    redis://host:6379/0          shared across hosts (needs the `redis` package)
+"""
+
+import asyncio
+import os
+import socket
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LocalStore:
+    """In-process stand-in with Redis-like semantics. Not shared between workers."""
+
+    shared = False
+
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+
+    def _alive(self, key: str) -> bool:
+        expires = self.expiry.get(key)
+        if expires is not None and expires <= time.time():
+            self.values.pop(key, None)
+            self.expiry.pop(key, None)
+            return False
+        return True
+
+    def _expire(self, key: str, ttl: Optional[float]):
+        if ttl:
+            self.expiry[key] = time.time() + ttl
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.values.get(key) if self._alive(key) else None
+
+    async def set(self, key: str, value: str, ttl: float = None):
+        self.values[key] = value
+        self.expiry.pop(key, None)
+        self._expire(key, ttl)
+
+    async def delete(self, key: str):
+        self.values.pop(key, None)
+        self.expiry.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        """Add to a counter; `ttl` applies only when the counter is created"""
+        if self._alive(key) and key in self.values:
+            current = int(self.values[key])
+        else:
+            current = 0
+            self.expiry.pop(key, None)
+            self._expire(key, ttl)
+        self.values[key] = str(current + amount)
+        return current + amount
+
+    async def decr(self, key: str, amount: int = 1) -> int:
+        """Subtract from a counter, never below 0; a missing or expired counter stays missing"""
+        if not self._alive(key) or key not in self.values:
+            return 0
+        value = int(self.values[key]) - amount
+        if value <= 0:
+            await self.delete(key)
+            return 0
+        self.values[key] = str(value)
+        return value
+
+    async def close(self):
+        pass
+
+
+class SQLiteStore:
+    """
+    File-backed store shared by every worker on one host. Each operation is a
+    short transaction run off the event loop; WAL mode lets readers proceed
+    while another worker writes.
+    """
+
+    shared = True
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def _run(self, sql_fn):
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = sql_fn(conn, time.time())
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    async def get(self, key: str) -> Optional[str]:
+        def op(conn, now):
+            row = conn.execute("SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                               (key, now)).fetchone()
+            return row[0] if row else None
+        return await asyncio.to_thread(self._run, op)
+
+    async def set(self, key: str, value: str, ttl: float = None):
+        def op(conn, now):
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                         (key, value, now + ttl if ttl else None))
+        await asyncio.to_thread(self._run, op)
+
+    async def delete(self, key: str):
+        def op(conn, now):
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+        await asyncio.to_thread(self._run, op)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        def op(conn, now):
+            row = conn.execute("SELECT value, expires FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                               (key, now)).fetchone()
+            value = (int(row[0]) if row else 0) + amount
+            expires = row[1] if row else (now + ttl if ttl else None)
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                         (key, str(value), expires))
+            return value
+        return await asyncio.to_thread(self._run, op)
+
+    async def decr(self, key: str, amount: int = 1) -> int:
+        def op(conn, now):
+            row = conn.execute("SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                               (key, now)).fetchone()
+            value = int(row[0]) - amount if row else 0
+            if value <= 0:
+                conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+                return 0
+            conn.execute("UPDATE kv SET value = ? WHERE key = ?", (str(value), key))
+            return value
+        return await asyncio.to_thread(self._run, op)
+
+    async def close(self):
+        pass
+
+
+class RedisStore:
+    """Redis (or any Redis-protocol server such as Valkey, KeyDB or Dragonfly)"""
+
+    shared = True
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("SHARED_STORE_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float = None):
+        await self.client.set(key, value, ex=int(ttl) if ttl else None)
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        async with self.client.pipeline(transaction=True) as pipe:
+            if ttl:
+                # Only a new key gets the TTL; later increments keep its expiry
+                pipe.set(key, 0, ex=int(ttl), nx=True)
+            pipe.incrby(key, amount)
+            results = await pipe.execute()
+        return int(results[-1])
+
+    # DECRBY keeps the key's TTL; a missing key is left missing
+    DECR_SCRIPT = """
+    local value = redis.call('GET', KEYS[1])
+    if not value then return 0 end
+    if tonumber(value) <= tonumber(ARGV[1]) then
+        redis.call('DEL', KEYS[1])
+        return 0
+    end
+    return redis.call('DECRBY', KEYS[1], ARGV[1])
+    """
+
+    async def decr(self, key: str, amount: int = 1) -> int:
+        return int(await self.client.eval(self.DECR_SCRIPT, 1, key, amount))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_store(url: str = None):
+    url = url or os.getenv("SHARED_STORE_URL", "memory://")
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisStore(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    return LocalStore()
+
+
+shared_store = create_store()
@@ -0,0 +1,147 @@
+"""
+Import-time profile and cold-start check for the backend app
+
+Reports the slowest modules pulled in by `import main` (from
+`python -X importtime`) and the time from launching uvicorn until
+/api/health answers. Exits non-zero when either exceeds its budget, so it
+can run in CI.
+
+Usage:
+    python3 startup_profile.py --output startup_profile.json
+    python3 startup_profile.py --import-budget 1.0 --cold-start-budget 2.5
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent
+
+
+def parse_importtime(stderr: str):
+    """Turn `-X importtime` output into (module, self_s, cumulative_s) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def profile_imports(env: dict, top: int) -> dict:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"'import main' failed:\n{result.stderr[-2000:]}")
+
+    rows = parse_importtime(result.stderr)
+    main_row = next((r for r in rows if r[0] == "main"), None)
+    by_cumulative = sorted(rows, key=lambda r: r[2], reverse=True)
+    return {
+        "wall_seconds": round(wall, 3),
+        "main_cumulative_seconds": round(main_row[2], 3) if main_row else None,
+        "slowest": [
+            {"module": name, "self_seconds": round(self_s, 4), "cumulative_seconds": round(cum_s, 4)}
+            for name, self_s, cum_s in by_cumulative[:top]
+        ]
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_cold_start(env: dict, timeout: float) -> float:
+    """Seconds from spawning uvicorn until /api/health returns 200"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited early:\n{server.stderr.read().decode()[-2000:]}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"Server not healthy after {timeout}s")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend import time and cold start")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to report")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to measure (best is reported)")
+    parser.add_argument("--import-budget", type=float,
+                        default=float(os.getenv("IMPORT_TIME_BUDGET", "1.0")))
+    parser.add_argument("--cold-start-budget", type=float,
+                        default=float(os.getenv("COLD_START_BUDGET", "2.5")))
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", default="startup_profile.json")
+    args = parser.parse_args()
+
+    # Profile what a worker pays before serving, not the background warm-up
+    env = dict(os.environ, PRELOAD_MODELS="false")
+    env.setdefault("LLM_BACKEND", "mock")
+
+    imports = profile_imports(env, args.top)
+    print(f"📦 import main: {imports['main_cumulative_seconds']}s "
+          f"(interpreter wall {imports['wall_seconds']}s)")
+    for row in imports["slowest"]:
+        print(f"   {row['cumulative_seconds']:8.4f}s  {row['module']}")
+
+    cold_starts = [measure_cold_start(env, args.timeout) for _ in range(args.runs)]
+    cold_start = min(cold_starts)
+    print(f"🚀 Cold start to first healthy response: {cold_start:.3f}s "
+          f"(runs: {', '.join(f'{c:.3f}' for c in cold_starts)})")
+
+    failures = []
+    if imports["main_cumulative_seconds"] and imports["main_cumulative_seconds"] > args.import_budget:
+        failures.append(f"import main {imports['main_cumulative_seconds']}s > {args.import_budget}s")
+    if cold_start > args.cold_start_budget:
+        failures.append(f"cold start {cold_start:.3f}s > {args.cold_start_budget}s")
+
+    report = {
+        "imports": imports,
+        "cold_start_seconds": round(cold_start, 3),
+        "cold_start_runs": [round(c, 3) for c in cold_starts],
+        "budgets": {"import_seconds": args.import_budget, "cold_start_seconds": args.cold_start_budget},
+        "within_budget": not failures
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"✅ Report written to {args.output}")
+
+    if failures:
+        print("❌ Over budget:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Static asset layer for the built frontend (frontend/dist)
+
+The dist directory is indexed once at startup: every file's content type,
+ETag and any precompressed variants (.br / .gz written next to it by
+`python3 static_assets.py compress`) are resolved up front, so a request is a
+dict lookup instead of filesystem checks. Small files are served from memory.
+Vite's content-hashed files under assets/ get immutable cache headers;
+everything else (index.html) is revalidated with its ETag.
+"""
+
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from metrics import Counter
+
+STATIC_RESPONSES = Counter(
+    "devassist_static_responses_total",
+    "Static asset responses by outcome",
+    ("result",)
+)
+
+COMPRESSIBLE = {".html", ".js", ".mjs", ".css", ".json", ".svg", ".txt", ".map", ".xml", ".wasm"}
+VARIANT_SUFFIXES = {".br": "br", ".gz": "gzip"}
+# Vite emits e.g. assets/index-4f3a2b1c.js
+HASHED_NAME_RE = re.compile(r"[-.][A-Za-z0-9_-]{8,}\.[a-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class Variant:
+    """One encoding of an asset, held in memory or served from disk"""
+
+    def __init__(self, path: Path, etag: str, body: Optional[bytes] = None):
+        self.path = path
+        self.etag = etag
+        self.body = body
+
+
+class Asset:
+    def __init__(self, path: Path, content_type: str, cache_control: str):
+        self.path = path
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.variants: Dict[str, Variant] = {}
+
+
+def _etag(data: bytes, encoding: str) -> str:
+    digest = hashlib.sha1(data).hexdigest()[:20]
+    return f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class StaticAssets:
+    """Indexed, precompressed view of a built SPA directory"""
+
+    def __init__(self, root: Path, memory_limit: int = None, gzip_on_start: bool = None):
+        self.root = root
+        self.memory_limit = memory_limit or int(os.getenv("STATIC_MEMORY_LIMIT", str(2 * 1024 * 1024)))
+        self.gzip_on_start = gzip_on_start if gzip_on_start is not None else \
+            os.getenv("STATIC_GZIP_ON_START", "true").lower() == "true"
+        self.assets: Dict[str, Asset] = {}
+        self.index_html: Optional[Asset] = None
+
+    def load(self):
+        """Index every file under root; called once at startup"""
+        started = time.perf_counter()
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file() or path.suffix in VARIANT_SUFFIXES:
+                continue
+            relative = path.relative_to(self.root).as_posix()
+            self.assets[relative] = self._index(path, relative)
+        self.index_html = self.assets.get("index.html")
+        compressed = sum(1 for a in self.assets.values() if len(a.variants) > 1)
+        print(f"📦 Indexed {len(self.assets)} static files ({compressed} compressed) "
+              f"in {time.perf_counter() - started:.2f}s")
+
+    def _index(self, path: Path, relative: str) -> Asset:
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "image/svg+xml"):
+            content_type += "; charset=utf-8"
+        hashed = relative.startswith("assets/") and HASHED_NAME_RE.search(path.name)
+        asset = Asset(path, content_type, IMMUTABLE if hashed else REVALIDATE)
+
+        data = path.read_bytes()
+        small = len(data) <= self.memory_limit
+        asset.variants["identity"] = Variant(path, _etag(data, "identity"), data if small else None)
+
+        for suffix, encoding in VARIANT_SUFFIXES.items():
+            variant_path = path.with_name(path.name + suffix)
+            if variant_path.exists():
+                encoded = variant_path.read_bytes()
+                if len(encoded) < len(data):
+                    asset.variants[encoding] = Variant(
+                        variant_path, _etag(data, encoding),
+                        encoded if len(encoded) <= self.memory_limit else None)
+
+        # No build-time .gz: compress small text files once here instead of per request
+        if "gzip" not in asset.variants and self.gzip_on_start and small \
+                and path.suffix in COMPRESSIBLE and len(data) > 1024:
+            encoded = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(encoded) < len(data):
+                asset.variants["gzip"] = Variant(path, _etag(data, "gzip"), encoded)
+        return asset
+
+    def lookup(self, full_path: str) -> Optional[Asset]:
+        """The asset for a URL path; unknown non-asset paths fall back to index.html"""
+        asset = self.assets.get(full_path.lstrip("/"))
+        if asset is not None:
+            return asset
+        # A missing hashed file is a stale client, not an SPA route
+        if full_path.startswith("assets/"):
+            return None
+        return self.index_html
+
+    def _choose(self, asset: Asset, accept_encoding: str) -> str:
+        accepted = _accepted(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in asset.variants and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return "identity"
+
+    def serve(self, request: Request, full_path: str) -> Response:
+        asset = self.lookup(full_path)
+        if asset is None:
+            STATIC_RESPONSES.inc(result="not_found")
+            return Response(status_code=404)
+
+        encoding = self._choose(asset, request.headers.get("accept-encoding", ""))
+        variant = asset.variants[encoding]
+        headers = {"ETag": variant.etag, "Cache-Control": asset.cache_control}
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or variant.etag in tags:
+                STATIC_RESPONSES.inc(result="not_modified")
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        STATIC_RESPONSES.inc(result=encoding)
+        if variant.body is not None:
+            return Response(content=variant.body, media_type=asset.content_type, headers=headers)
+        return FileResponse(str(variant.path), media_type=asset.content_type, headers=headers)
+
+
+def compress_directory(root: str, min_size: int = 1024):
+    """Write .gz (and .br when the brotli package is installed) next to compressible files"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("ℹ️ brotli not installed; writing gzip variants only (pip install brotli)")
+
+    written = 0
+    for path in sorted(Path(root).rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE or path.stat().st_size < min_size:
+            continue
+        data = path.read_bytes()
+        encoders = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            encoders.append((".br", lambda d: brotli.compress(d, quality=11)))
+        for suffix, encode in encoders:
+            encoded = encode(data)
+            if len(encoded) < len(data):
+                path.with_name(path.name + suffix).write_bytes(encoded)
+                written += 1
+    print(f"✅ Wrote {written} compressed variants under {root}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Static asset tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compress = sub.add_parser("compress", help="Precompress a built frontend directory")
+    compress.add_argument("root", nargs="?", default=str(Path(__file__).parent.parent / "frontend" / "dist"))
+    args = parser.parse_args()
+    compress_directory(args.root)
@@ -0,0 +1,150 @@
+"""
+Async, pooled access to Supabase (PostgREST + GoTrue) shared by auth and memory
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class SupabaseError(Exception):
+    """Raised when Supabase answers with an error status"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SupabaseClient:
+    """
+    One keep-alive HTTP connection pool for every Supabase call in the process.
+
+    Concurrency is bounded with a semaphore so a burst of chat turns queues
+    here instead of opening hundreds of sockets, and every request carries a
+    timeout so a slow database cannot stall the event loop indefinitely.
+    """
+
+    def __init__(self, url: str = None, service_key: str = None, anon_key: str = None,
+                 max_connections: int = None, max_concurrency: int = None, timeout: float = None):
+        self.url = (url or os.getenv("SUPABASE_URL") or "").rstrip("/")
+        self.service_key = service_key or os.getenv("SUPABASE_SERVICE_KEY")
+        self.anon_key = anon_key or os.getenv("SUPABASE_KEY") or self.service_key
+        self.max_connections = max_connections or int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+        self.max_concurrency = max_concurrency or int(os.getenv("SUPABASE_MAX_CONCURRENCY", "20"))
+        self.timeout = timeout or float(os.getenv("SUPABASE_TIMEOUT", "10"))
+        self.http2 = HTTP2_AVAILABLE and os.getenv("SUPABASE_HTTP2", "true").lower() == "true"
+
+        self.client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def start(self):
+        """Open the connection pool. Safe to call more than once."""
+        if self.client is not None:
+            return
+        self.client = httpx.AsyncClient(
+            base_url=self.url,
+            http2=self.http2,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            )
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _headers(self, key: str, token: str = None) -> Dict[str, str]:
+        return {
+            "apikey": key,
+            "Authorization": f"Bearer {token or key}"
+        }
+
+    async def request(self, method: str, path: str, *, anon: bool = False, token: str = None,
+                      params: Dict[str, Any] = None, json: Any = None,
+                      headers: Dict[str, str] = None) -> Any:
+        """Send a request through the shared pool and return the decoded JSON body"""
+        if self.client is None:
+            await self.start()
+
+        request_headers = self._headers(self.anon_key if anon else self.service_key, token)
+        if headers:
+            request_headers.update(headers)
+
+        async with self._semaphore:
+            response = await self.client.request(
+                method, path, params=params, json=json, headers=request_headers
+            )
+
+        if response.status_code >= 400:
+            try:
+                body = response.json()
+                message = body.get("msg") or body.get("message") or body.get("error_description") \
+                    or body.get("error") or response.text
+            except ValueError:
+                message = response.text
+            raise SupabaseError(message, response.status_code)
+
+        if not response.content:
+            return None
+        return response.json()
+
+    # ===== PostgREST =====
+
+    async def select(self, table: str, columns: str, filters: Dict[str, str] = None,
+                     order: str = None, limit: int = None) -> list:
+        params = {"select": columns}
+        for column, value in (filters or {}).items():
+            params[column] = f"eq.{value}"
+        if order:
+            params["order"] = order
+        if limit:
+            params["limit"] = str(limit)
+        return await self.request("GET", f"/rest/v1/{table}", params=params) or []
+
+    async def insert(self, table: str, row: Dict[str, Any]):
+        await self.request("POST", f"/rest/v1/{table}", json=row,
+                           headers={"Prefer": "return=minimal"})
+
+    async def delete(self, table: str, filters: Dict[str, str]):
+        params = {column: f"eq.{value}" for column, value in filters.items()}
+        await self.request("DELETE", f"/rest/v1/{table}", params=params)
+
+    # ===== GoTrue =====
+
+    async def sign_up(self, email: str, password: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
+        return await self.request("POST", "/auth/v1/signup", anon=True, json={
+            "email": email,
+            "password": password,
+            "data": data or {}
+        })
+
+    async def sign_in_with_password(self, email: str, password: str) -> Dict[str, Any]:
+        return await self.request("POST", "/auth/v1/token", anon=True,
+                                  params={"grant_type": "password"},
+                                  json={"email": email, "password": password})
+
+    async def refresh_session(self, refresh_token: str) -> Dict[str, Any]:
+        return await self.request("POST", "/auth/v1/token", anon=True,
+                                  params={"grant_type": "refresh_token"},
+                                  json={"refresh_token": refresh_token})
+
+    async def get_user(self, token: str) -> Dict[str, Any]:
+        return await self.request("GET", "/auth/v1/user", anon=True, token=token)
+
+
+db = SupabaseClient()
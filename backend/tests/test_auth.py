@@ -0,0 +1,104 @@
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+import auth
+from auth import TokenVerifier
+
+CURRENT = "current-secret-" + "0123456789abcdef" * 4
+PREVIOUS = "previous-secret-" + "0123456789abcdef" * 4
+
+
+def make_token(key, algorithm="HS256", kid=None, expires_in=3600, sub="user-1"):
+    claims = {"sub": sub, "aud": "authenticated", "exp": int(time.time()) + expires_in}
+    return jwt.encode(claims, key, algorithm=algorithm, headers={"kid": kid} if kid else None)
+
+
+def test_hs256_current_and_previous_secret():
+    verifier = TokenVerifier(secrets=[CURRENT, PREVIOUS], jwks_url=None, cache_ttl=0)
+    assert verifier.verify(make_token(CURRENT)) == "user-1"
+    assert verifier.verify(make_token(PREVIOUS, sub="user-2")) == "user-2"
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify(make_token("other-secret-" + "0123456789abcdef" * 4))
+
+
+def test_token_cannot_choose_its_algorithm():
+    verifier = TokenVerifier(secrets=[CURRENT], jwks_url=None, cache_ttl=0)
+    with pytest.raises(jwt.InvalidAlgorithmError):
+        verifier.verify(make_token(CURRENT, algorithm="HS512"))
+
+
+def test_expired_token_is_rejected():
+    verifier = TokenVerifier(secrets=[CURRENT], jwks_url=None, cache_ttl=0)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(make_token(CURRENT, expires_in=-10))
+
+
+class FakeJWKS:
+    def __init__(self, monkeypatch):
+        self.keys = []
+        self.fetches = 0
+        monkeypatch.setattr(auth.httpx, "get", self.get)
+
+    def add(self, kid, **extra):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+        self.keys.append({**jwk, "kid": kid, **extra})
+        return private_key
+
+    def get(self, url, timeout=None):
+        self.fetches += 1
+        keys = [dict(key) for key in self.keys]
+
+        class Response:
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return {"keys": keys}
+        return Response()
+
+
+def test_unknown_kid_refetches_jwks(monkeypatch):
+    jwks = FakeJWKS(monkeypatch)
+    first = jwks.add("key-1", alg="RS256")
+    verifier = TokenVerifier(secrets=[], jwks_url="https://auth.example/jwks.json", cache_ttl=0,
+                             jwks_refresh_interval=0)
+    assert verifier.verify(make_token(first, "RS256", kid="key-1")) == "user-1"
+    assert jwks.fetches == 1
+
+    # The signing key was rotated after the keys were fetched
+    second = jwks.add("key-2", alg="RS256")
+    assert verifier.verify(make_token(second, "RS256", kid="key-2")) == "user-1"
+    assert jwks.fetches == 2
+
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(make_token(second, "RS256", kid="key-3"))
+
+
+def test_jwks_token_must_use_the_keys_algorithm(monkeypatch):
+    jwks = FakeJWKS(monkeypatch)
+    private_key = jwks.add("key-1", alg="RS256")
+    verifier = TokenVerifier(secrets=[], jwks_url="https://auth.example/jwks.json", cache_ttl=0)
+    with pytest.raises(jwt.InvalidAlgorithmError):
+        verifier.verify(make_token(private_key, "RS512", kid="key-1"))
+
+
+def test_verified_tokens_are_cached_until_ttl(monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+    verifier = TokenVerifier(secrets=[CURRENT], jwks_url=None, cache_ttl=60)
+    token = make_token(CURRENT)
+    assert verifier.verify(token) == "user-1"
+
+    # Served from the cache without decoding, even though the secret is gone
+    verifier.secrets = []
+    now[0] += 30
+    assert verifier.verify(token) == "user-1"
+
+    now[0] += 31
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(token)
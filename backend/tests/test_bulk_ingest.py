@@ -0,0 +1,56 @@
+import io
+import zipfile
+
+import pytest
+
+from bulk_ingest import BulkIngestor, IngestJob, TooManyJobs, UploadTooLarge
+
+
+class FakeRAG:
+    def supports(self, filename):
+        return filename.endswith(".md")
+
+    def prepare_document(self, content, filename):
+        return [content.decode()]
+
+    def add_chunks(self, chunks):
+        return len(chunks)
+
+
+def test_progress_is_unknown_until_enumerated(tmp_path):
+    job = IngestJob(tmp_path)
+    job.file_found()
+    job.file_done(3)
+    assert job.to_dict()["progress"] is None
+
+    job.file_found()
+    job.enumeration_done()
+    assert job.to_dict()["progress"] == 0.5
+
+
+def test_ingest_counts_skipped_files_and_finishes_enumeration(tmp_path):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("docs/a.md", "alpha")
+        zf.writestr("docs/b.md", "x" * 100)
+    (tmp_path / "0000-docs.zip").write_bytes(archive.getvalue())
+
+    ingestor = BulkIngestor(FakeRAG(), workers=2, max_file_bytes=50)
+    job = IngestJob(tmp_path)
+    ingestor._ingest(job)
+
+    state = job.to_dict()
+    assert (state["files_total"], state["files_done"], state["files_skipped"]) == (1, 1, 1)
+    assert state["errors"] == ["docs/b.md: skipped (too large)"]
+    assert state["progress"] == 1.0
+
+
+def test_admit_checks_size_and_jobs_before_the_body_is_read(tmp_path):
+    ingestor = BulkIngestor(FakeRAG(), max_upload_bytes=1000, max_jobs=1)
+    ingestor.admit(1000)
+    with pytest.raises(UploadTooLarge):
+        ingestor.admit(1001)
+
+    ingestor.jobs["running"] = IngestJob(tmp_path)
+    with pytest.raises(TooManyJobs):
+        ingestor.admit(10)
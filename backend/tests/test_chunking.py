@@ -0,0 +1,20 @@
+from rag_engine import RAGEngine
+
+
+def test_chunk_code_splits_at_definitions():
+    source = "import os\n\n\ndef first():\n    return 1\n\n\n@decorator\ndef second():\n    return 2\n"
+    chunks = RAGEngine().chunk_code(source, "python", "app.py", chunk_size=40)
+    assert all(chunk.startswith("File: app.py (python)\n") for chunk in chunks)
+    body = [chunk.split("\n", 1)[1] for chunk in chunks]
+    assert any(b.startswith("@decorator\ndef second():") for b in body)
+    assert "".join(body) == source
+
+
+def test_chunk_code_keeps_every_character_of_overlong_lines():
+    minified = "var a=" + "x" * 2490 + "MARKER;" + "y" * 500 + "\n"
+    source = "function f() {\n  return 1;\n}\n" + minified
+    chunks = RAGEngine().chunk_code(source, "javascript", chunk_size=1000)
+
+    assert "".join(chunks) == source
+    assert any("MARKER" in chunk for chunk in chunks)
+    assert max(len(chunk) for chunk in chunks) <= 1000
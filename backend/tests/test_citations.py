@@ -0,0 +1,76 @@
+from citations import CitationTracker, build_sources, format_sources
+
+
+def sources(count):
+    return [{"n": n, "type": "web", "title": f"T{n}", "url": f"https://example.com/{n}"}
+            for n in range(1, count + 1)]
+
+
+def feed_all(tracker, tokens):
+    return [n for token in tokens for n in tracker.feed(token)]
+
+
+def test_build_sources_numbers_web_results_before_documents():
+    web = [{"title": "Docs", "url": "https://docs.example.com", "score": 0.8},
+           {"title": "Blog", "url": "https://blog.example.com"}]
+    hits = [{"id": "doc-1", "score": 0.5, "text": "First line\nrest of the chunk"}]
+
+    built = build_sources(web, False, hits)
+    assert [s["n"] for s in built] == [1, 2, 3]
+    assert [s["type"] for s in built] == ["web", "web", "document"]
+    assert built[0]["score"] == 0.8
+    assert "score" not in built[1]
+    assert built[2]["title"] == "First line"
+    assert built[2]["id"] == "doc-1"
+
+
+def test_build_sources_marks_local_docs():
+    built = build_sources([{"title": "asyncio", "url": "library/asyncio.html"}], True, [])
+    assert built[0]["type"] == "local_docs"
+    assert format_sources(built).startswith("\n\n**Sources (Local Docs):**")
+
+
+def test_format_sources_lists_only_links():
+    built = build_sources([{"title": "Docs", "url": "https://docs.example.com"}], False,
+                          [{"id": "d", "score": 0.1, "text": "chunk"}])
+    assert format_sources(built) == \
+        "\n\n**Sources (Web Research):**\n1. [Docs](https://docs.example.com)\n"
+    assert format_sources(build_sources([], False, [{"id": "d", "score": 0.1, "text": "x"}])) == ""
+
+
+def test_single_marker():
+    tracker = CitationTracker(sources(3))
+    assert tracker.feed("Use asyncio.gather [Source 2].") == [2]
+    assert tracker.cited == [2]
+
+
+def test_grouped_markers():
+    tracker = CitationTracker(sources(4))
+    assert tracker.feed("See [Source 2 and 3] and [Sources 1, 4].") == [2, 3, 1, 4]
+
+
+def test_marker_split_across_tokens():
+    tracker = CitationTracker(sources(3))
+    assert feed_all(tracker, ["Answer [So", "urce", " 1", "] then [Sources 2 a", "nd 3]"]) == [1, 2, 3]
+
+
+def test_each_source_is_reported_once():
+    tracker = CitationTracker(sources(2))
+    assert feed_all(tracker, ["[Source 1] ", "[Source 1] ", "[Source 2 and 1]"]) == [1, 2]
+
+
+def test_unknown_numbers_are_ignored():
+    tracker = CitationTracker(sources(2))
+    assert tracker.feed("[Source 7] [Source 2]") == [2]
+
+
+def test_no_sources_means_no_citations():
+    tracker = CitationTracker([])
+    assert tracker.feed("[Source 1]") == []
+
+
+def test_unfinished_bracket_is_not_held_forever():
+    tracker = CitationTracker(sources(1))
+    tracker.feed("[" + "x" * 100)
+    assert tracker._pending == ""
+    assert tracker.feed("[Source 1]") == [1]
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import numpy as np
+
+from embeddings import BatchingEmbedder, OnnxEmbedder
+
+
+class FakeEncoding:
+    def __init__(self, ids):
+        self.ids = ids
+        self.attention_mask = [1] * len(ids)
+
+
+class FakeTokenizer:
+    def encode_batch(self, texts):
+        longest = max(len(t) for t in texts)
+        return [FakeEncoding([len(t)] * longest) for t in texts]
+
+
+class FakeSession:
+    def __init__(self):
+        self.batches = []
+
+    def run(self, outputs, feeds):
+        input_ids = feeds["input_ids"]
+        self.batches.append(len(input_ids))
+        # One hidden state per token that encodes the text length
+        return [np.repeat(input_ids[..., None].astype(np.float32), 4, axis=2) + np.arange(4)]
+
+
+def fake_onnx_embedder(batch_size):
+    embedder = OnnxEmbedder.__new__(OnnxEmbedder)
+    embedder.session = FakeSession()
+    embedder.tokenizer = FakeTokenizer()
+    embedder.input_names = {"input_ids", "attention_mask"}
+    embedder.batch_size = batch_size
+    return embedder
+
+
+def test_onnx_encode_runs_in_bounded_batches():
+    embedder = fake_onnx_embedder(batch_size=32)
+    texts = ["x" * (i % 7 + 1) for i in range(100)]
+    vectors = embedder.encode(texts)
+
+    assert embedder.session.batches == [32, 32, 32, 4]
+    assert vectors.shape == (100, 4)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+    # Rows stay in input order across batches
+    expected = fake_onnx_embedder(batch_size=1).encode(texts)
+    np.testing.assert_allclose(vectors, expected, rtol=1e-6)
+
+
+def test_onnx_encode_empty():
+    assert fake_onnx_embedder(batch_size=32).encode([]).shape[0] == 0
+
+
+class SlowEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(len(texts))
+        time.sleep(0.02)
+        return np.zeros((len(texts), 4), dtype=np.float32)
+
+
+def test_lone_query_does_not_wait_for_company():
+    embedder = BatchingEmbedder(SlowEncoder(), max_batch=32, max_wait=1.0)
+    started = time.perf_counter()
+    embedder.embed("only query")
+    assert time.perf_counter() - started < 0.5
+
+
+def test_concurrent_queries_share_batches():
+    encoder = SlowEncoder()
+    embedder = BatchingEmbedder(encoder, max_batch=32, max_wait=0.01)
+    threads = [threading.Thread(target=embedder.embed, args=(f"q{i}",)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(encoder.calls) == 20
+    assert len(encoder.calls) < 20
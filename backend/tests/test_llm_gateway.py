@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from llm_gateway import LLMBackend, LLMGateway, RateLimitError
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class ScriptedBackend(LLMBackend):
+    """Plays one scripted outcome per call: an exception, or a list of tokens then an optional exception"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def stream(self, messages, model, temperature, max_tokens):
+        self.calls.append(model)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        tokens, error = outcome
+        for token in tokens:
+            yield token
+        if error is not None:
+            raise error
+
+
+def make_gateway(backend, max_retries=3):
+    gateway = LLMGateway(backend=backend, model="big", fallback_model="small", max_retries=max_retries,
+                         requests_per_minute=1e9, tokens_per_minute=1e12)
+    gateway.delays = []
+    gateway.backoff = lambda attempt: gateway.delays.append(attempt) or 0
+    return gateway
+
+
+async def collect(gateway, info=None):
+    return [token async for token in gateway.stream_chat([{"role": "user", "content": "hi"}], info=info)]
+
+
+def test_retries_with_backoff_before_first_token():
+    backend = ScriptedBackend(ConnectionError("reset"), TimeoutError("slow"), (["a", "b"], None))
+    gateway = make_gateway(backend)
+    info = {}
+    assert asyncio.run(collect(gateway, info)) == ["a", "b"]
+    assert backend.calls == ["big", "big", "big"]
+    assert gateway.delays == [0, 1]
+    assert info["model"] == "big"
+
+
+def test_gives_up_after_max_retries():
+    backend = ScriptedBackend(*[ConnectionError("reset")] * 3)
+    gateway = make_gateway(backend, max_retries=2)
+    with pytest.raises(ConnectionError):
+        asyncio.run(collect(gateway))
+    assert len(backend.calls) == 3
+
+
+def test_falls_back_on_rate_limit_and_reports_model():
+    backend = ScriptedBackend(RateLimited("429 Too Many Requests"), (["ok"], None))
+    gateway = make_gateway(backend)
+    info = {}
+    assert asyncio.run(collect(gateway, info)) == ["ok"]
+    assert backend.calls == ["big", "small"]
+    assert info["model"] == "small"
+
+
+def test_persistent_rate_limit_raises_rate_limit_error():
+    backend = ScriptedBackend(*[RateLimited("429")] * 2)
+    gateway = make_gateway(backend, max_retries=1)
+    with pytest.raises(RateLimitError):
+        asyncio.run(collect(gateway))
+    assert backend.calls == ["big", "small"]
+
+
+def test_no_retry_after_first_token():
+    backend = ScriptedBackend((["partial"], ConnectionError("dropped")), (["again"], None))
+    gateway = make_gateway(backend)
+    received = []
+
+    async def scenario():
+        async for token in gateway.stream_chat([{"role": "user", "content": "hi"}]):
+            received.append(token)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(scenario())
+    assert received == ["partial"]
+    assert backend.calls == ["big"]
+    assert gateway.delays == []
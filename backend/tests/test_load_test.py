@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# The harness imports the whole app, so it needs the full backend requirements
+for module in ("chromadb", "sentence_transformers", "uvicorn", "websockets"):
+    pytest.importorskip(module)
+
+LOAD_TEST = Path(__file__).resolve().parent.parent / "load_test.py"
+
+
+@pytest.mark.parametrize("mode", [[], ["--web-search", "--web-search-delay", "0.01"]],
+                         ids=["rag", "web-search"])
+def test_load_test_smoke(mode, tmp_path):
+    output = tmp_path / "results.json"
+    subprocess.run(
+        [sys.executable, str(LOAD_TEST), "--clients", "2", "--turns", "2", "--turn-timeout", "20",
+         "--output", str(output), *mode],
+        cwd=LOAD_TEST.parent, check=True, timeout=120, capture_output=True
+    )
+    report = json.loads(output.read_text())
+    assert report["turns_completed"] == 4
+    assert report["turns_failed"] == 0
+    assert report["client_failures"] == []
@@ -0,0 +1,34 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from mcp_client import MCPServerProcess
+
+
+class SlowSession:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def call_tool(self, tool_name, arguments):
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(content=[SimpleNamespace(text='{"ok": true}')], isError=False)
+
+
+def test_call_tool_timeout_covers_startup_and_call():
+    async def scenario():
+        server = MCPServerProcess(0, ["unused"], max_concurrency=1)
+        server.session = SlowSession(0.3)
+        asyncio.get_running_loop().call_later(0.3, server.ready.set)
+
+        started = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await server.call_tool("queryProgrammingWeb", {"query": "q"}, timeout=0.45)
+        # Each stage alone fits in the timeout; together they must not get twice as long
+        assert time.monotonic() - started < 0.55
+        assert server.in_flight == 0
+
+        assert await server.call_tool("queryProgrammingWeb", {"query": "q"}, timeout=1) == {"ok": True}
+
+    asyncio.run(scenario())
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+from prefetch import SpeculativePrefetcher
+
+
+class FakeConnection:
+    def __init__(self):
+        self.draft = None
+        self.draft_retrievals = 0
+
+    def start_task(self, coro):
+        return asyncio.create_task(coro)
+
+
+def test_drafts_are_capped_while_embedding_threads_run():
+    release = threading.Event()
+    searched = []
+
+    def search(query):
+        searched.append(query)
+        release.wait()
+        return [query]
+
+    async def scenario():
+        prefetcher = SpeculativePrefetcher(rag_search=lambda q: asyncio.to_thread(search, q), web_search=None,
+                                           enabled=True, min_chars=1, max_inflight=2, web=False)
+        conn = FakeConnection()
+        for text in ("reverse a list", "sort a dict by value", "parse json in go"):
+            prefetcher.draft(conn, text, False, "alice")
+            await asyncio.sleep(0.05)
+        # The superseded draft's thread still counts until it finishes
+        assert searched == ["reverse a list", "sort a dict by value"]
+        assert conn.draft_retrievals == 2
+
+        release.set()
+        await asyncio.sleep(0.1)
+        assert conn.draft_retrievals == 0
+        prefetcher.draft(conn, "parse json in go", False, "alice")
+        prefetched = prefetcher.take(conn, "parse json in go", False)
+        assert await prefetched.rag == ["parse json in go"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from scheduler import FairScheduler, QuotaExceeded, parse_weights
+
+
+def make_scheduler(concurrency=4, burst=30, per_minute=30, max_wait=60, weights=None):
+    return FairScheduler(concurrency=concurrency, quota_burst=burst, quota_per_minute=per_minute,
+                         max_wait=max_wait, weights=weights or {})
+
+
+async def hold(scheduler, user_id, lane, release, log, on_queued=None):
+    async with scheduler.slot(user_id, lane, on_queued=on_queued):
+        log.append(user_id)
+        await release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_parse_weights():
+    assert parse_weights("alice:2, bob:0.5,") == {"alice": 2.0, "bob": 0.5}
+    assert parse_weights("") == {}
+
+
+def test_quota_is_charged_by_lane_cost():
+    async def scenario():
+        scheduler = make_scheduler(burst=10, per_minute=0.001)
+        for _ in range(3):
+            async with scheduler.slot("alice", "web"):
+                pass
+        assert scheduler.has_quota("alice", "rag")
+        assert not scheduler.has_quota("alice", "web")
+        with pytest.raises(QuotaExceeded) as error:
+            async with scheduler.slot("alice", "web"):
+                pass
+        assert error.value.retry_after > 0
+        # Other users have their own buckets
+        async with scheduler.slot("bob", "qwen"):
+            pass
+
+    asyncio.run(scenario())
+
+
+def test_has_quota_does_not_charge():
+    scheduler = make_scheduler(burst=3, per_minute=0.001)
+    for _ in range(5):
+        assert scheduler.has_quota("alice", "web")
+
+
+def test_lane_limit_queues_and_reports_position():
+    async def scenario():
+        scheduler = make_scheduler()
+        scheduler.lanes["qwen"].limit = 1
+        release, log, positions = asyncio.Event(), [], []
+
+        async def on_queued(position):
+            positions.append(position)
+
+        first = asyncio.create_task(hold(scheduler, "alice", "qwen", release, log))
+        await settle()
+        second = asyncio.create_task(hold(scheduler, "bob", "qwen", release, log, on_queued))
+        await settle()
+        assert log == ["alice"]
+        assert positions == [1]
+        assert scheduler.stats()["lanes"]["qwen"]["waiting"] == 1
+
+        release.set()
+        await asyncio.gather(first, second)
+        assert log == ["alice", "bob"]
+        assert scheduler.stats()["running"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cheaper_lanes_are_served_first():
+    async def scenario():
+        scheduler = make_scheduler(concurrency=1)
+        release, log = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(scheduler, "first", "rag", release, log))]
+        await settle()
+        for user_id, lane in (("q", "qwen"), ("w", "web"), ("r", "rag")):
+            tasks.append(asyncio.create_task(hold(scheduler, user_id, lane, release, log)))
+            await settle()
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert log == ["first", "r", "w", "q"]
+
+    asyncio.run(scenario())
+
+
+def test_users_take_turns_within_a_lane():
+    async def scenario():
+        scheduler = make_scheduler(concurrency=1)
+        release, log = asyncio.Event(), []
+        tasks = []
+        for user_id in ("alice", "alice", "alice", "bob"):
+            tasks.append(asyncio.create_task(hold(scheduler, user_id, "rag", release, log)))
+            await settle()
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert log == ["alice", "bob", "alice", "alice"]
+
+    asyncio.run(scenario())
+
+
+def test_weights_give_a_larger_share():
+    async def scenario():
+        scheduler = make_scheduler(concurrency=1, weights={"alice": 2})
+        release, log = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(scheduler, "first", "rag", release, log))]
+        await settle()
+        for user_id in ("bob", "bob", "alice", "alice", "alice", "alice"):
+            tasks.append(asyncio.create_task(hold(scheduler, user_id, "rag", release, log)))
+            await settle()
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert log[1:] == ["alice", "bob", "alice", "alice", "bob", "alice"]
+
+    asyncio.run(scenario())
+
+
+def test_long_waits_skip_the_lane_order():
+    async def scenario():
+        scheduler = make_scheduler(concurrency=1, max_wait=0.05)
+        release, log = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(scheduler, "first", "rag", release, log))]
+        await settle()
+        tasks.append(asyncio.create_task(hold(scheduler, "q", "qwen", release, log)))
+        await asyncio.sleep(0.1)
+        tasks.append(asyncio.create_task(hold(scheduler, "r", "rag", release, log)))
+        await settle()
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert log == ["first", "q", "r"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_while_queued_is_refunded():
+    async def scenario():
+        scheduler = make_scheduler(concurrency=1, burst=10, per_minute=0.001)
+        release, log = asyncio.Event(), []
+        first = asyncio.create_task(hold(scheduler, "alice", "rag", release, log))
+        await settle()
+        queued = asyncio.create_task(hold(scheduler, "bob", "web", release, log))
+        await settle()
+        assert scheduler.buckets["bob"].tokens == pytest.approx(7, abs=0.01)
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert scheduler.buckets["bob"].tokens == pytest.approx(10, abs=0.01)
+        assert scheduler.stats()["waiting"] == 0
+
+        release.set()
+        await first
+        assert log == ["alice"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import shared_state
+from connection_manager import CapacityError, ConnectionManager
+from shared_state import LocalStore, SQLiteStore
+
+
+class SharedLocalStore(LocalStore):
+    shared = True
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(shared_state.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture(params=["local", "sqlite"])
+def store(request, tmp_path):
+    return SharedLocalStore() if request.param == "local" else SQLiteStore(str(tmp_path / "state.db"))
+
+
+def test_decr_never_creates_or_goes_negative(store, clock):
+    async def scenario():
+        assert await store.decr("count") == 0
+        assert await store.get("count") is None
+        await store.incr("count", 2, ttl=10)
+        assert await store.decr("count") == 1
+        assert await store.decr("count", 5) == 0
+        assert await store.get("count") is None
+    asyncio.run(scenario())
+
+
+def test_decr_keeps_ttl(store, clock):
+    async def scenario():
+        await store.incr("count", 2, ttl=10)
+        await store.decr("count")
+        clock.now += 11
+        assert await store.get("count") is None
+    asyncio.run(scenario())
+
+
+def test_release_after_expiry_does_not_raise_user_cap(store, clock):
+    async def scenario():
+        manager = ConnectionManager(max_generations=10, max_generations_per_user=1, store=store)
+        async with manager.generation_slot("alice"):
+            # The counter expires while this generation is still running
+            clock.now += ConnectionManager.SHARED_TTL + 1
+        assert await store.get("generations:alice") is None
+
+        async with manager.generation_slot("alice"):
+            with pytest.raises(CapacityError):
+                async with manager.generation_slot("alice"):
+                    pass
+    asyncio.run(scenario())
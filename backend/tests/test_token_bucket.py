@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+import llm_gateway
+from llm_gateway import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_gateway.time, "monotonic", clock)
+    return clock
+
+
+def test_starts_full(clock):
+    bucket = TokenBucket(rate=1, capacity=5)
+    assert bucket.try_acquire(5) == 0.0
+    assert bucket.tokens == 0
+
+
+def test_try_acquire_reports_wait_without_charging(clock):
+    bucket = TokenBucket(rate=2, capacity=4)
+    assert bucket.try_acquire(3) == 0.0
+    assert bucket.try_acquire(3) == pytest.approx(1.0)
+    assert bucket.tokens == pytest.approx(1)
+
+
+def test_refills_at_rate_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=4)
+    bucket.try_acquire(4)
+    clock.now += 1
+    assert bucket.try_acquire(2) == 0.0
+    assert bucket.try_acquire(1) == pytest.approx(0.5)
+
+    clock.now += 60
+    bucket._refill()
+    assert bucket.tokens == 4
+
+
+def test_release_refunds_but_never_overfills(clock):
+    bucket = TokenBucket(rate=1, capacity=3)
+    bucket.try_acquire(2)
+    bucket.release(1)
+    assert bucket.tokens == 2
+    bucket.release(10)
+    assert bucket.tokens == 3
+
+
+def test_acquire_waits_for_refill():
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    async def take_twice():
+        await bucket.acquire()
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(take_twice()) >= 0.015
+
+
+def test_acquire_more_than_capacity_takes_whole_bucket():
+    bucket = TokenBucket(rate=1, capacity=2)
+    asyncio.run(asyncio.wait_for(bucket.acquire(10), timeout=1))
+    assert bucket.tokens < 1
@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+
+from vector_store import CompactVectorStore
+
+
+def unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def corpus(count=200, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = unit(rng.normal(size=(count, dim)))
+    return [f"chunk {i}" for i in range(count)], vectors, [f"id-{i}" for i in range(count)]
+
+
+@pytest.fixture(params=["float16", "int8"])
+def store(request, tmp_path):
+    return CompactVectorStore(str(tmp_path / "index"), dtype=request.param, ivf_lists=0)
+
+
+def test_query_returns_nearest_with_cosine_distance(store):
+    documents, vectors, ids = corpus()
+    store.add(documents, vectors, ids)
+
+    result = store.query([vectors[42]], n_results=3)
+    assert result["ids"][0][0] == "id-42"
+    assert result["documents"][0][0] == "chunk 42"
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=0.02)
+    assert result["distances"][0] == sorted(result["distances"][0])
+    assert store.count() == 200
+
+
+def test_empty_store(store):
+    assert store.count() == 0
+    assert store.query([np.ones(4)], n_results=3) == {"ids": [[]], "documents": [[]], "distances": [[]]}
+
+
+def test_delete_hides_rows(store):
+    documents, vectors, ids = corpus()
+    store.add(documents, vectors, ids)
+    store.delete(["id-42", "missing"])
+
+    assert store.count() == 199
+    assert store.count(include_deleted=True) == 200
+    assert "id-42" not in store.query([vectors[42]], n_results=5)["ids"][0]
+    assert store.get(ids=["id-42", "id-7"])["ids"] == ["id-7"]
+
+
+def test_unicode_text_round_trips(store):
+    _, vectors, _ = corpus(count=2)
+    store.add(["naïve café ☕", "第二"], vectors, ["a", "b"])
+    assert store.get(ids=["b", "a"])["documents"] == ["第二", "naïve café ☕"]
+
+
+def test_rejects_mismatched_input(store):
+    _, vectors, _ = corpus(count=3)
+    with pytest.raises(ValueError):
+        store.add(["a", "b"], vectors, ["a", "b", "c"])
+    store.add(["a", "b", "c"], vectors, ["a", "b", "c"])
+    with pytest.raises(ValueError):
+        store.add(["d"], unit(np.ones((1, 8))), ["d"])
+
+
+def test_reopens_from_disk(tmp_path):
+    documents, vectors, ids = corpus()
+    CompactVectorStore(str(tmp_path), dtype="int8").add(documents, vectors, ids)
+
+    # The on-disk dtype wins over the configured one
+    reopened = CompactVectorStore(str(tmp_path), dtype="float16")
+    assert reopened.dtype == "int8"
+    assert reopened.count() == 200
+    assert reopened.query([vectors[7]], n_results=1)["ids"] == [["id-7"]]
+
+
+def test_second_instance_sees_appends(tmp_path):
+    writer = CompactVectorStore(str(tmp_path))
+    reader = CompactVectorStore(str(tmp_path))
+    documents, vectors, ids = corpus(count=20)
+
+    writer.add(documents[:10], vectors[:10], ids[:10])
+    assert reader.count() == 10
+    writer.add(documents[10:], vectors[10:], ids[10:])
+    assert reader.count() == 20
+    assert reader.query([vectors[15]], n_results=1)["ids"] == [["id-15"]]
+
+    writer.delete(["id-15"])
+    assert reader.count() == 19
+
+
+def test_clear(store):
+    documents, vectors, ids = corpus(count=10)
+    store.add(documents, vectors, ids)
+    store.clear()
+    assert store.count() == 0
+    store.add(documents, vectors, ids)
+    assert store.count() == 10
+
+
+def test_ivf_search_finds_stored_vectors(tmp_path):
+    documents, vectors, ids = corpus(count=400)
+    store = CompactVectorStore(str(tmp_path), ivf_lists=4, nprobe=2)
+    store.add(documents[:100], vectors[:100], ids[:100])
+    assert store.stats()["ivf_lists"] == 0
+
+    # Trained automatically once there are 40 rows per list
+    store.add(documents[100:], vectors[100:], ids[100:])
+    assert store.stats()["ivf_lists"] == 4
+    hits = sum(store.query([vectors[i]], n_results=1)["ids"][0] == [ids[i]] for i in range(0, 400, 10))
+    assert hits == 40
+
+    # Rows added after training are assigned to a list too
+    extra = unit(np.random.default_rng(1).normal(size=(1, 16)))
+    store.add(["late"], extra, ["late"])
+    assert store.query(extra, n_results=1)["ids"] == [["late"]]
+
+
+def test_appends_and_deletes_do_not_reload(tmp_path, monkeypatch):
+    writer = CompactVectorStore(str(tmp_path), ivf_lists=2)
+    reader = CompactVectorStore(str(tmp_path))
+    documents, vectors, ids = corpus(count=120)
+    writer.add(documents[:100], vectors[:100], ids[:100])
+    assert reader.count() == 100
+
+    def no_reload():
+        raise AssertionError("full reload")
+    monkeypatch.setattr(writer, "_reload", no_reload)
+    monkeypatch.setattr(reader, "_reload", no_reload)
+
+    for start in range(100, 120, 5):
+        writer.add(documents[start:start + 5], vectors[start:start + 5], ids[start:start + 5])
+    writer.delete(["id-3"])
+    assert reader.count() == 119
+    assert reader.query([vectors[117]], n_results=1)["ids"] == [["id-117"]]
+    assert writer.query([vectors[117]], n_results=1)["ids"] == [["id-117"]]
+    assert "id-3" not in reader.get()["ids"]
+
+
+def test_second_instance_sees_clear_and_new_rows(tmp_path):
+    writer = CompactVectorStore(str(tmp_path))
+    reader = CompactVectorStore(str(tmp_path))
+    documents, vectors, ids = corpus(count=30)
+    writer.add(documents[:10], vectors[:10], ids[:10])
+    assert reader.count() == 10
+
+    writer.clear()
+    writer.add(documents[10:], vectors[10:], ids[10:])
+    assert reader.count() == 20
+    assert reader.get()["ids"] == ids[10:]
+
+
+def test_query_scans_outside_the_lock(store, monkeypatch):
+    documents, vectors, ids = corpus(count=20)
+    store.add(documents, vectors, ids)
+    top_k = store._top_k
+
+    def checked_top_k(*args, **kwargs):
+        assert not store._lock._is_owned()
+        return top_k(*args, **kwargs)
+    monkeypatch.setattr(store, "_top_k", checked_top_k)
+    assert store.query([vectors[4]], n_results=1)["ids"] == [["id-4"]]
@@ -0,0 +1,458 @@
+"""
+Compact, memory-mapped vector store for RAGEngine
+
+An alternative to Chroma's in-memory client for large corpora. Everything
+lives in one directory and is memory-mapped, so resident memory stays small
+and the index survives restarts:
+
+    meta.json       dimension, vector dtype, IVF settings
+    vectors.bin     row-major float16, or int8 with a float32 scale per row (scales.bin)
+    texts.bin       UTF-8 chunk text, back to back
+    offsets.bin     int64 (start, length) into texts.bin per row
+    ids.txt         one chunk id per line
+    deleted.bin     int64 row numbers of deleted chunks
+    centroids.npy   IVF centroids, when partitioning is enabled
+    lists.bin       int32 IVF list of each row
+
+Search is a blocked matrix product over the memory-mapped vectors. With IVF
+enabled, only the rows in the `nprobe` lists nearest the query are scored.
+"""
+
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BLOCK_ROWS = 65536
+
+
+class _Growable:
+    """Append-only array with amortized O(1) appends. Views stay valid after later appends."""
+
+    def __init__(self, dtype):
+        self.data = np.zeros(0, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.empty(max(needed, 2 * len(self.data), 64), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = values
+        self.size = needed
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class CompactVectorStore:
+    """
+    Implements the subset of the Chroma collection API that RAGEngine uses:
+    add, query, get, delete and count. Vectors are expected L2-normalized;
+    scores are cosine similarities and `distances` are 1 - cosine.
+
+    Several workers on one host can share a directory: writes hold a file
+    lock, and readers remap the files when another process has appended.
+    Rows are append-only between clears, so appends, deletions and searches
+    never rebuild the in-memory index, and scans run outside the lock.
+    """
+
+    def __init__(self, path: str = None, dtype: str = None, ivf_lists: int = None, nprobe: int = None):
+        self.path = Path(path or os.getenv("RAG_COMPACT_DIR", "rag_index"))
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dtype = (dtype or os.getenv("RAG_VECTOR_DTYPE", "float16")).lower()
+        if self.dtype not in ("float16", "int8"):
+            raise ValueError("RAG_VECTOR_DTYPE must be float16 or int8")
+        self.ivf_lists = ivf_lists if ivf_lists is not None else int(os.getenv("RAG_IVF_LISTS", "0"))
+        self.nprobe = nprobe or int(os.getenv("RAG_IVF_NPROBE", "8"))
+        self._lock = threading.RLock()
+        self._meta_version = None
+        self._reload()
+
+    # ----- files -----
+
+    def _file(self, name: str) -> Path:
+        return self.path / name
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock, open(self._file(".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Dict:
+        meta_file = self._file("meta.json")
+        if meta_file.exists():
+            return json.loads(meta_file.read_text())
+        return {"dim": None, "dtype": self.dtype, "count": 0}
+
+    def _meta_stamp(self):
+        """
+        Changes whenever meta.json is rewritten. The inode is part of it because
+        os.replace creates a new file each time, while mtimes written a few
+        milliseconds apart can be equal.
+        """
+        meta_file = self._file("meta.json")
+        if not meta_file.exists():
+            return None
+        stat = meta_file.stat()
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _write_meta(self):
+        meta = {"dim": self.dim, "dtype": self.dtype, "count": self.rows, "epoch": self.epoch,
+                "ivf_lists": len(self.centroids) if self.centroids is not None else 0}
+        tmp = self._file("meta.json.tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self._file("meta.json"))
+        self._meta_version = self._meta_stamp()
+
+    def _map(self, name: str, dtype, columns: int = None) -> np.ndarray:
+        file = self._file(name)
+        rows = self.rows
+        if rows == 0 or not file.exists():
+            return np.zeros((0, columns) if columns else (0,), dtype=dtype)
+        shape = (rows, columns) if columns else (rows,)
+        return np.memmap(file, dtype=dtype, mode="r", shape=shape)
+
+    def _remap(self):
+        vector_dtype = np.float16 if self.dtype == "float16" else np.int8
+        self.vectors = self._map("vectors.bin", vector_dtype, self.dim) if self.dim else None
+        self.scales = self._map("scales.bin", np.float32) if self.dtype == "int8" else None
+        self.offsets = self._map("offsets.bin", np.int64, 2)
+
+    @property
+    def alive(self) -> np.ndarray:
+        return self._alive.view()
+
+    @property
+    def lists(self) -> Optional[List[np.ndarray]]:
+        return [rows.view() for rows in self._lists] if self._lists is not None else None
+
+    def _reload(self):
+        """Map every file to match meta.json, reading ids, deletions and IVF lists in full"""
+        stamp = self._meta_stamp()
+        meta = self._read_meta()
+        if meta["dim"] is not None and meta["dtype"] != self.dtype:
+            # The on-disk format wins over the configured one
+            self.dtype = meta["dtype"]
+        self.dim = meta["dim"]
+        self.epoch = meta.get("epoch", 0)
+
+        centroids_file = self._file("centroids.npy")
+        self.centroids = np.load(centroids_file) if centroids_file.exists() else None
+        self._lists = [_Growable(np.int64) for _ in self.centroids] if self.centroids is not None else None
+
+        self.rows = 0
+        self.ids = []
+        self.rows_by_id = {}
+        self._alive = _Growable(bool)
+        self._ids_bytes = 0
+        self._deleted_count = 0
+        self._remap()
+        self._extend(meta["count"])
+        self._meta_version = stamp
+
+    def _extend(self, rows: int):
+        """
+        Catch up with rows appended and deletions recorded since the last load.
+        Only the new tails of ids.txt, lists.bin and deleted.bin are read.
+        """
+        added = rows - self.rows
+        if added > 0:
+            with open(self._file("ids.txt"), "rb") as f:
+                f.seek(self._ids_bytes)
+                lines = f.read().split(b"\n")[:added]
+            new_ids = [line.decode("utf-8") for line in lines]
+            self._ids_bytes += sum(len(line) + 1 for line in lines)
+            self.rows_by_id.update((chunk_id, self.rows + i) for i, chunk_id in enumerate(new_ids))
+            self.ids.extend(new_ids)
+            self._alive.extend(np.ones(added, dtype=bool))
+            if self._lists is not None:
+                assignments = np.fromfile(self._file("lists.bin"), dtype=np.int32, count=added,
+                                          offset=self.rows * 4)
+                self._add_to_lists(self.rows, assignments)
+            self.rows = rows
+            self._remap()
+
+        deleted_file = self._file("deleted.bin")
+        if deleted_file.exists():
+            deleted = np.fromfile(deleted_file, dtype=np.int64, offset=self._deleted_count * 8)
+            # Rows past the ones loaded were deleted after a later append; pick them up next time
+            beyond = np.flatnonzero(deleted >= self.rows)
+            if len(beyond):
+                deleted = deleted[:beyond[0]]
+            self._deleted_count += len(deleted)
+            self.alive[deleted] = False
+
+    def _add_to_lists(self, first_row: int, assignments: np.ndarray):
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(self._lists) + 1))
+        for i, rows in enumerate(self._lists):
+            if bounds[i] < bounds[i + 1]:
+                rows.extend(first_row + order[bounds[i]:bounds[i + 1]])
+
+    def _refresh(self):
+        """Pick up another writer's changes: appends and deletions incrementally, anything else by reloading"""
+        stamp = self._meta_stamp()
+        if stamp == self._meta_version:
+            return
+        meta = self._read_meta()
+        if stamp is not None and self.rows and meta.get("epoch", 0) == self.epoch \
+                and meta["count"] >= self.rows:
+            self._extend(meta["count"])
+            self._meta_version = stamp
+        else:
+            self._reload()
+
+    # ----- collection API -----
+
+    def count(self, include_deleted: bool = False) -> int:
+        with self._lock:
+            self._refresh()
+            return self.rows if include_deleted else int(self.alive.sum())
+
+    def _encode(self, embeddings: np.ndarray):
+        if self.dtype == "float16":
+            return embeddings.astype(np.float16), None
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.round(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+
+    def add(self, documents: List[str], embeddings, ids: List[str]):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(documents) != len(embeddings) or len(documents) != len(ids):
+            raise ValueError("documents, embeddings and ids must have the same length")
+        if not len(documents):
+            return
+
+        with self._write_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match index ({self.dim})")
+
+            self._truncate_to_committed()
+            vectors, scales = self._encode(embeddings)
+            encoded = [text.encode("utf-8") for text in documents]
+            texts_file = self._file("texts.bin")
+            start = int(self.offsets[-1].sum()) if self.rows else 0
+            lengths = np.array([len(b) for b in encoded], dtype=np.int64)
+            offsets = np.stack([start + np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths], axis=1)
+
+            with open(texts_file, "ab") as f:
+                f.write(b"".join(encoded))
+            with open(self._file("vectors.bin"), "ab") as f:
+                f.write(vectors.tobytes())
+            if scales is not None:
+                with open(self._file("scales.bin"), "ab") as f:
+                    f.write(scales.tobytes())
+            with open(self._file("offsets.bin"), "ab") as f:
+                f.write(offsets.astype(np.int64).tobytes())
+            with open(self._file("ids.txt"), "a") as f:
+                f.write("".join(f"{chunk_id}\n" for chunk_id in ids))
+            if self.centroids is not None:
+                with open(self._file("lists.bin"), "ab") as f:
+                    f.write(self._assign(embeddings).tobytes())
+
+            self._extend(self.rows + len(ids))
+            self._write_meta()
+
+        if self.ivf_lists and self.centroids is None and self.rows >= self.ivf_lists * 40:
+            self.build_ivf()
+
+    def _truncate_to_committed(self):
+        """Drop bytes past the rows in meta.json, left behind by a write that did not finish"""
+        vector_bytes = self.dim * (2 if self.dtype == "float16" else 1)
+        sizes = {
+            "vectors.bin": self.rows * vector_bytes,
+            "scales.bin": self.rows * 4,
+            "offsets.bin": self.rows * 16,
+            "texts.bin": int(self.offsets[-1].sum()) if self.rows else 0,
+            "lists.bin": self.rows * 4,
+            "ids.txt": self._ids_bytes
+        }
+        for name, size in sizes.items():
+            file = self._file(name)
+            if file.exists() and file.stat().st_size > size:
+                os.truncate(file, size)
+
+    def _text(self, row: int) -> str:
+        start, length = self.offsets[row]
+        with open(self._file("texts.bin"), "rb") as f:
+            f.seek(int(start))
+            return f.read(int(length)).decode("utf-8")
+
+    def _vectors(self, rows, view=None) -> np.ndarray:
+        view = view or self
+        block = np.asarray(view.vectors[rows], dtype=np.float32)
+        if view.scales is not None:
+            block *= np.asarray(view.scales[rows])[:, None]
+        return block
+
+    def _snapshot(self) -> SimpleNamespace:
+        """What a scan needs. Rows are append-only, so it stays valid until the next clear."""
+        return SimpleNamespace(rows=self.rows, vectors=self.vectors, scales=self.scales, alive=self.alive,
+                               centroids=self.centroids, lists=self.lists, ids=self.ids)
+
+    def _top_k(self, view, query: np.ndarray, n_results: int, rows: Optional[np.ndarray] = None):
+        """Best (rows, scores) by cosine, scoring BLOCK_ROWS vectors at a time"""
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        total = view.rows if rows is None else len(rows)
+        for start in range(0, total, BLOCK_ROWS):
+            block_rows = np.arange(start, min(start + BLOCK_ROWS, total)) if rows is None \
+                else rows[start:start + BLOCK_ROWS]
+            if rows is None:
+                block = self._vectors(slice(start, start + BLOCK_ROWS), view)
+            else:
+                block = self._vectors(block_rows, view)
+            scores = block @ query
+            scores[~view.alive[block_rows]] = -np.inf
+
+            k = min(n_results, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            best_rows = np.concatenate([best_rows, block_rows[top]])
+            best_scores = np.concatenate([best_scores, scores[top]])
+
+        order = np.argsort(-best_scores)[:n_results]
+        keep = np.isfinite(best_scores[order])
+        return best_rows[order][keep], best_scores[order][keep]
+
+    def _search(self, view, query: np.ndarray, n_results: int):
+        if view.rows == 0:
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+        if view.lists is not None:
+            probe = np.argsort(-(view.centroids @ query))[:self.nprobe]
+            candidates = np.sort(np.concatenate([view.lists[i] for i in probe]))
+            return self._top_k(view, query, n_results, candidates)
+        return self._top_k(view, query, n_results)
+
+    def query(self, query_embeddings, n_results: int = 3, include=None) -> Dict[str, List]:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        with self._lock:
+            self._refresh()
+            view = self._snapshot()
+        # Scan without the lock so concurrent searches overlap; numpy releases the GIL
+        hits = [self._search(view, query, n_results) for query in queries]
+
+        with self._lock:
+            if self.ids is not view.ids:
+                # Cleared or rebuilt by another writer mid-scan, so the rows may be gone
+                view = self._snapshot()
+                hits = [self._search(view, query, n_results) for query in queries]
+            result = {"ids": [], "documents": [], "distances": []}
+            for rows, scores in hits:
+                result["ids"].append([view.ids[r] for r in rows])
+                result["documents"].append([self._text(r) for r in rows])
+                result["distances"].append([float(1 - s) for s in scores])
+            return result
+
+    def get(self, ids: List[str] = None, include=None) -> Dict[str, List]:
+        with self._lock:
+            self._refresh()
+            rows = [self.rows_by_id[i] for i in ids if i in self.rows_by_id] if ids is not None \
+                else range(self.rows)
+            rows = [r for r in rows if self.alive[r]]
+            result = {"ids": [self.ids[r] for r in rows]}
+            if include is None or "documents" in include:
+                result["documents"] = [self._text(r) for r in rows]
+            return result
+
+    def delete(self, ids: List[str]):
+        with self._write_lock():
+            self._refresh()
+            rows = np.array([self.rows_by_id[i] for i in ids if i in self.rows_by_id], dtype=np.int64)
+            if not len(rows):
+                return
+            with open(self._file("deleted.bin"), "ab") as f:
+                f.write(rows.tobytes())
+            self._extend(self.rows)
+            self._write_meta()
+
+    def clear(self):
+        with self._write_lock():
+            self._refresh()
+            for name in ("vectors.bin", "scales.bin", "texts.bin", "offsets.bin",
+                         "ids.txt", "deleted.bin", "centroids.npy", "lists.bin"):
+                self._file(name).unlink(missing_ok=True)
+            # A new epoch tells other workers to reload instead of appending to what they have
+            self.dim, self.rows, self.centroids = None, 0, None
+            self.epoch += 1
+            self._write_meta()
+            self._reload()
+
+    # ----- IVF -----
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def build_ivf(self, lists: int = None, iterations: int = 10, sample: int = 100_000, seed: int = 0):
+        """Train spherical k-means centroids on a sample and assign every row to a list"""
+        lists = lists or self.ivf_lists
+        with self._write_lock():
+            self._refresh()
+            if self.rows < lists:
+                return
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(self.rows, size=min(sample, self.rows), replace=False))
+            data = self._vectors(sample_rows)
+            centroids = data[rng.choice(len(data), size=lists, replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(data @ centroids.T, axis=1)
+                for i in range(lists):
+                    members = data[assignment == i]
+                    if len(members):
+                        centroid = members.sum(axis=0)
+                        centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+            self.centroids = centroids.astype(np.float32)
+            assignments = np.concatenate([
+                self._assign(self._vectors(np.arange(start, min(start + BLOCK_ROWS, self.rows))))
+                for start in range(0, self.rows, BLOCK_ROWS)
+            ])
+            assignments.tofile(self._file("lists.bin"))
+            np.save(self._file("centroids.npy"), self.centroids)
+            self._lists = [_Growable(np.int64) for _ in self.centroids]
+            self._add_to_lists(0, assignments)
+            self.epoch += 1
+            self._write_meta()
+        print(f"✅ Built IVF index with {lists} lists over {self.rows} vectors")
+
+    def stats(self) -> Dict:
+        disk = sum(f.stat().st_size for f in self.path.iterdir() if f.is_file())
+        return {
+            "path": str(self.path),
+            "dtype": self.dtype,
+            "dim": self.dim,
+            "chunks": int(self.alive.sum()),
+            "deleted": int((~self.alive).sum()),
+            "ivf_lists": len(self.centroids) if self.centroids is not None else 0,
+            "disk_bytes": disk
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact vector store tools")
+    parser.add_argument("command", choices=["stats", "build-ivf"])
+    parser.add_argument("--path", default=os.getenv("RAG_COMPACT_DIR", "rag_index"))
+    parser.add_argument("--lists", type=int, default=int(os.getenv("RAG_IVF_LISTS", "0")) or 256)
+    args = parser.parse_args()
+
+    store = CompactVectorStore(args.path)
+    if args.command == "build-ivf":
+        store.build_ivf(args.lists)
+    print(json.dumps(store.stats(), indent=2))
@@ -1,4 +1,3 @@
-from playwright.async_api import async_playwright
 from typing import List, Dict
 import asyncio
 
@@ -9,6 +8,8 @@ class WebResearchService:
     async def search_web(self, query: str) -> List[Dict[str, str]]:
         """Bing search using Playwright (extract Bing AI answer box if present, otherwise standard results)"""
         try:
+            from playwright.async_api import async_playwright
+
             async with async_playwright() as p:
                 browser = await p.chromium.launch(headless=False)
                 context = await browser.new_context()
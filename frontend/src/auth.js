@@ -0,0 +1,45 @@
+// Supabase session kept in localStorage, refreshed shortly before it expires
+
+const REFRESH_MARGIN_SECONDS = 60
+
+export const saveSession = (session) => {
+  localStorage.setItem('access_token', session.access_token)
+  if (session.refresh_token) {
+    localStorage.setItem('refresh_token', session.refresh_token)
+  }
+  const expiresAt = session.expires_at || (session.expires_in && Math.floor(Date.now() / 1000) + session.expires_in)
+  if (expiresAt) {
+    localStorage.setItem('token_expires_at', String(expiresAt))
+  }
+}
+
+export const clearSession = () => {
+  localStorage.clear()
+}
+
+// Returns a usable access token, or null when there is none or it could not be refreshed
+export const freshAccessToken = async () => {
+  const token = localStorage.getItem('access_token')
+  if (!token) return null
+
+  const expiresAt = Number(localStorage.getItem('token_expires_at') || 0)
+  if (expiresAt && expiresAt - REFRESH_MARGIN_SECONDS > Date.now() / 1000) return token
+
+  const refreshToken = localStorage.getItem('refresh_token')
+  if (!refreshToken) return expiresAt ? null : token
+
+  try {
+    const response = await fetch('/api/refresh', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refresh_token: refreshToken })
+    })
+    if (!response.ok) return null
+    const data = await response.json()
+    saveSession(data.session)
+    return data.session.access_token
+  } catch (err) {
+    console.error('Token refresh failed:', err)
+    return null
+  }
+}